@@ -0,0 +1,69 @@
+"""
+Prueba de carga del chat en streaming: lanza peticiones concurrentes a POST /conversaciones/chat
+y mide el tiempo hasta el primer token (TTFT) y el tiempo total de cada respuesta.
+
+Para medirlo sin depender de OpenAI, arranca la API con el modelo local:
+    LLM_BACKEND=fake FAKE_LLM_TTFT_MS=300 uvicorn main:app
+Uso (desde la carpeta app/):
+    python -m benchmarks.bench_chat_ttft --usuario-id <id> --peticiones 200 --concurrencia 20
+Los mensajes se guardan en 'conversaciones' del usuario indicado: usa un usuario de prueba.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from typing import List, Optional, Tuple
+
+import httpx
+
+
+async def _una_peticion(client: httpx.AsyncClient, usuario_id: str, i: int) -> Tuple[Optional[float], float, bool]:
+    inicio = time.perf_counter()
+    ttft = None
+    ok = False
+    async with client.stream("POST", "/conversaciones/chat", headers={"Accept": "text/event-stream"},
+                             json={"usuario_id": usuario_id, "mensaje": f"Mensaje de prueba {i}", "tema": "benchmark"}) as response:
+        async for linea in response.aiter_lines():
+            if linea == "event: token" and ttft is None:
+                ttft = time.perf_counter() - inicio
+            elif linea == "event: fin":
+                ok = True
+    return ttft, time.perf_counter() - inicio, ok
+
+
+def _percentil(valores: List[float], p: float) -> float:
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(p * len(ordenados)))]
+
+
+async def main(url: str, usuario_id: str, peticiones: int, concurrencia: int) -> None:
+    semaforo = asyncio.Semaphore(concurrencia)
+    limits = httpx.Limits(max_connections=concurrencia, max_keepalive_connections=concurrencia)
+
+    async with httpx.AsyncClient(base_url=url, timeout=120, limits=limits) as client:
+        async def limitada(i: int):
+            async with semaforo:
+                return await _una_peticion(client, usuario_id, i)
+
+        inicio = time.perf_counter()
+        resultados = await asyncio.gather(*(limitada(i) for i in range(peticiones)), return_exceptions=True)
+        duracion = time.perf_counter() - inicio
+
+    validos = [r for r in resultados if not isinstance(r, Exception) and r[2]]
+    ttfts = [r[0] * 1000 for r in validos if r[0] is not None]
+    totales = [r[1] * 1000 for r in validos]
+    print(f"Chat en streaming: {peticiones} peticiones, concurrencia {concurrencia}, {duracion:.1f} s")
+    print(f"  Completadas: {len(validos)}  Fallidas: {peticiones - len(validos)}")
+    if ttfts:
+        print(f"  TTFT   p50 {statistics.median(ttfts):8.1f} ms  p95 {_percentil(ttfts, 0.95):8.1f} ms  max {max(ttfts):8.1f} ms")
+        print(f"  Total  p50 {statistics.median(totales):8.1f} ms  p95 {_percentil(totales, 0.95):8.1f} ms  max {max(totales):8.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tiempo hasta el primer token del chat bajo carga")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--usuario-id", required=True, help="Usuario de prueba al que se asocian los mensajes")
+    parser.add_argument("--peticiones", type=int, default=100)
+    parser.add_argument("--concurrencia", type=int, default=10)
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.usuario_id, args.peticiones, args.concurrencia))
@@ -0,0 +1,112 @@
+"""
+Benchmark del camino de escritura: compara, para cada entidad, el patrón anterior
+(insert_one/update_one seguido de find_one) con el actual (respuesta construida a partir
+del documento insertado y find_one_and_update con ReturnDocument.AFTER).
+
+Uso (desde la carpeta app/, con MONGO_URI definido):
+    python -m benchmarks.bench_escrituras --n 500
+Se usa una base de datos temporal '<DB_NAME>_bench' que se elimina al terminar.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, List
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI")
+DB_NAME = os.getenv("DB_NAME", "fitflow")
+
+# Documento de ejemplo y campos a actualizar de cada entidad
+ENTIDADES: Dict[str, Dict[str, Dict[str, Any]]] = {
+    "usuarios": {
+        "doc": {"nombre": "Bench", "email": "bench@example.com", "objetivo": "Fuerza", "fecha_creacion": datetime.utcnow()},
+        "set": {"objetivo": "Hipertrofia"},
+    },
+    "ejercicios": {
+        "doc": {"nombre": "Sentadilla", "grupo_muscular": "Piernas", "descripcion": "Compuesto"},
+        "set": {"descripcion": "Ejercicio compuesto"},
+    },
+    "registros": {
+        "doc": {"usuario_id": "60c72b2f9f1b2c3d4e5f6a7b", "ejercicio_nombre": "Press de Banca",
+                "peso_levantado": 80.0, "repeticiones": 8, "fecha_registro": datetime.utcnow(), "notas": None},
+        "set": {"peso_levantado": 82.5},
+    },
+    "logros": {
+        "doc": {"usuario_id": "60c72b2f9f1b2c3d4e5f6a7b", "descripcion": "100kg", "valor": "100kg",
+                "fecha_logro": datetime.utcnow(), "tipo": "Peso"},
+        "set": {"valor": "102.5kg"},
+    },
+    "conversaciones": {
+        "doc": {"usuario_id": "60c72b2f9f1b2c3d4e5f6a7b", "fecha": datetime.utcnow(), "rol": "user",
+                "mensaje": "Hola", "tema": "entrenamiento"},
+        "set": {"tema": "nutrición"},
+    },
+}
+
+
+async def _medir(n: int, operacion: Callable[[], Awaitable[Any]]) -> List[float]:
+    tiempos = []
+    for _ in range(n):
+        inicio = time.perf_counter()
+        await operacion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def _resumen(tiempos: List[float]) -> str:
+    tiempos = sorted(tiempos)
+    p95 = tiempos[int(len(tiempos) * 0.95) - 1]
+    return f"media {statistics.mean(tiempos):7.3f} ms | p50 {statistics.median(tiempos):7.3f} ms | p95 {p95:7.3f} ms"
+
+
+async def main(n: int) -> None:
+    client = AsyncIOMotorClient(MONGO_URI)
+    db = client[f"{DB_NAME}_bench"]
+    try:
+        for nombre, entidad in ENTIDADES.items():
+            coleccion = db[nombre]
+
+            async def crear_anterior():
+                result = await coleccion.insert_one(dict(entidad["doc"]))
+                return await coleccion.find_one({"_id": result.inserted_id})
+
+            async def crear_actual():
+                doc = dict(entidad["doc"])
+                result = await coleccion.insert_one(doc)
+                doc["_id"] = result.inserted_id
+                return doc
+
+            objetivo = (await coleccion.insert_one(dict(entidad["doc"]))).inserted_id
+
+            async def actualizar_anterior():
+                await coleccion.update_one({"_id": objetivo}, {"$set": entidad["set"]})
+                return await coleccion.find_one({"_id": objetivo})
+
+            async def actualizar_actual():
+                return await coleccion.find_one_and_update(
+                    {"_id": objetivo}, {"$set": entidad["set"]}, return_document=ReturnDocument.AFTER
+                )
+
+            print(f"\n== {nombre} ({n} operaciones) ==")
+            print(f"  create anterior : {_resumen(await _medir(n, crear_anterior))}")
+            print(f"  create actual   : {_resumen(await _medir(n, crear_actual))}")
+            print(f"  update anterior : {_resumen(await _medir(n, actualizar_anterior))}")
+            print(f"  update actual   : {_resumen(await _medir(n, actualizar_actual))}")
+    finally:
+        await client.drop_database(f"{DB_NAME}_bench")
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latencia de create/update con y sin relectura")
+    parser.add_argument("--n", type=int, default=500, help="Operaciones por caso")
+    args = parser.parse_args()
+    asyncio.run(main(args.n))
@@ -0,0 +1,75 @@
+"""
+Microbenchmark de serialización de listados: compara el camino anterior
+(convert_id_to_str recursivo + validación con RegistroResponse + codificación JSON de FastAPI)
+con BSONJSONResponse, que codifica los documentos de Motor directamente a bytes JSON.
+
+No necesita MongoDB. Uso (desde la carpeta app/):
+    python -m benchmarks.bench_serializacion --n 100000
+"""
+import argparse
+import json
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, List
+
+from bson import ObjectId
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+from schemas.registro_schema import RegistroResponse
+from utils.serialization import BSONJSONResponse, convert_id_to_str, orjson
+
+
+def _documentos(n: int) -> List[dict]:
+    inicio = datetime(2024, 1, 1)
+    return [
+        {
+            "_id": ObjectId(),
+            "usuario_id": "60c72b2f9f1b2c3d4e5f6a7b",
+            "ejercicio_id": "60c72b2f9f1b2c3d4e5f6a7c",
+            "ejercicio_nombre": "Press de Banca",
+            "peso_levantado": 80.0 + (i % 20),
+            "repeticiones": 8,
+            "fecha_registro": inicio + timedelta(minutes=i),
+            "notas": "Bien, pero pesado" if i % 3 == 0 else None,
+        }
+        for i in range(n)
+    ]
+
+
+def _medir(nombre: str, funcion: Callable[[], Any], repeticiones: int) -> float:
+    mejor = float("inf")
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        mejor = min(mejor, time.perf_counter() - inicio)
+    print(f"  {nombre:<45} {mejor * 1000:10.1f} ms")
+    return mejor
+
+
+def main(n: int, repeticiones: int) -> None:
+    documentos = _documentos(n)
+    adapter = TypeAdapter(List[RegistroResponse])
+
+    def camino_anterior() -> bytes:
+        # Lo que hacía cada listado: conversión en el controlador y validación + codificación en FastAPI
+        convertidos = [convert_id_to_str(d) for d in documentos]
+        validados = adapter.validate_python(convertidos)
+        contenido = jsonable_encoder(validados, by_alias=True, custom_encoder={ObjectId: str})
+        return json.dumps(contenido, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    def camino_actual() -> bytes:
+        return BSONJSONResponse(documentos, model=RegistroResponse).body
+
+    print(f"Serialización de {n} registros (mejor de {repeticiones}; orjson {'disponible' if orjson else 'no instalado'})")
+    anterior = _medir("convert_id_to_str + Pydantic + jsonable_encoder", camino_anterior, repeticiones)
+    actual = _medir("BSONJSONResponse (campos del modelo)", camino_actual, repeticiones)
+    print(f"  Mejora: x{anterior / actual:.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Coste de serializar listados grandes")
+    parser.add_argument("--n", type=int, default=100_000, help="Número de documentos")
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+    main(args.n, args.repeticiones)
@@ -0,0 +1,120 @@
+"""
+Compara el almacenamiento de los registros en una colección normal y en una colección de
+series temporales: tamaño en disco (storageStats) y latencia de la consulta por rango de
+fechas de registro_controller.get_registros_por_fecha.
+
+Se usa una base de datos temporal '<DB_NAME>_bench' que se elimina al terminar.
+Uso (desde la carpeta app/):
+    python -m benchmarks.bench_timeseries --usuarios 50 --registros 200000
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, List
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import TEXT
+
+from connection.indexes import INDEXES
+from connection.registros_storage import TIMESERIES_OPTIONS
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017")
+DB_NAME = os.getenv("DB_NAME", "fitflow")
+
+EJERCICIOS = ["Press de Banca", "Sentadilla", "Peso Muerto", "Remo con Barra", "Press Militar", "Dominadas"]
+
+
+def _registros(usuarios: List[str], n: int) -> List[Dict[str, Any]]:
+    inicio = datetime(2023, 1, 1)
+    return [
+        {
+            "usuario_id": random.choice(usuarios),
+            "ejercicio_id": None,
+            "ejercicio_nombre": random.choice(EJERCICIOS),
+            "peso_levantado": float(random.randint(20, 180)),
+            "repeticiones": random.randint(1, 15),
+            "fecha_registro": inicio + timedelta(minutes=random.randint(0, 60 * 24 * 730)),
+            "notas": None,
+        }
+        for _ in range(n)
+    ]
+
+
+async def _storage(db, nombre: str) -> Dict[str, Any]:
+    # $collStats funciona igual en colecciones normales y de series temporales
+    stats = await db[nombre].aggregate([{"$collStats": {"storageStats": {}}}]).to_list(1)
+    storage = stats[0]["storageStats"] if stats else {}
+    return {
+        "documentos": storage.get("count"),
+        "datos_mb": storage.get("size", 0) / 1e6,
+        "disco_mb": storage.get("storageSize", 0) / 1e6,
+        "indices_mb": storage.get("totalIndexSize", 0) / 1e6,
+    }
+
+
+async def _latencias(coleccion, usuarios: List[str], consultas: int) -> List[float]:
+    tiempos = []
+    for _ in range(consultas):
+        usuario_id = random.choice(usuarios)
+        desde = datetime(2023, 1, 1) + timedelta(days=random.randint(0, 700))
+        hasta = desde + timedelta(days=30)
+        inicio = time.perf_counter()
+        # Misma consulta que get_registros_por_fecha
+        await coleccion.find({
+            "usuario_id": usuario_id,
+            "fecha_registro": {"$gte": desde, "$lte": hasta}
+        }).sort("fecha_registro", -1).to_list(None)
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+    return tiempos
+
+
+def _resumen(tiempos: List[float]) -> str:
+    tiempos = sorted(tiempos)
+    p95 = tiempos[int(len(tiempos) * 0.95) - 1]
+    return f"media {statistics.mean(tiempos):7.3f} ms | p50 {statistics.median(tiempos):7.3f} ms | p95 {p95:7.3f} ms"
+
+
+async def main(n_usuarios: int, n_registros: int, consultas: int, batch_size: int) -> None:
+    client = AsyncIOMotorClient(MONGO_URI)
+    db = client[f"{DB_NAME}_bench"]
+    try:
+        usuarios = [f"{i:024x}" for i in range(n_usuarios)]
+        await db.create_collection("registros_ts", timeseries=TIMESERIES_OPTIONS)
+        for nombre in ("registros", "registros_ts"):
+            for claves, opciones in INDEXES["registros"]:
+                if any(tipo == TEXT for _, tipo in claves):
+                    continue # Las colecciones de series temporales no admiten índices de texto
+                await db[nombre].create_index(claves, **opciones)
+
+        print(f"Insertando {n_registros} registros de {n_usuarios} usuarios en ambas colecciones...")
+        for i in range(0, n_registros, batch_size):
+            lote = _registros(usuarios, min(batch_size, n_registros - i))
+            await db.registros.insert_many([dict(r) for r in lote])
+            await db.registros_ts.insert_many([dict(r) for r in lote])
+
+        for nombre in ("registros", "registros_ts"):
+            storage = await _storage(db, nombre)
+            tiempos = await _latencias(db[nombre], usuarios, consultas)
+            print(f"\n== {nombre} ==")
+            print(f"  datos {storage['datos_mb']:.1f} MB | disco {storage['disco_mb']:.1f} MB | índices {storage['indices_mb']:.1f} MB")
+            print(f"  get_registros_por_fecha (30 días, {consultas} consultas): {_resumen(tiempos)}")
+    finally:
+        await client.drop_database(f"{DB_NAME}_bench")
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Colección normal vs. series temporales para los registros")
+    parser.add_argument("--usuarios", type=int, default=50)
+    parser.add_argument("--registros", type=int, default=200_000)
+    parser.add_argument("--consultas", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    args = parser.parse_args()
+    asyncio.run(main(args.usuarios, args.registros, args.consultas, args.batch_size))
@@ -0,0 +1,51 @@
+import os
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import AsyncIterator, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+# Bloqueos entre procesos en la colección 'bloqueos' (un documento por nombre).
+# Sirven para que, con varios workers, solo uno haga las tareas de arranque que borran y
+# reconstruyen una colección. Un bloqueo caduca a los BLOQUEO_TTL segundos por si el
+# proceso que lo tenía termina sin liberarlo.
+BLOQUEO_TTL = float(os.getenv("BLOQUEO_TTL", "600"))
+
+
+async def reclamar(db: AsyncIOMotorDatabase, nombre: str, ttl: float = BLOQUEO_TTL) -> Optional[str]:
+    """
+    Intenta obtener el bloqueo 'nombre'. Devuelve un token si lo obtiene y None si lo tiene
+    otro proceso. Un único find_one_and_update: o crea el documento o toma uno caducado.
+    """
+    ahora = datetime.now(timezone.utc)
+    token = uuid.uuid4().hex
+    try:
+        documento = await db.bloqueos.find_one_and_update(
+            {"_id": nombre, "expira": {"$lt": ahora}},
+            {"$set": {"token": token, "expira": ahora + timedelta(seconds=ttl), "pid": os.getpid()}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+    except DuplicateKeyError:
+        # El documento existe y no ha caducado: el upsert intentó insertar el mismo _id
+        return None
+    return token if documento and documento.get("token") == token else None
+
+
+async def liberar(db: AsyncIOMotorDatabase, nombre: str, token: str) -> None:
+    await db.bloqueos.delete_one({"_id": nombre, "token": token})
+
+
+@asynccontextmanager
+async def bloqueo(db: AsyncIOMotorDatabase, nombre: str, ttl: float = BLOQUEO_TTL) -> AsyncIterator[bool]:
+    """
+    async with bloqueo(db, "progreso_usuario") as obtenido: ... (obtenido es False si lo tiene otro proceso).
+    """
+    token = await reclamar(db, nombre, ttl)
+    try:
+        yield token is not None
+    finally:
+        if token is not None:
+            await liberar(db, nombre, token)
@@ -1,28 +1,152 @@
-from motor.motor_asyncio import AsyncIOMotorClient # ¡Cambio clave aquí!
-from typing import Optional
+from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase # ¡Cambio clave aquí!
+from fastapi import HTTPException
+from pymongo import ReadPreference
+from typing import Optional, Dict, Any, List
+import importlib.util
 import os
 from dotenv import load_dotenv
+from connection.indexes import ensure_indexes
+from connection.registros_storage import asegurar_coleccion_registros, nombre_coleccion_registros
+from connection.pool_metrics import PoolMetricsListener
+from utils.logger import get_logger
 
 load_dotenv()
 
+logger = get_logger("connection.database")
+
 MONGO_URI = os.getenv("MONGO_URI")
 DB_NAME = os.getenv("DB_NAME")
 
+# --- Configuración del pool (variables de entorno) ---
+MONGO_MAX_POOL_SIZE = int(os.getenv("MONGO_MAX_POOL_SIZE", "100"))
+MONGO_MIN_POOL_SIZE = int(os.getenv("MONGO_MIN_POOL_SIZE", "0"))
+# Tiempo máximo esperando una conexión libre del pool (0 o vacío = sin límite)
+MONGO_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "0") or 0)
+# Compresores de red en orden de preferencia, p. ej. "zstd,snappy,zlib"
+MONGO_COMPRESSORS = os.getenv("MONGO_COMPRESSORS", "")
+# Preferencia de lectura de las rutas de análisis (agregaciones, progreso, estadísticas).
+# 'primary' por defecto: el cliente las lee justo después de escribir y un secundario podría
+# no tener aún la serie o el récord recién creado. Con secundarios, las lecturas pueden ir retrasadas.
+MONGO_ANALYTICS_READ_PREFERENCE = os.getenv("MONGO_ANALYTICS_READ_PREFERENCE", "primary")
+
+_READ_PREFERENCES = {
+    "primary": ReadPreference.PRIMARY,
+    "primaryPreferred": ReadPreference.PRIMARY_PREFERRED,
+    "secondary": ReadPreference.SECONDARY,
+    "secondaryPreferred": ReadPreference.SECONDARY_PREFERRED,
+    "nearest": ReadPreference.NEAREST,
+}
+
+# Paquete de Python que necesita cada compresor (zlib va incluido en la biblioteca estándar)
+_COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": None}
+
+
 class Database:
     client: Optional[AsyncIOMotorClient] = None # Tipo de cliente actualizado
+    db: Optional[AsyncIOMotorDatabase] = None
+    analytics_db: Optional[AsyncIOMotorDatabase] = None
+    pool_metrics = PoolMetricsListener()
+    compresores: List[str] = []
+
+
+def _compresores_disponibles() -> List[str]:
+    """
+    Filtra MONGO_COMPRESSORS dejando solo los compresores cuyo paquete está instalado.
+    """
+    disponibles = []
+    for nombre in (c.strip() for c in MONGO_COMPRESSORS.split(",") if c.strip()):
+        if nombre not in _COMPRESSOR_MODULES:
+            logger.warning("Compresor desconocido en MONGO_COMPRESSORS: %s", nombre)
+            continue
+        modulo = _COMPRESSOR_MODULES[nombre]
+        if modulo is not None and importlib.util.find_spec(modulo) is None:
+            logger.warning("Compresor '%s' no disponible (falta el paquete '%s')", nombre, modulo)
+            continue
+        disponibles.append(nombre)
+    return disponibles
+
+
+def _client_options() -> Dict[str, Any]:
+    options: Dict[str, Any] = {
+        "maxPoolSize": MONGO_MAX_POOL_SIZE,
+        "minPoolSize": MONGO_MIN_POOL_SIZE,
+        "event_listeners": [Database.pool_metrics],
+    }
+    if MONGO_WAIT_QUEUE_TIMEOUT_MS > 0:
+        options["waitQueueTimeoutMS"] = MONGO_WAIT_QUEUE_TIMEOUT_MS
+    Database.compresores = _compresores_disponibles()
+    if Database.compresores:
+        options["compressors"] = ",".join(Database.compresores)
+    return options
+
+
+def _analytics_read_preference():
+    read_preference = _READ_PREFERENCES.get(MONGO_ANALYTICS_READ_PREFERENCE)
+    if read_preference is None:
+        logger.warning("MONGO_ANALYTICS_READ_PREFERENCE desconocida (%s); se usa 'primary'", MONGO_ANALYTICS_READ_PREFERENCE)
+        return ReadPreference.PRIMARY
+    return read_preference
+
 
 async def connect_to_mongo(): # ¡Ahora es una función asíncrona!
     try:
-        Database.client = AsyncIOMotorClient(MONGO_URI) # ¡Cambio clave aquí!
-        db = Database.client[DB_NAME]
-        print(f"Conectado a la base de datos {DB_NAME} en {MONGO_URI}")
-        return db
+        options = _client_options()
+        Database.client = AsyncIOMotorClient(MONGO_URI, **options) # ¡Cambio clave aquí!
+        Database.db = Database.client[DB_NAME]
+        Database.analytics_db = Database.client.get_database(DB_NAME, read_preference=_analytics_read_preference())
+        logger.info(
+            "Conectado a la base de datos %s (maxPoolSize=%s, minPoolSize=%s, compresores=%s)",
+            DB_NAME, MONGO_MAX_POOL_SIZE, MONGO_MIN_POOL_SIZE, options.get("compressors", "ninguno")
+        )
+        await asegurar_coleccion_registros(Database.db) # Colección de series temporales si REGISTROS_STORAGE=timeseries
+        logger.info("Registros almacenados en la colección '%s'", nombre_coleccion_registros())
+        await ensure_indexes(Database.db) # Índices declarados en connection/indexes.py (idempotente)
+        return Database.db
     except Exception as e:
-        print(f"Error al conectar a la base de datos: {e}")
+        logger.error("Error al conectar a la base de datos: %s", e)
         raise e
 
 async def close_mongo_connection(): # ¡Ahora es una función asíncrona!
     if Database.client:
         Database.client.close()
-        print("Conexión a la base de datos cerrada.")
+        Database.client = None
+        Database.db = None
+        Database.analytics_db = None
+        logger.info("Conexión a la base de datos cerrada.")
+
+
+# --- Dependencias de FastAPI ---
+
+async def get_database() -> AsyncIOMotorDatabase:
+    """
+    Base de datos principal (lecturas y escrituras sobre el primario).
+    """
+    if Database.db is None:
+        raise HTTPException(status_code=500, detail="Database client not initialized")
+    return Database.db
+
+
+async def get_analytics_database() -> AsyncIOMotorDatabase:
+    """
+    Base de datos para las rutas de análisis de solo lectura, con la preferencia de lectura
+    de MONGO_ANALYTICS_READ_PREFERENCE (p. ej., para descargar el primario en un replica set).
+    """
+    if Database.analytics_db is None:
+        raise HTTPException(status_code=500, detail="Database client not initialized")
+    return Database.analytics_db
+
 
+def get_pool_metrics() -> Dict[str, Any]:
+    """
+    Configuración del pool y métricas por servidor recogidas por el listener.
+    """
+    return {
+        "configuracion": {
+            "maxPoolSize": MONGO_MAX_POOL_SIZE,
+            "minPoolSize": MONGO_MIN_POOL_SIZE,
+            "waitQueueTimeoutMS": MONGO_WAIT_QUEUE_TIMEOUT_MS or None,
+            "compresores": Database.compresores,
+            "analytics_read_preference": MONGO_ANALYTICS_READ_PREFERENCE,
+        },
+        "servidores": Database.pool_metrics.snapshot(MONGO_MAX_POOL_SIZE),
+    }
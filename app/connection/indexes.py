@@ -0,0 +1,219 @@
+from datetime import datetime
+from bson import ObjectId
+from typing import List, Dict, Any, Tuple
+from pymongo import ASCENDING, DESCENDING, TEXT
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from connection.registros_storage import es_timeseries, nombre_coleccion_registros
+from utils.logger import get_logger, payload
+
+logger = get_logger("connection.indexes")
+
+# --- Registro declarativo de índices por colección ---
+# Cada entrada es (claves, opciones). Los nombres son explícitos para que
+# create_index sea idempotente entre arranques.
+INDEXES: Dict[str, List[Tuple[List[Tuple[str, Any]], Dict[str, Any]]]] = {
+    "usuarios": [
+        ([("email", ASCENDING)], {"name": "email_1"}),
+    ],
+    "ejercicios": [
+        ([("usuario_id", ASCENDING)], {"name": "usuario_id_1"}),
+        ([("conversacion_id", ASCENDING)], {"name": "conversacion_id_1"}),
+        # busqueda_controller.buscar_ejercicios (el nombre pesa más que la descripción)
+        ([("nombre", TEXT), ("descripcion", TEXT)],
+         {"name": "nombre_descripcion_text", "default_language": "spanish", "weights": {"nombre": 5, "descripcion": 1}}),
+        # ejercicio_controller.resolver_ejercicio: un ejercicio por nombre normalizado
+        ([("nombre_normalizado", ASCENDING)],
+         {"name": "nombre_normalizado_1", "unique": True, "partialFilterExpression": {"nombre_normalizado": {"$type": "string"}}}),
+    ],
+    "registros": [
+        # get_historial_por_ejercicio y reconstrucción del progreso y los rollups
+        ([("usuario_id", ASCENDING), ("ejercicio_id", ASCENDING), ("fecha_registro", DESCENDING)],
+         {"name": "usuario_ejercicio_id_fecha"}),
+        # get_registros_by_usuario, get_registros_por_fecha y agregaciones de progreso
+        ([("usuario_id", ASCENDING), ("fecha_registro", DESCENDING)], {"name": "usuario_fecha"}),
+        # get_ultimos_registros (dashboard)
+        ([("fecha_registro", DESCENDING)], {"name": "fecha"}),
+        # busqueda_controller.buscar_registros (no se crea en la colección de series temporales)
+        ([("notas", TEXT)], {"name": "notas_text", "default_language": "spanish"}),
+    ],
+    "logros": [
+        # get_logros_by_usuario, get_logros_tipo
+        ([("usuario_id", ASCENDING), ("tipo", ASCENDING)], {"name": "usuario_tipo"}),
+        # records_controller: un logro automático por registro y tipo de récord
+        ([("registro_id", ASCENDING), ("tipo", ASCENDING)],
+         {"name": "registro_tipo", "unique": True, "partialFilterExpression": {"registro_id": {"$exists": True}}}),
+    ],
+    "records_personales": [
+        # Un documento de máximos por usuario y ejercicio (controllers/records_controller.py)
+        ([("usuario_id", ASCENDING), ("ejercicio_id", ASCENDING)], {"name": "usuario_ejercicio_id", "unique": True}),
+    ],
+    "progreso_usuario": [
+        # Un documento por usuario y ejercicio (controllers/progreso_controller.py)
+        ([("usuario_id", ASCENDING), ("ejercicio_id", ASCENDING)], {"name": "usuario_ejercicio_id", "unique": True}),
+    ],
+    "registros_rollup": [
+        # Un bucket por usuario, granularidad, ejercicio e inicio (controllers/rollup_controller.py)
+        ([("usuario_id", ASCENDING), ("granularidad", ASCENDING), ("ejercicio_id", ASCENDING), ("inicio", ASCENDING)],
+         {"name": "usuario_granularidad_ejercicio_id_inicio", "unique": True}),
+        # get_rollups sin ejercicio: rango de fechas de todos los ejercicios del usuario
+        ([("usuario_id", ASCENDING), ("granularidad", ASCENDING), ("inicio", ASCENDING)], {"name": "usuario_granularidad_inicio"}),
+    ],
+    "estado_animo_usuario": [
+        # Un resumen por usuario (controllers/estado_animo_controller.py)
+        ([("usuario_id", ASCENDING)], {"name": "usuario_id_1", "unique": True}),
+    ],
+    "llm_cache": [
+        # Caché de respuestas del chatbot: MongoDB borra cada documento al llegar a 'expira'
+        ([("expira", ASCENDING)], {"name": "expira_ttl", "expireAfterSeconds": 0}),
+    ],
+    "conversaciones": [
+        # get_conversaciones_by_usuario, get_ultimos_mensajes, reconstruir_estado_animo
+        ([("usuario_id", ASCENDING), ("fecha", DESCENDING)], {"name": "usuario_fecha"}),
+        # get_mensajes_por_tema
+        ([("usuario_id", ASCENDING), ("tema", ASCENDING)], {"name": "usuario_tema"}),
+        # busqueda_controller.buscar_conversaciones
+        ([("mensaje", TEXT)], {"name": "mensaje_text", "default_language": "spanish"}),
+    ],
+}
+
+# Índices sustituidos por otros: ensure_indexes los elimina si siguen existiendo.
+# Los agrupados por 'ejercicio_nombre' se cambiaron por 'ejercicio_id' (scripts/migrar_ejercicio_id.py);
+# los antiguos únicos impedirían tener dos ejercicios con el mismo nombre en el progreso y los rollups.
+INDEXES_OBSOLETOS: Dict[str, List[str]] = {
+    "registros": ["usuario_ejercicio_fecha"],
+    "progreso_usuario": ["usuario_ejercicio"],
+    "registros_rollup": ["usuario_granularidad_ejercicio_inicio"],
+}
+
+# --- Formas de consulta de los controladores, para comprobar su plan con explain() ---
+# Los valores son de ejemplo: solo importa la forma del filtro y del orden.
+_SAMPLE_ID = "000000000000000000000000"
+_SAMPLE_OID = ObjectId(_SAMPLE_ID)
+
+QUERY_SHAPES: List[Dict[str, Any]] = [
+    {"nombre": "registro_controller.get_registros_by_usuario", "coleccion": "registros",
+     "filtro": {"usuario_id": _SAMPLE_ID}, "orden": {"fecha_registro": -1}},
+    {"nombre": "registro_controller.get_registros_by_usuario (ejercicio y fechas)", "coleccion": "registros",
+     "filtro": {"usuario_id": _SAMPLE_ID, "ejercicio_id": _SAMPLE_OID,
+                "fecha_registro": {"$gte": datetime(2000, 1, 1), "$lte": datetime(2100, 1, 1)}},
+     "orden": {"fecha_registro": -1}},
+    {"nombre": "registro_controller.get_historial_por_ejercicio", "coleccion": "registros",
+     "filtro": {"usuario_id": _SAMPLE_ID, "ejercicio_id": _SAMPLE_OID}, "orden": {"fecha_registro": -1}},
+    {"nombre": "registro_controller.get_registros_por_fecha", "coleccion": "registros",
+     "filtro": {"usuario_id": _SAMPLE_ID, "fecha_registro": {"$gte": datetime(2000, 1, 1), "$lte": datetime(2100, 1, 1)}},
+     "orden": {"fecha_registro": -1}},
+    {"nombre": "usuario_controller.get_ultimo_peso_por_ejercicio", "coleccion": "progreso_usuario",
+     "filtro": {"usuario_id": _SAMPLE_ID}},
+    {"nombre": "usuario_controller.get_mejor_marca", "coleccion": "progreso_usuario",
+     "filtro": {"usuario_id": _SAMPLE_ID, "ejercicio_id": _SAMPLE_OID}},
+    {"nombre": "records_controller.get_records_usuario", "coleccion": "records_personales",
+     "filtro": {"usuario_id": _SAMPLE_ID}},
+    {"nombre": "rollup_controller.get_rollups", "coleccion": "registros_rollup",
+     "filtro": {"usuario_id": _SAMPLE_ID, "granularidad": "semana", "inicio": {"$gte": datetime(2000, 1, 1)}},
+     "orden": {"inicio": 1}},
+    {"nombre": "logro_controller.get_logros_by_usuario", "coleccion": "logros",
+     "filtro": {"usuario_id": _SAMPLE_ID}},
+    {"nombre": "logro_controller.get_logros_tipo", "coleccion": "logros",
+     "filtro": {"usuario_id": _SAMPLE_ID, "tipo": "Peso"}},
+    {"nombre": "conversacion_controller.get_conversaciones_by_usuario", "coleccion": "conversaciones",
+     "filtro": {"usuario_id": _SAMPLE_ID}},
+    {"nombre": "conversacion_controller.get_ultimos_mensajes", "coleccion": "conversaciones",
+     "filtro": {"usuario_id": _SAMPLE_ID}, "orden": {"fecha": -1}},
+    {"nombre": "estado_animo_controller.get_estado_animo", "coleccion": "estado_animo_usuario",
+     "filtro": {"usuario_id": _SAMPLE_ID}},
+    {"nombre": "conversacion_controller.get_mensajes_por_tema", "coleccion": "conversaciones",
+     "filtro": {"usuario_id": _SAMPLE_ID, "tema": "entrenamiento"}},
+    {"nombre": "ejercicio_controller.get_ejercicios_by_usuario", "coleccion": "ejercicios",
+     "filtro": {"usuario_id": _SAMPLE_ID}},
+    {"nombre": "ejercicio_controller.get_ejercicios_by_conversacion", "coleccion": "ejercicios",
+     "filtro": {"conversacion_id": _SAMPLE_ID}},
+]
+
+
+def _coleccion_real(coleccion: str) -> str:
+    """
+    'registros' se resuelve a la colección activa (normal o de series temporales).
+    """
+    return nombre_coleccion_registros() if coleccion == "registros" else coleccion
+
+
+def _admitido(coleccion: str, claves: List[Tuple[str, Any]]) -> bool:
+    """
+    Las colecciones de series temporales no admiten índices de texto.
+    """
+    return not (coleccion == "registros" and es_timeseries() and any(tipo == TEXT for _, tipo in claves))
+
+
+async def ensure_indexes(db: AsyncIOMotorDatabase) -> Dict[str, List[str]]:
+    """
+    Crea (si no existen) todos los índices declarados en INDEXES y elimina los de INDEXES_OBSOLETOS.
+    create_index no hace nada si el índice ya existe con las mismas claves y opciones.
+    """
+    for nombre, obsoletos in INDEXES_OBSOLETOS.items():
+        coleccion = _coleccion_real(nombre)
+        try:
+            existentes = await db[coleccion].index_information()
+            for indice in obsoletos:
+                if indice in existentes:
+                    await db[coleccion].drop_index(indice)
+                    logger.info("Índice obsoleto %s eliminado de '%s'", indice, coleccion)
+        except Exception as e:
+            logger.error("No se pudieron eliminar los índices obsoletos de '%s': %s", coleccion, e)
+
+    creados: Dict[str, List[str]] = {}
+    for nombre, indices in INDEXES.items():
+        coleccion = _coleccion_real(nombre)
+        creados[coleccion] = []
+        for claves, opciones in indices:
+            if not _admitido(nombre, claves):
+                continue
+            try:
+                creado = await db[coleccion].create_index(claves, **opciones)
+                creados[coleccion].append(creado)
+            except Exception as e:
+                logger.error("No se pudo crear el índice %s en '%s': %s", opciones.get('name'), coleccion, e)
+    logger.debug("Índices asegurados: %s", payload(creados))
+    return creados
+
+
+def _contiene_collscan(plan: Any) -> bool:
+    """
+    Recorre un plan de explain() buscando etapas COLLSCAN.
+    """
+    if isinstance(plan, dict):
+        if plan.get("stage") == "COLLSCAN":
+            return True
+        return any(_contiene_collscan(v) for v in plan.values())
+    if isinstance(plan, list):
+        return any(_contiene_collscan(p) for p in plan)
+    return False
+
+
+async def explain_query_shapes(db: AsyncIOMotorDatabase) -> List[Dict[str, Any]]:
+    """
+    Ejecuta explain() (queryPlanner) sobre cada forma de consulta de QUERY_SHAPES
+    e indica cuáles se resuelven con un COLLSCAN.
+    """
+    resultados = []
+    for shape in QUERY_SHAPES:
+        comando: Dict[str, Any] = {"find": _coleccion_real(shape["coleccion"]), "filter": shape["filtro"]}
+        if shape.get("orden"):
+            comando["sort"] = shape["orden"]
+        try:
+            explain = await db.command({"explain": comando, "verbosity": "queryPlanner"})
+            winning_plan = explain.get("queryPlanner", {}).get("winningPlan", {})
+            resultados.append({
+                "consulta": shape["nombre"],
+                "coleccion": shape["coleccion"],
+                "collscan": _contiene_collscan(winning_plan),
+                "plan": winning_plan,
+            })
+        except Exception as e:
+            logger.error("Error al ejecutar explain para '%s': %s", shape['nombre'], e)
+            resultados.append({
+                "consulta": shape["nombre"],
+                "coleccion": shape["coleccion"],
+                "collscan": None,
+                "error": str(e),
+            })
+    return resultados
@@ -0,0 +1,129 @@
+import threading
+import time
+from typing import Any, Dict
+
+from pymongo import monitoring
+
+# --- Métricas del pool de conexiones ---
+# PyMongo (y por tanto Motor) notifica cada evento del pool a los listeners registrados en el
+# cliente. Los eventos llegan desde los hilos del driver, de ahí el lock.
+
+class PoolMetricsListener(monitoring.ConnectionPoolListener):
+    """
+    Acumula, por servidor, las conexiones abiertas, en uso y en espera, junto con
+    los tiempos de espera para obtener una conexión del pool.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._servidores: Dict[str, Dict[str, Any]] = {}
+        self._esperas: Dict[Any, float] = {}
+
+    def _servidor(self, address) -> Dict[str, Any]:
+        clave = f"{address[0]}:{address[1]}"
+        servidor = self._servidores.get(clave)
+        if servidor is None:
+            servidor = {
+                "abiertas": 0,
+                "en_uso": 0,
+                "en_uso_max": 0,
+                "esperando": 0,
+                "esperando_max": 0,
+                "checkouts": 0,
+                "checkouts_fallidos": 0,
+                "timeouts": 0,
+                "espera_total_ms": 0.0,
+                "espera_max_ms": 0.0,
+                "limpiezas": 0,
+            }
+            self._servidores[clave] = servidor
+        return servidor
+
+    # --- Ciclo de vida del pool ---
+
+    def pool_created(self, event):
+        with self._lock:
+            self._servidor(event.address)
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._servidor(event.address)["limpiezas"] += 1
+
+    def pool_closed(self, event):
+        with self._lock:
+            self._servidores.pop(f"{event.address[0]}:{event.address[1]}", None)
+
+    # --- Conexiones ---
+
+    def connection_created(self, event):
+        with self._lock:
+            self._servidor(event.address)["abiertas"] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            servidor = self._servidor(event.address)
+            servidor["abiertas"] = max(0, servidor["abiertas"] - 1)
+
+    # --- Checkout / checkin ---
+
+    def connection_check_out_started(self, event):
+        with self._lock:
+            servidor = self._servidor(event.address)
+            servidor["esperando"] += 1
+            servidor["esperando_max"] = max(servidor["esperando_max"], servidor["esperando"])
+            self._esperas[threading.get_ident()] = time.perf_counter()
+
+    def _fin_espera(self, servidor: Dict[str, Any]) -> None:
+        servidor["esperando"] = max(0, servidor["esperando"] - 1)
+        inicio = self._esperas.pop(threading.get_ident(), None)
+        if inicio is not None:
+            espera_ms = (time.perf_counter() - inicio) * 1000
+            servidor["espera_total_ms"] += espera_ms
+            servidor["espera_max_ms"] = max(servidor["espera_max_ms"], espera_ms)
+
+    def connection_check_out_failed(self, event):
+        with self._lock:
+            servidor = self._servidor(event.address)
+            self._fin_espera(servidor)
+            servidor["checkouts_fallidos"] += 1
+            if event.reason == monitoring.ConnectionCheckOutFailedReason.TIMEOUT:
+                servidor["timeouts"] += 1
+
+    def connection_checked_out(self, event):
+        with self._lock:
+            servidor = self._servidor(event.address)
+            self._fin_espera(servidor)
+            servidor["checkouts"] += 1
+            servidor["en_uso"] += 1
+            servidor["en_uso_max"] = max(servidor["en_uso_max"], servidor["en_uso"])
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            servidor = self._servidor(event.address)
+            servidor["en_uso"] = max(0, servidor["en_uso"] - 1)
+
+    # --- Consulta ---
+
+    def snapshot(self, max_pool_size: int) -> Dict[str, Dict[str, Any]]:
+        """
+        Devuelve una copia de las métricas por servidor, con la utilización del pool
+        (conexiones en uso / maxPoolSize) y la espera media por checkout.
+        """
+        with self._lock:
+            resultado = {}
+            for clave, servidor in self._servidores.items():
+                datos = dict(servidor)
+                intentos = datos["checkouts"] + datos["checkouts_fallidos"]
+                datos["espera_media_ms"] = round(datos["espera_total_ms"] / intentos, 3) if intentos else 0.0
+                datos["espera_total_ms"] = round(datos["espera_total_ms"], 3)
+                datos["espera_max_ms"] = round(datos["espera_max_ms"], 3)
+                datos["utilizacion"] = round(datos["en_uso"] / max_pool_size, 3) if max_pool_size else None
+                datos["utilizacion_max"] = round(datos["en_uso_max"] / max_pool_size, 3) if max_pool_size else None
+                resultado[clave] = datos
+            return resultado
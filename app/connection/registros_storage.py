@@ -0,0 +1,65 @@
+import os
+from typing import Any, Dict
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from utils.logger import get_logger
+
+load_dotenv()
+
+logger = get_logger("connection.registros_storage")
+
+# --- Almacenamiento de los registros ---
+# 'standard': colección normal 'registros' (por defecto).
+# 'timeseries': colección de series temporales de MongoDB (REGISTROS_TS_COLLECTION), con
+# fecha_registro como timeField y usuario_id como metaField. La forma de los documentos no
+# cambia, así que controladores, esquemas y respuestas son los mismos en ambos modos.
+# El modo 'timeseries' requiere MongoDB 7.0+ (update/delete por _id en series temporales).
+REGISTROS_STORAGE = os.getenv("REGISTROS_STORAGE", "standard").lower()
+REGISTROS_COLLECTION = "registros"
+REGISTROS_TS_COLLECTION = os.getenv("REGISTROS_TS_COLLECTION", "registros_ts")
+
+TIMESERIES_OPTIONS: Dict[str, Any] = {
+    "timeField": "fecha_registro",
+    "metaField": "usuario_id",
+    # Cada usuario registra unas pocas series por sesión: buckets por horas
+    "granularity": "hours",
+}
+
+
+def es_timeseries() -> bool:
+    return REGISTROS_STORAGE == "timeseries"
+
+
+def nombre_coleccion_registros() -> str:
+    return REGISTROS_TS_COLLECTION if es_timeseries() else REGISTROS_COLLECTION
+
+
+def get_registros_collection(db: AsyncIOMotorDatabase) -> AsyncIOMotorCollection:
+    """
+    Colección de registros activa según REGISTROS_STORAGE.
+    """
+    return db[nombre_coleccion_registros()]
+
+
+async def crear_coleccion_timeseries(db: AsyncIOMotorDatabase, nombre: str = REGISTROS_TS_COLLECTION) -> bool:
+    """
+    Crea la colección de series temporales si no existe. Devuelve True si la ha creado.
+    """
+    if nombre in await db.list_collection_names(filter={"name": nombre}):
+        return False
+    await db.create_collection(nombre, timeseries=TIMESERIES_OPTIONS)
+    logger.info("Colección de series temporales '%s' creada", nombre)
+    return True
+
+
+async def asegurar_coleccion_registros(db: AsyncIOMotorDatabase) -> None:
+    """
+    En modo 'timeseries', crea la colección si aún no existe (los índices los añade ensure_indexes).
+    """
+    if not es_timeseries():
+        return
+    try:
+        await crear_coleccion_timeseries(db)
+    except Exception as e:
+        logger.error("Error al crear la colección de series temporales '%s': %s", REGISTROS_TS_COLLECTION, e)
+        raise e
@@ -0,0 +1,99 @@
+import re
+from typing import Optional, Dict, Any
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from connection.registros_storage import es_timeseries, get_registros_collection
+from utils.logger import get_logger, payload
+
+logger = get_logger("controllers.busqueda")
+
+# Búsqueda de texto con los índices de texto de MongoDB (idioma español: sin distinguir
+# mayúsculas ni tildes y con stemming, así "entrenar" encuentra "entrenamiento").
+# Los resultados se ordenan por relevancia ($meta: "textScore") y se paginan con limit/offset.
+
+# --- Funciones auxiliares ---
+
+def _resultado_vacio(limit: int, offset: int) -> Dict[str, Any]:
+    return {"total": 0, "limit": limit, "offset": offset, "resultados": []}
+
+
+async def _buscar_texto(
+    coleccion,
+    texto: str,
+    filtro: Optional[Dict[str, Any]],
+    limit: int,
+    offset: int
+) -> Dict[str, Any]:
+    """
+    Consulta $text sobre una colección con índice de texto y devuelve la página pedida
+    junto con el total de coincidencias. Cada resultado incluye su 'puntuacion'.
+    """
+    query: Dict[str, Any] = {"$text": {"$search": texto}, **(filtro or {})}
+    puntuacion = {"puntuacion": {"$meta": "textScore"}}
+    resultados = await coleccion.find(query, puntuacion) \
+        .sort([("puntuacion", {"$meta": "textScore"})]) \
+        .skip(offset).limit(limit).to_list(limit)
+    total = await coleccion.count_documents(query)
+    return {"total": total, "limit": limit, "offset": offset, "resultados": resultados}
+
+# --- Búsquedas por colección ---
+
+async def buscar_conversaciones(
+    db: AsyncIOMotorDatabase,
+    texto: str,
+    usuario_id: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0
+) -> Dict[str, Any]:
+    """
+    Busca en el texto de los mensajes (de un usuario o de todos).
+    """
+    try:
+        filtro = {"usuario_id": usuario_id} if usuario_id is not None else None
+        resultado = await _buscar_texto(db.conversaciones, texto, filtro, limit, offset)
+        logger.debug("Búsqueda en conversaciones '%s': %s", texto, payload(resultado))
+        return resultado
+    except Exception as e:
+        logger.error("Error al buscar '%s' en las conversaciones: %s", texto, e)
+        return _resultado_vacio(limit, offset)
+
+
+async def buscar_ejercicios(db: AsyncIOMotorDatabase, texto: str, limit: int = 20, offset: int = 0) -> Dict[str, Any]:
+    """
+    Busca ejercicios por nombre y descripción (el nombre pesa más en la relevancia).
+    """
+    try:
+        resultado = await _buscar_texto(db.ejercicios, texto, None, limit, offset)
+        logger.debug("Búsqueda en ejercicios '%s': %s", texto, payload(resultado))
+        return resultado
+    except Exception as e:
+        logger.error("Error al buscar '%s' en los ejercicios: %s", texto, e)
+        return _resultado_vacio(limit, offset)
+
+
+async def buscar_registros(
+    db: AsyncIOMotorDatabase,
+    texto: str,
+    usuario_id: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0
+) -> Dict[str, Any]:
+    """
+    Busca en las notas de los registros (de un usuario o de todos).
+    Las colecciones de series temporales no admiten índices de texto: en ese modo se buscan
+    las palabras con expresiones regulares (sin distinguir mayúsculas) y se ordena por fecha.
+    """
+    try:
+        coleccion = get_registros_collection(db)
+        filtro = {"usuario_id": usuario_id} if usuario_id is not None else {}
+        if not es_timeseries():
+            resultado = await _buscar_texto(coleccion, texto, filtro, limit, offset)
+        else:
+            palabras = [re.escape(p) for p in texto.split() if p]
+            query = {**filtro, "$and": [{"notas": {"$regex": p, "$options": "i"}} for p in palabras]} if palabras else filtro
+            resultados = await coleccion.find(query).sort("fecha_registro", -1).skip(offset).limit(limit).to_list(limit)
+            resultado = {"total": await coleccion.count_documents(query), "limit": limit, "offset": offset, "resultados": resultados}
+        logger.debug("Búsqueda en registros '%s': %s", texto, payload(resultado))
+        return resultado
+    except Exception as e:
+        logger.error("Error al buscar '%s' en los registros: %s", texto, e)
+        return _resultado_vacio(limit, offset)
@@ -0,0 +1,141 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from controllers import conversacion_controller, usuario_controller, llm_cache_controller
+from utils.openai_client import LLMBackend, Mensajes, get_llm_backend
+from utils.serialization import to_sse
+from utils.logger import get_logger
+
+logger = get_logger("controllers.chat")
+
+# Mensajes anteriores del usuario que se incluyen como contexto (solo con LLM_CACHE_ENABLED=false:
+# con la caché activa la respuesta depende únicamente de la pregunta y del progreso)
+CHAT_CONTEXT_MESSAGES = int(os.getenv("CHAT_CONTEXT_MESSAGES", "10"))
+
+SYSTEM_PROMPT = (
+    "Eres el asistente de entrenamiento de FitFlow. Responde en español, de forma breve y práctica, "
+    "y apóyate en el progreso del usuario cuando sea relevante. No des consejos médicos."
+)
+
+# --- Construcción del contexto ---
+
+def _resumen_progreso(analytics: Dict[str, Any]) -> str:
+    """
+    Resume en texto el análisis de 'progreso_usuario' (último peso, mejor marca y volumen).
+    """
+    if not analytics.get("conteo_registros"):
+        return "El usuario todavía no tiene registros de entrenamiento."
+
+    mejores = {m["ejercicio_nombre"]: m.get("mejor_marca") or {} for m in analytics.get("mejores_marcas", [])}
+    lineas = [f"Registros totales: {analytics['conteo_registros']}. Volumen total: {analytics.get('volumen_total', 0):.0f} kg."]
+    for ultimo in analytics.get("ultimo_peso", []):
+        nombre = ultimo["ejercicio_nombre"]
+        linea = f"- {nombre}: último {ultimo.get('ultimo_peso')} kg x {ultimo.get('ultimas_repeticiones')}"
+        if mejores.get(nombre):
+            linea += f"; mejor marca {mejores[nombre].get('peso_levantado')} kg x {mejores[nombre].get('repeticiones')}"
+        lineas.append(linea)
+    return "\n".join(lineas)
+
+
+async def _sin_historial() -> List[Dict[str, Any]]:
+    return []
+
+
+async def construir_contexto(
+    db: AsyncIOMotorDatabase,
+    usuario_id: str,
+    mensaje: str,
+    historial: bool = True
+) -> Tuple[Mensajes, Dict[str, Any]]:
+    """
+    Mensajes para el modelo: instrucciones con el resumen de progreso, los últimos mensajes
+    de la conversación (del más antiguo al más reciente, si 'historial') y el mensaje nuevo.
+    El historial y el progreso se leen a la vez. Devuelve también el análisis usado.
+    """
+    previos, analytics = await asyncio.gather(
+        conversacion_controller.get_ultimos_mensajes(db, usuario_id, CHAT_CONTEXT_MESSAGES) if historial else _sin_historial(),
+        usuario_controller.get_analytics_usuario(db, usuario_id),
+    )
+    mensajes: Mensajes = [{"role": "system", "content": f"{SYSTEM_PROMPT}\n\nProgreso del usuario:\n{_resumen_progreso(analytics)}"}]
+    for previo in reversed(previos):
+        rol = previo.get("rol") if previo.get("rol") in ("user", "assistant") else "user"
+        mensajes.append({"role": rol, "content": previo.get("mensaje", "")})
+    mensajes.append({"role": "user", "content": mensaje})
+    return mensajes, analytics
+
+# --- Chat en streaming (Server-Sent Events) ---
+
+async def _guardar_turno(db: AsyncIOMotorDatabase, usuario_id: str, rol: str, mensaje: str, tema: Optional[str]) -> Optional[str]:
+    creado = await conversacion_controller.create_conversacion(db, {
+        "usuario_id": usuario_id,
+        "fecha": datetime.now(timezone.utc),
+        "rol": rol,
+        "mensaje": mensaje,
+        "tema": tema,
+    })
+    return creado.get("_id") if creado else None
+
+
+async def chat_stream(
+    db: AsyncIOMotorDatabase,
+    usuario_id: str,
+    mensaje: str,
+    tema: Optional[str] = "general",
+    backend: Optional[LLMBackend] = None
+) -> AsyncIterator[str]:
+    """
+    Genera la respuesta del asistente como eventos SSE:
+    - 'token' con cada fragmento de texto ({"texto": ...}) según lo produce el modelo.
+    - 'fin' con los IDs de los dos mensajes guardados, los tiempos y si vino de la caché.
+    - 'error' si el modelo falla (el mensaje del usuario queda guardado igualmente).
+    El mensaje del usuario se guarda antes de llamar al modelo y la respuesta, al terminar.
+    Si el usuario ya hizo la misma pregunta con el mismo progreso y modelo, se reutiliza la
+    respuesta de llm_cache_controller sin llamar al modelo. Con la caché activa no se envía
+    el historial de la conversación: así la respuesta guardada no depende de nada que no
+    forme parte de la clave.
+    """
+    backend = backend or get_llm_backend()
+    inicio = time.perf_counter()
+    mensajes, analytics = await construir_contexto(db, usuario_id, mensaje, historial=not llm_cache_controller.LLM_CACHE_ENABLED)
+    parametros = backend.parametros()
+    clave = llm_cache_controller.clave_cache(mensaje, usuario_id, llm_cache_controller.hash_progreso(analytics), parametros)
+    cacheada, usuario_mensaje_id = await asyncio.gather(
+        llm_cache_controller.get_respuesta(db, clave),
+        _guardar_turno(db, usuario_id, "user", mensaje, tema),
+    )
+
+    fragmentos: List[str] = []
+    ttft_ms: Optional[float] = None
+    if cacheada is not None:
+        ttft_ms = (time.perf_counter() - inicio) * 1000
+        fragmentos.append(cacheada)
+        yield to_sse("token", {"texto": cacheada})
+    else:
+        try:
+            async for fragmento in backend.stream(mensajes):
+                if ttft_ms is None:
+                    ttft_ms = (time.perf_counter() - inicio) * 1000
+                fragmentos.append(fragmento)
+                yield to_sse("token", {"texto": fragmento})
+        except Exception as e:
+            logger.error("Error del modelo (%s) para el usuario '%s': %s", backend.nombre, usuario_id, e)
+            yield to_sse("error", {"detail": "El asistente no está disponible en este momento.", "usuario_mensaje_id": usuario_mensaje_id})
+            return
+
+    respuesta = "".join(fragmentos)
+    if cacheada is None:
+        await llm_cache_controller.guardar_respuesta(db, clave, mensaje, respuesta, parametros)
+    asistente_mensaje_id = await _guardar_turno(db, usuario_id, "assistant", respuesta, tema) if respuesta else None
+    total_ms = (time.perf_counter() - inicio) * 1000
+    logger.info("Chat %s (%s%s): primer token %.0f ms, total %.0f ms", usuario_id, backend.nombre,
+                ", caché" if cacheada is not None else "", ttft_ms or 0, total_ms)
+    yield to_sse("fin", {
+        "usuario_mensaje_id": usuario_mensaje_id,
+        "asistente_mensaje_id": asistente_mensaje_id,
+        "ttft_ms": ttft_ms,
+        "total_ms": total_ms,
+        "cache": cacheada is not None,
+    })
@@ -1,24 +1,15 @@
 from bson import ObjectId
-from datetime import datetime
 from typing import List, Optional, Dict, Any
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from controllers import estado_animo_controller
+from utils.serialization import convert_id_to_str
+from utils.logger import get_logger, payload
 
-# --- Función auxiliar para convertir ObjectId a str de forma recursiva ---
-def _convert_id_to_str(document: Any) -> Any:
-    """
-    Convierte ObjectId en str dentro de un diccionario o lista de diccionarios.
-    Útil para la serialización de respuestas de la API.
-    """
-    if isinstance(document, dict):
-        return {
-            k: str(v) if isinstance(v, ObjectId) else _convert_id_to_str(v)
-            for k, v in document.items()
-        }
-    elif isinstance(document, list):
-        return [_convert_id_to_str(elem) for elem in document]
-    elif isinstance(document, ObjectId):
-        return str(document)
-    return document
+logger = get_logger("controllers.conversacion")
+
+# Intentos de una actualización que depende del valor actual de 'rol' o 'mensaje'
+_REINTENTOS_ACTUALIZACION = 5
 
 # --- Funciones CRUD para Conversaciones ---
 
@@ -28,35 +19,35 @@ async def get_conversacion_by_id(db: AsyncIOMotorDatabase, conversacion_id: str)
     """
     try:
         if not ObjectId.is_valid(conversacion_id):
-            print(f"ERROR (Controller): ID de conversación inválido: {conversacion_id}")
+            logger.warning("ID de conversación inválido: %s", conversacion_id)
             return None
 
         conversacion = await db.conversaciones.find_one({"_id": ObjectId(conversacion_id)})
         if conversacion:
-            processed_conversacion = _convert_id_to_str(conversacion)
-            print(f"DEBUG (Controller): Conversación recuperada por ID ({conversacion_id}): {processed_conversacion}")
+            processed_conversacion = convert_id_to_str(conversacion)
+            logger.debug("Conversación recuperada por ID (%s): %s", conversacion_id, payload(processed_conversacion))
             return processed_conversacion
-        print(f"DEBUG (Controller): Conversación no encontrada para ID: {conversacion_id}")
+        logger.debug("Conversación no encontrada para ID: %s", conversacion_id)
         return None
     except Exception as e:
-        print(f"ERROR (Controller): Error al recuperar la conversación '{conversacion_id}': {e}")
+        logger.error("Error al recuperar la conversación '%s': %s", conversacion_id, e)
         return None
 
 
-async def get_all_conversaciones(db: AsyncIOMotorDatabase) -> List[Dict[str, Any]]:
+async def get_all_conversaciones(db: AsyncIOMotorDatabase, projection: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
     """
     Obtiene todas las conversaciones de la base de datos.
+    Con 'projection' solo se leen los campos indicados (p. ej., sin el texto del mensaje).
     """
     try:
-        conversaciones = await db.conversaciones.find().to_list(None)
-        processed_conversaciones = [_convert_id_to_str(c) for c in conversaciones]
-        if not processed_conversaciones:
-            print("DEBUG (Controller): No se encontraron conversaciones.")
+        conversaciones = await db.conversaciones.find({}, projection).to_list(None)
+        if not conversaciones:
+            logger.debug("No se encontraron conversaciones.")
         
-        print(f"DEBUG (Controller): Conversaciones recuperadas: {processed_conversaciones}")
-        return processed_conversaciones
+        logger.debug("Conversaciones recuperadas: %s", payload(conversaciones))
+        return conversaciones
     except Exception as e:
-        print(f"ERROR (Controller): Error al recuperar las conversaciones: {e}")
+        logger.error("Error al recuperar las conversaciones: %s", e)
         return []
 
 
@@ -65,21 +56,22 @@ async def create_conversacion(db: AsyncIOMotorDatabase, conversacion_data: Dict[
     Crea una nueva conversación en la base de datos.
     """
     try:
+        # El mensaje se puntúa una sola vez, al crearse (None para las respuestas del asistente)
+        conversacion_data["sentimiento"] = estado_animo_controller.puntuar_mensaje(conversacion_data)
         result = await db.conversaciones.insert_one(conversacion_data)
         
         if not result.acknowledged:
-            print("ERROR (Controller): Fallo en el reconocimiento de la inserción de conversación.")
+            logger.error("Fallo en el reconocimiento de la inserción de conversación.")
             return None
         
-        created_conversacion = await db.conversaciones.find_one({"_id": result.inserted_id})
-        if created_conversacion:
-            processed_conversacion = _convert_id_to_str(created_conversacion)
-            print(f"DEBUG (Controller): Conversación creada: {processed_conversacion}")
-            return processed_conversacion
-        print("ERROR (Controller): No se pudo recuperar la conversación recién creada.")
-        return None
+        # insert_one añade el _id generado al propio diccionario: no hace falta volver a leerlo
+        conversacion_data["_id"] = result.inserted_id
+        await estado_animo_controller.aplicar_mensaje_creado(db, conversacion_data)
+        processed_conversacion = convert_id_to_str(conversacion_data)
+        logger.debug("Conversación creada: %s", payload(processed_conversacion))
+        return processed_conversacion
     except Exception as e:
-        print(f"ERROR (Controller): Error al crear la conversación: {e}")
+        logger.error("Error al crear la conversación: %s", e)
         return None
 
 
@@ -89,28 +81,49 @@ async def update_conversacion(db: AsyncIOMotorDatabase, conversacion_id: str, co
     """
     try:
         if not ObjectId.is_valid(conversacion_id):
-            print(f"ERROR (Controller): ID de conversación inválido: {conversacion_id}")
+            logger.warning("ID de conversación inválido: %s", conversacion_id)
             return None
 
         object_id = ObjectId(conversacion_id)
         
         conversacion_data.pop('id', None)
         conversacion_data.pop('_id', None)
-
-        await db.conversaciones.update_one(
-            {"_id": object_id},
-            {"$set": conversacion_data}
-        )
-        
-        updated_conversacion = await db.conversaciones.find_one({"_id": object_id})
-        if updated_conversacion:
-            processed_conversacion = _convert_id_to_str(updated_conversacion)
-            print(f"DEBUG (Controller): Conversación actualizada: {processed_conversacion}")
-            return processed_conversacion
-        print(f"DEBUG (Controller): Conversación no encontrada o no se pudo recuperar después de la actualización para ID: {conversacion_id}")
+        conversacion_data.pop('sentimiento', None)
+
+        # La puntuación depende de 'rol' y 'mensaje'. Si solo llega uno de los dos, se lee el otro y
+        # la actualización solo se aplica si no ha cambiado entretanto (si no, se vuelve a intentar).
+        # El documento anterior lo devuelve la propia actualización; el nuevo se deriva de él.
+        campos = {"mensaje", "rol"} & conversacion_data.keys()
+        for _ in range(_REINTENTOS_ACTUALIZACION):
+            filtro: Dict[str, Any] = {"_id": object_id}
+            if campos:
+                completo = dict(conversacion_data)
+                for campo in {"mensaje", "rol"} - campos:
+                    actual = await db.conversaciones.find_one({"_id": object_id}, {campo: 1})
+                    if actual is None:
+                        logger.debug("Conversación no encontrada para actualizar con ID: %s", conversacion_id)
+                        return None
+                    filtro[campo] = completo[campo] = actual.get(campo)
+                conversacion_data["sentimiento"] = estado_animo_controller.puntuar_mensaje(completo)
+
+            anterior = await db.conversaciones.find_one_and_update(
+                filtro,
+                {"$set": conversacion_data},
+                return_document=ReturnDocument.BEFORE
+            )
+            if anterior is not None:
+                updated_conversacion = {**anterior, **conversacion_data}
+                await estado_animo_controller.aplicar_mensaje_actualizado(db, anterior, updated_conversacion)
+                processed_conversacion = convert_id_to_str(updated_conversacion)
+                logger.debug("Conversación actualizada: %s", payload(processed_conversacion))
+                return processed_conversacion
+            if len(filtro) == 1:
+                logger.debug("Conversación no encontrada para actualizar con ID: %s", conversacion_id)
+                return None
+        logger.warning("Conversación '%s' modificada concurrentemente; no se ha actualizado", conversacion_id)
         return None
     except Exception as e:
-        print(f"ERROR (Controller): Error al actualizar la conversación '{conversacion_id}': {e}")
+        logger.error("Error al actualizar la conversación '%s': %s", conversacion_id, e)
         return None
 
 
@@ -120,19 +133,22 @@ async def delete_conversacion(db: AsyncIOMotorDatabase, conversacion_id: str) ->
     """
     try:
         if not ObjectId.is_valid(conversacion_id):
-            print(f"ERROR (Controller): ID de conversación inválido: {conversacion_id}")
+            logger.warning("ID de conversación inválido: %s", conversacion_id)
             return False
         
-        result = await db.conversaciones.delete_one({"_id": ObjectId(conversacion_id)})
+        # find_one_and_delete devuelve el mensaje borrado para descontarlo del estado de ánimo
+        eliminada = await db.conversaciones.find_one_and_delete({"_id": ObjectId(conversacion_id)})
         
-        if result.deleted_count == 0:
-            print(f"DEBUG (Controller): Conversación no encontrada para eliminar con ID: {conversacion_id}")
+        if eliminada is None:
+            logger.debug("Conversación no encontrada para eliminar con ID: %s", conversacion_id)
             return False
         
-        print(f"DEBUG (Controller): Conversación eliminada ({conversacion_id}): True")
+        await estado_animo_controller.aplicar_mensaje_eliminado(db, eliminada)
+
+        logger.debug("Conversación eliminada (%s): True", conversacion_id)
         return True
     except Exception as e:
-        print(f"ERROR (Controller): Error al eliminar la conversación '{conversacion_id}': {e}")
+        logger.error("Error al eliminar la conversación '%s': %s", conversacion_id, e)
         return False
 
 
@@ -147,14 +163,13 @@ async def get_conversaciones_by_usuario(db: AsyncIOMotorDatabase, usuario_id: st
 
         conversaciones = await db.conversaciones.find({"usuario_id": query_user_id}).to_list(None)
         
-        processed_conversaciones = [_convert_id_to_str(c) for c in conversaciones]
-        if not processed_conversaciones:
-            print(f"DEBUG (Controller): No se encontraron conversaciones para el usuario {usuario_id}")
+        if not conversaciones:
+            logger.debug("No se encontraron conversaciones para el usuario %s", usuario_id)
         
-        print(f"DEBUG (Controller): Conversaciones para usuario {usuario_id}: {processed_conversaciones}")
-        return processed_conversaciones
+        logger.debug("Conversaciones para usuario %s: %s", usuario_id, payload(conversaciones))
+        return conversaciones
     except Exception as e:
-        print(f"ERROR (Controller): Error al recuperar las conversaciones del usuario '{usuario_id}': {e}")
+        logger.error("Error al recuperar las conversaciones del usuario '%s': %s", usuario_id, e)
         return []
 
 
@@ -167,14 +182,13 @@ async def get_ultimos_mensajes(db: AsyncIOMotorDatabase, usuario_id: str, n: int
 
         mensajes = await db.conversaciones.find({"usuario_id": query_user_id}).sort("fecha", -1).limit(n).to_list(None)
         
-        processed_mensajes = [_convert_id_to_str(m) for m in mensajes]
-        if not processed_mensajes:
-            print(f"DEBUG (Controller): No se encontraron mensajes recientes para el usuario {usuario_id}")
+        if not mensajes:
+            logger.debug("No se encontraron mensajes recientes para el usuario %s", usuario_id)
         
-        print(f"DEBUG (Controller): Últimos {n} mensajes para usuario {usuario_id}: {processed_mensajes}")
-        return processed_mensajes
+        logger.debug("Últimos %s mensajes para usuario %s: %s", n, usuario_id, payload(mensajes))
+        return mensajes
     except Exception as e:
-        print(f"ERROR (Controller): Error al recuperar los últimos mensajes del usuario '{usuario_id}': {e}")
+        logger.error("Error al recuperar los últimos mensajes del usuario '%s': %s", usuario_id, e)
         return []
 
 
@@ -190,42 +204,20 @@ async def get_mensajes_por_tema(db: AsyncIOMotorDatabase, usuario_id: str, tema:
             "tema": tema
         }).to_list(None)
         
-        processed_mensajes = [_convert_id_to_str(m) for m in mensajes]
-        if not processed_mensajes:
-            print(f"DEBUG (Controller): No se encontraron mensajes sobre el tema '{tema}' para el usuario {usuario_id}")
+        if not mensajes:
+            logger.debug("No se encontraron mensajes sobre el tema '%s' para el usuario %s", tema, usuario_id)
         
-        print(f"DEBUG (Controller): Mensajes por tema '{tema}' para usuario {usuario_id}: {processed_mensajes}")
-        return processed_mensajes
+        logger.debug("Mensajes por tema '%s' para usuario %s: %s", tema, usuario_id, payload(mensajes))
+        return mensajes
     except Exception as e:
-        print(f"ERROR (Controller): Error al recuperar los mensajes por tema para el usuario '{usuario_id}': {e}")
+        logger.error("Error al recuperar los mensajes por tema para el usuario '%s': %s", usuario_id, e)
         return []
 
 
-async def analizar_estado_animo(db: AsyncIOMotorDatabase, usuario_id: str) -> Dict[str, str]:
+async def analizar_estado_animo(db: AsyncIOMotorDatabase, usuario_id: str, dias: Optional[int] = None) -> Dict[str, Any]:
     """
     Analiza el estado de ánimo de un usuario basado en sus conversaciones.
-    (Esta es una lógica de PLACEHOLDER; necesitarías integrar un modelo de PNL real aquí).
+    Los mensajes se puntúan al crearse, así que aquí solo se lee el resumen 'estado_animo_usuario'
+    (con 'dias', solo los de los últimos días), sin recorrer las conversaciones.
     """
-    try:
-        query_user_id = usuario_id
-
-        conversaciones = await db.conversaciones.find({"usuario_id": query_user_id}).to_list(None)
-        
-        # No es necesario convertir aquí ya que el resultado final es un dict de strings,
-        # pero si la lógica del análisis dependiera de atributos ObjectId, se haría aquí.
-        
-        if not conversaciones:
-            print(f"DEBUG (Controller): No se encontraron conversaciones para el usuario {usuario_id} para analizar estado de ánimo.")
-            return {"estado_animo": "No disponible"}
-        
-        estado_animo = "Neutral"
-        if any("triste" in msg.get("mensaje", "").lower() for msg in conversaciones):
-            estado_animo = "Negativo"
-        elif any("feliz" in msg.get("mensaje", "").lower() for msg in conversaciones):
-            estado_animo = "Positivo"
-            
-        print(f"DEBUG (Controller): Estado de ánimo analizado para {usuario_id}: {estado_animo}")
-        return {"estado_animo": estado_animo}
-    except Exception as e:
-        print(f"ERROR (Controller): Error al analizar el estado de ánimo del usuario '{usuario_id}': {e}")
-        return {"estado_animo": "Error al analizar"}
+    return await estado_animo_controller.get_estado_animo(db, usuario_id, dias)
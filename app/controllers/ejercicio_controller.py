@@ -1,23 +1,166 @@
+import os
+import unicodedata
 from bson import ObjectId
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from connection.registros_storage import get_registros_collection
+from utils.cache import TTLCache
+from utils.invalidacion import invalidar, suscribir
+from utils.serialization import convert_id_to_str
+from utils.logger import get_logger, payload
 
-# --- Función auxiliar para convertir ObjectId a str de forma recursiva ---
-def _convert_id_to_str(document: Any) -> Any:
+logger = get_logger("controllers.ejercicio")
+
+# --- Caché del catálogo ---
+# El catálogo de ejercicios casi no cambia: el listado completo y cada ejercicio por ID se
+# guardan en memoria (LRU + TTL). Las escrituras de este controlador vacían la caché con
+# utils.invalidacion, que también la propaga a otros workers si está configurado.
+EJERCICIOS_CACHE_TTL = float(os.getenv("EJERCICIOS_CACHE_TTL", "300"))
+EJERCICIOS_CACHE_MAXSIZE = int(os.getenv("EJERCICIOS_CACHE_MAXSIZE", "1024"))
+_catalogo_cache = TTLCache(maxsize=EJERCICIOS_CACHE_MAXSIZE, ttl=EJERCICIOS_CACHE_TTL)
+_TODOS = ("todos",)
+# Cambia con cada invalidación: una lectura que empezó antes no guarda su resultado (ya viejo)
+_generacion = 0
+
+
+def _vaciar_catalogo() -> None:
+    global _generacion
+    _generacion += 1
+    _catalogo_cache.clear()
+
+
+def _guardar_en_cache(clave: Any, valor: Any, generacion: int) -> None:
+    if generacion == _generacion:
+        _catalogo_cache.set(clave, valor)
+
+
+suscribir("ejercicios", _vaciar_catalogo)
+
+
+def get_catalogo_stats() -> Dict[str, Any]:
+    return _catalogo_cache.stats()
+
+# --- Referencias a ejercicios (ejercicio_id) ---
+# Los registros, el progreso y los rollups se agrupan por 'ejercicio_id' (ObjectId del catálogo).
+# La tabla de consulta id <-> nombre se guarda en la misma caché del catálogo, así que cualquier
+# escritura en 'ejercicios' la invalida.
+
+_TABLA = ("tabla",)
+
+
+def normalizar_nombre(nombre: str) -> str:
+    """
+    Nombre comparable: minúsculas, sin tildes y con los espacios colapsados.
+    """
+    sin_tildes = "".join(c for c in unicodedata.normalize("NFKD", (nombre or "").lower()) if not unicodedata.combining(c))
+    return " ".join(sin_tildes.split())
+
+
+async def _tabla_ejercicios(db: AsyncIOMotorDatabase) -> Dict[str, Dict[Any, Any]]:
+    """
+    {"por_id": {ObjectId: nombre}, "por_nombre": {nombre normalizado: ObjectId}} desde la caché.
+    Si dos ejercicios comparten nombre, gana el más antiguo.
+    """
+    tabla = _catalogo_cache.get(_TABLA)
+    if tabla is not None:
+        return tabla
+    generacion = _generacion
+    por_id: Dict[ObjectId, str] = {}
+    por_nombre: Dict[str, ObjectId] = {}
+    async for ejercicio in db.ejercicios.find({}, {"nombre": 1}).sort("_id", 1):
+        por_id[ejercicio["_id"]] = ejercicio.get("nombre")
+        por_nombre.setdefault(normalizar_nombre(ejercicio.get("nombre")), ejercicio["_id"])
+    tabla = {"por_id": por_id, "por_nombre": por_nombre}
+    _guardar_en_cache(_TABLA, tabla, generacion)
+    return tabla
+
+
+async def get_nombres_ejercicios(db: AsyncIOMotorDatabase) -> Dict[ObjectId, str]:
+    """
+    Tabla ejercicio_id -> nombre (en caché) para añadir el nombre a los resultados agrupados por ID.
+    """
+    return (await _tabla_ejercicios(db))["por_id"]
+
+
+def nombre_de(nombres: Dict[ObjectId, str], ejercicio_id: Any) -> Optional[str]:
+    """
+    Nombre de un ejercicio en la tabla; si ya no está en el catálogo, su ID como texto.
+    """
+    if ejercicio_id is None:
+        return None
+    return nombres.get(ejercicio_id) or str(ejercicio_id)
+
+
+async def buscar_ejercicio_id(db: AsyncIOMotorDatabase, valor: Optional[str]) -> Optional[ObjectId]:
+    """
+    ID de un ejercicio a partir de su nombre (o de su ID como texto), sin crear nada.
+    Para los filtros de lectura: devuelve None si no existe.
+    """
+    if not valor:
+        return None
+    tabla = await _tabla_ejercicios(db)
+    encontrado = tabla["por_nombre"].get(normalizar_nombre(valor))
+    if encontrado is None and ObjectId.is_valid(valor):
+        encontrado = ObjectId(valor)
+    return encontrado
+
+
+async def resolver_ejercicio(db: AsyncIOMotorDatabase, ejercicio_id: Any, ejercicio_nombre: Optional[str]) -> Optional[Dict[str, Any]]:
     """
-    Convierte ObjectId en str dentro de un diccionario o lista de diccionarios.
-    Útil para la serialización de respuestas de la API.
+    Resuelve la referencia de un registro contra el catálogo y devuelve {"_id", "nombre"}:
+    1. Si 'ejercicio_id' es un ejercicio existente (en la caché o, si falta, en MongoDB), ese.
+    2. Si no, el ejercicio con el mismo nombre normalizado.
+    3. Si no existe, se crea en el catálogo con ese nombre.
+    Devuelve None si no hay ni ID válido ni nombre.
     """
-    if isinstance(document, dict):
-        return {
-            k: str(v) if isinstance(v, ObjectId) else _convert_id_to_str(v)
-            for k, v in document.items()
-        }
-    elif isinstance(document, list):
-        return [_convert_id_to_str(elem) for elem in document]
-    elif isinstance(document, ObjectId):
-        return str(document)
-    return document
+    tabla = await _tabla_ejercicios(db)
+    if ejercicio_id is not None and ObjectId.is_valid(ejercicio_id):
+        oid = ObjectId(ejercicio_id)
+        if oid in tabla["por_id"]:
+            return {"_id": oid, "nombre": tabla["por_id"][oid]}
+        # Puede haberse creado en otro worker después de cargar esta tabla: se comprueba en
+        # MongoDB antes de resolver por nombre (y de crear un duplicado en el catálogo).
+        ejercicio = await db.ejercicios.find_one({"_id": oid}, {"nombre": 1})
+        if ejercicio is not None:
+            _vaciar_catalogo()
+            return {"_id": oid, "nombre": ejercicio.get("nombre")}
+    if not ejercicio_nombre:
+        return None
+
+    normalizado = normalizar_nombre(ejercicio_nombre)
+    existente = tabla["por_nombre"].get(normalizado)
+    if existente is not None:
+        return {"_id": existente, "nombre": tabla["por_id"][existente]}
+
+    # Alta automática. El upsert sobre 'nombre_normalizado' (índice único) evita duplicados
+    # si dos peticiones crean a la vez el mismo ejercicio.
+    ejercicio = await db.ejercicios.find_one_and_update(
+        {"nombre_normalizado": normalizado},
+        {"$setOnInsert": {"nombre": ejercicio_nombre.strip(), "nombre_normalizado": normalizado, "grupo_muscular": None, "descripcion": None}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    await invalidar("ejercicios")
+    logger.info("Ejercicio '%s' añadido al catálogo (%s)", ejercicio["nombre"], ejercicio["_id"])
+    return {"_id": ejercicio["_id"], "nombre": ejercicio["nombre"]}
+
+
+async def resolver_registros(db: AsyncIOMotorDatabase, registros: List[Dict[str, Any]]) -> None:
+    """
+    Asigna a cada registro su 'ejercicio_id' (ObjectId) y el nombre del catálogo en 'ejercicio_nombre'.
+    Las referencias repetidas se resuelven una sola vez.
+    """
+    resueltos: Dict[Tuple[Any, Optional[str]], Optional[Dict[str, Any]]] = {}
+    for registro in registros:
+        clave = (str(registro.get("ejercicio_id")) if registro.get("ejercicio_id") is not None else None,
+                 normalizar_nombre(registro.get("ejercicio_nombre")) or None)
+        if clave not in resueltos:
+            resueltos[clave] = await resolver_ejercicio(db, registro.get("ejercicio_id"), registro.get("ejercicio_nombre"))
+        ejercicio = resueltos[clave]
+        if ejercicio is not None:
+            registro["ejercicio_id"] = ejercicio["_id"]
+            registro["ejercicio_nombre"] = ejercicio["nombre"]
 
 # --- Funciones CRUD para Ejercicios ---
 
@@ -27,35 +170,46 @@ async def get_ejercicio_by_id(db: AsyncIOMotorDatabase, ejercicio_id: str) -> Op
     """
     try:
         if not ObjectId.is_valid(ejercicio_id):
-            print(f"ERROR (Controller): ID de ejercicio inválido: {ejercicio_id}")
+            logger.warning("ID de ejercicio inválido: %s", ejercicio_id)
             return None
 
+        cached = _catalogo_cache.get(("id", ejercicio_id))
+        if cached is not None:
+            return dict(cached)
+        generacion = _generacion
+
         ejercicio = await db.ejercicios.find_one({"_id": ObjectId(ejercicio_id)})
         if ejercicio:
-            processed_ejercicio = _convert_id_to_str(ejercicio)
-            print(f"DEBUG (Controller): Ejercicio recuperado por ID ({ejercicio_id}): {processed_ejercicio}")
-            return processed_ejercicio
-        print(f"DEBUG (Controller): Ejercicio no encontrado para ID: {ejercicio_id}")
+            processed_ejercicio = convert_id_to_str(ejercicio)
+            _guardar_en_cache(("id", ejercicio_id), processed_ejercicio, generacion)
+            logger.debug("Ejercicio recuperado por ID (%s): %s", ejercicio_id, payload(processed_ejercicio))
+            return dict(processed_ejercicio)
+        logger.debug("Ejercicio no encontrado para ID: %s", ejercicio_id)
         return None
     except Exception as e:
-        print(f"ERROR (Controller): Error al recuperar el ejercicio '{ejercicio_id}': {e}")
+        logger.error("Error al recuperar el ejercicio '%s': %s", ejercicio_id, e)
         return None
 
 
 async def get_all_ejercicios(db: AsyncIOMotorDatabase) -> List[Dict[str, Any]]:
     """
-    Obtiene todos los ejercicios de la base de datos.
+    Obtiene todos los ejercicios de la base de datos (o de la caché del catálogo).
     """
     try:
+        cached = _catalogo_cache.get(_TODOS)
+        if cached is not None:
+            return [dict(e) for e in cached]
+        generacion = _generacion
+
         ejercicios = await db.ejercicios.find().to_list(None)
-        processed_ejercicios = [_convert_id_to_str(e) for e in ejercicios]
-        if not processed_ejercicios:
-            print("DEBUG (Controller): No se encontraron ejercicios.")
+        if not ejercicios:
+            logger.debug("No se encontraron ejercicios.")
         
-        print(f"DEBUG (Controller): Ejercicios recuperados: {processed_ejercicios}")
-        return processed_ejercicios
+        _guardar_en_cache(_TODOS, ejercicios, generacion)
+        logger.debug("Ejercicios recuperados: %s", payload(ejercicios))
+        return [dict(e) for e in ejercicios]
     except Exception as e:
-        print(f"ERROR (Controller): Error al recuperar los ejercicios: {e}")
+        logger.error("Error al recuperar los ejercicios: %s", e)
         return []
 
 
@@ -64,21 +218,21 @@ async def create_ejercicio(db: AsyncIOMotorDatabase, ejercicio_data: Dict[str, A
     Crea un nuevo ejercicio en la base de datos.
     """
     try:
+        ejercicio_data["nombre_normalizado"] = normalizar_nombre(ejercicio_data.get("nombre"))
         result = await db.ejercicios.insert_one(ejercicio_data)
         
         if not result.acknowledged:
-            print("ERROR (Controller): Fallo en el reconocimiento de la inserción de ejercicio.")
+            logger.error("Fallo en el reconocimiento de la inserción de ejercicio.")
             return None
         
-        created_ejercicio = await db.ejercicios.find_one({"_id": result.inserted_id})
-        if created_ejercicio:
-            processed_ejercicio = _convert_id_to_str(created_ejercicio)
-            print(f"DEBUG (Controller): Ejercicio creado: {processed_ejercicio}")
-            return processed_ejercicio
-        print("ERROR (Controller): No se pudo recuperar el ejercicio recién creado.")
-        return None
+        # insert_one añade el _id generado al propio diccionario: no hace falta volver a leerlo
+        ejercicio_data["_id"] = result.inserted_id
+        await invalidar("ejercicios")
+        processed_ejercicio = convert_id_to_str(ejercicio_data)
+        logger.debug("Ejercicio creado: %s", payload(processed_ejercicio))
+        return processed_ejercicio
     except Exception as e:
-        print(f"ERROR (Controller): Error al crear el ejercicio: {e}")
+        logger.error("Error al crear el ejercicio: %s", e)
         return None
 
 
@@ -88,50 +242,69 @@ async def update_ejercicio(db: AsyncIOMotorDatabase, ejercicio_id: str, ejercici
     """
     try:
         if not ObjectId.is_valid(ejercicio_id):
-            print(f"ERROR (Controller): ID de ejercicio inválido: {ejercicio_id}")
+            logger.warning("ID de ejercicio inválido: %s", ejercicio_id)
             return None
 
         object_id = ObjectId(ejercicio_id)
         
         ejercicio_data.pop('id', None)
         ejercicio_data.pop('_id', None)
+        if ejercicio_data.get("nombre"):
+            ejercicio_data["nombre_normalizado"] = normalizar_nombre(ejercicio_data["nombre"])
 
-        await db.ejercicios.update_one(
+        updated_ejercicio = await db.ejercicios.find_one_and_update(
             {"_id": object_id},
-            {"$set": ejercicio_data}
+            {"$set": ejercicio_data},
+            return_document=ReturnDocument.AFTER
         )
-        
-        updated_ejercicio = await db.ejercicios.find_one({"_id": object_id})
         if updated_ejercicio:
-            processed_ejercicio = _convert_id_to_str(updated_ejercicio)
-            print(f"DEBUG (Controller): Ejercicio actualizado: {processed_ejercicio}")
+            await invalidar("ejercicios")
+            if ejercicio_data.get("nombre"):
+                await _propagar_nombre(db, object_id, ejercicio_data["nombre"])
+            processed_ejercicio = convert_id_to_str(updated_ejercicio)
+            logger.debug("Ejercicio actualizado: %s", payload(processed_ejercicio))
             return processed_ejercicio
-        print(f"DEBUG (Controller): Ejercicio no encontrado o no se pudo recuperar después de la actualización para ID: {ejercicio_id}")
+        logger.debug("Ejercicio no encontrado para actualizar con ID: %s", ejercicio_id)
         return None
     except Exception as e:
-        print(f"ERROR (Controller): Error al actualizar el ejercicio '{ejercicio_id}': {e}")
+        logger.error("Error al actualizar el ejercicio '%s': %s", ejercicio_id, e)
         return None
 
 
+async def _propagar_nombre(db: AsyncIOMotorDatabase, ejercicio_id: ObjectId, nombre: str) -> None:
+    """
+    Actualiza la copia del nombre en los registros del ejercicio. El progreso y los rollups
+    se agrupan por ID, así que un cambio de nombre no parte su historial.
+    """
+    try:
+        result = await get_registros_collection(db).update_many({"ejercicio_id": ejercicio_id}, {"$set": {"ejercicio_nombre": nombre}})
+        logger.debug("Nombre del ejercicio %s actualizado en %s registros", ejercicio_id, result.modified_count)
+    except Exception as e:
+        # Las colecciones de series temporales antiguas no admiten este update: el nombre se
+        # sigue resolviendo por ID en el progreso, los rollups y las búsquedas por ejercicio
+        logger.error("No se pudo actualizar el nombre en los registros del ejercicio %s: %s", ejercicio_id, e)
+
+
 async def delete_ejercicio(db: AsyncIOMotorDatabase, ejercicio_id: str) -> bool:
     """
     Elimina un ejercicio por su ID de la base de datos.
     """
     try:
         if not ObjectId.is_valid(ejercicio_id):
-            print(f"ERROR (Controller): ID de ejercicio inválido: {ejercicio_id}")
+            logger.warning("ID de ejercicio inválido: %s", ejercicio_id)
             return False
 
         result = await db.ejercicios.delete_one({"_id": ObjectId(ejercicio_id)})
         
         if result.deleted_count == 0:
-            print(f"DEBUG (Controller): Ejercicio no encontrado para eliminar con ID: {ejercicio_id}")
+            logger.debug("Ejercicio no encontrado para eliminar con ID: %s", ejercicio_id)
             return False
         
-        print(f"DEBUG (Controller): Ejercicio eliminado ({ejercicio_id}): True")
+        await invalidar("ejercicios")
+        logger.debug("Ejercicio eliminado (%s): True", ejercicio_id)
         return True
     except Exception as e:
-        print(f"ERROR (Controller): Error al eliminar el ejercicio '{ejercicio_id}': {e}")
+        logger.error("Error al eliminar el ejercicio '%s': %s", ejercicio_id, e)
         return False
 
 
@@ -141,19 +314,18 @@ async def get_ejercicios_by_usuario(db: AsyncIOMotorDatabase, usuario_id: str) -
     """
     try:
         if not ObjectId.is_valid(usuario_id):
-            print(f"ERROR (Controller): ID de usuario inválido: {usuario_id}")
+            logger.warning("ID de usuario inválido: %s", usuario_id)
             return []
 
         ejercicios = await db.ejercicios.find({"usuario_id": ObjectId(usuario_id)}).to_list(None)
         
-        processed_ejercicios = [_convert_id_to_str(e) for e in ejercicios]
-        if not processed_ejercicios:
-            print(f"DEBUG (Controller): No se encontraron ejercicios para el usuario {usuario_id}.")
+        if not ejercicios:
+            logger.debug("No se encontraron ejercicios para el usuario %s.", usuario_id)
         
-        print(f"DEBUG (Controller): Ejercicios para usuario {usuario_id}: {processed_ejercicios}")
-        return processed_ejercicios
+        logger.debug("Ejercicios para usuario %s: %s", usuario_id, payload(ejercicios))
+        return ejercicios
     except Exception as e:
-        print(f"ERROR (Controller): Error al recuperar los ejercicios del usuario '{usuario_id}': {e}")
+        logger.error("Error al recuperar los ejercicios del usuario '%s': %s", usuario_id, e)
         return []
 
 
@@ -163,17 +335,16 @@ async def get_ejercicios_by_conversacion(db: AsyncIOMotorDatabase, conversacion_
     """
     try:
         if not ObjectId.is_valid(conversacion_id):
-            print(f"ERROR (Controller): ID de conversación inválido: {conversacion_id}")
+            logger.warning("ID de conversación inválido: %s", conversacion_id)
             return []
 
         ejercicios = await db.ejercicios.find({"conversacion_id": ObjectId(conversacion_id)}).to_list(None)
         
-        processed_ejercicios = [_convert_id_to_str(e) for e in ejercicios]
-        if not processed_ejercicios:
-            print(f"DEBUG (Controller): No se encontraron ejercicios para la conversación {conversacion_id}.")
+        if not ejercicios:
+            logger.debug("No se encontraron ejercicios para la conversación %s.", conversacion_id)
         
-        print(f"DEBUG (Controller): Ejercicios para conversación {conversacion_id}: {processed_ejercicios}")
-        return processed_ejercicios
+        logger.debug("Ejercicios para conversación %s: %s", conversacion_id, payload(ejercicios))
+        return ejercicios
     except Exception as e:
-        print(f"ERROR (Controller): Error al recuperar los ejercicios de la conversación '{conversacion_id}': {e}")
+        logger.error("Error al recuperar los ejercicios de la conversación '%s': %s", conversacion_id, e)
         return []
@@ -0,0 +1,249 @@
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Dict, Any
+from pymongo import UpdateOne, ReturnDocument
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from connection.bloqueos import bloqueo
+from utils.helpers import fecha_utc
+from utils.sentiment import get_sentiment_backend
+from utils.logger import get_logger
+
+logger = get_logger("controllers.estado_animo")
+
+# Colección 'estado_animo_usuario': un documento por usuario con los totales de sentimiento de
+# sus mensajes (conteo, suma de puntuaciones, positivos, negativos y neutros) y los mismos
+# totales por día en 'dias'. Cada mensaje se puntúa una sola vez al crearse (campo 'sentimiento'
+# de la conversación) y conversacion_controller mantiene el resumen en cada escritura.
+# Solo se puntúan los mensajes del usuario, no las respuestas del asistente.
+
+# Puntuación a partir de la cual un mensaje (o una media) se considera positivo o negativo
+UMBRAL_MENSAJE = 0.05
+UMBRAL_ESTADO = 0.15
+
+# --- Funciones auxiliares ---
+
+def debe_puntuarse(conversacion: Dict[str, Any]) -> bool:
+    return conversacion.get("rol") != "assistant" and bool(conversacion.get("mensaje"))
+
+
+def puntuar_mensaje(conversacion: Dict[str, Any]) -> Optional[float]:
+    """
+    Puntuación de sentimiento de un mensaje (None para los del asistente).
+    """
+    if not debe_puntuarse(conversacion):
+        return None
+    return round(get_sentiment_backend().puntuar(conversacion["mensaje"]), 4)
+
+
+def _clase(puntuacion: float) -> str:
+    if puntuacion > UMBRAL_MENSAJE:
+        return "positivos"
+    if puntuacion < -UMBRAL_MENSAJE:
+        return "negativos"
+    return "neutros"
+
+
+def _clave_dia(fecha: Any) -> Optional[str]:
+    if not isinstance(fecha, datetime):
+        return None
+    return fecha_utc(fecha).strftime("%Y-%m-%d")
+
+
+def _incrementos(conversacion: Dict[str, Any], signo: int) -> Dict[str, Any]:
+    puntuacion = conversacion["sentimiento"]
+    clase = _clase(puntuacion)
+    incrementos: Dict[str, Any] = {"conteo": signo, "suma": signo * puntuacion, clase: signo}
+    dia = _clave_dia(conversacion.get("fecha"))
+    if dia:
+        incrementos[f"dias.{dia}.conteo"] = signo
+        incrementos[f"dias.{dia}.suma"] = signo * puntuacion
+        incrementos[f"dias.{dia}.{clase}"] = signo
+    return incrementos
+
+
+def _estado(media: Optional[float]) -> str:
+    if media is None:
+        return "No disponible"
+    if media >= UMBRAL_ESTADO:
+        return "Positivo"
+    if media <= -UMBRAL_ESTADO:
+        return "Negativo"
+    return "Neutral"
+
+# --- Mantenimiento incremental (llamado desde conversacion_controller) ---
+
+async def aplicar_mensaje_creado(db: AsyncIOMotorDatabase, conversacion: Dict[str, Any]) -> None:
+    """
+    Suma un mensaje ya puntuado al resumen de su usuario.
+    """
+    if conversacion.get("sentimiento") is None:
+        return
+    try:
+        await db.estado_animo_usuario.update_one(
+            {"usuario_id": conversacion.get("usuario_id")},
+            {"$inc": _incrementos(conversacion, 1), "$set": {"actualizado": datetime.now(timezone.utc)}},
+            upsert=True
+        )
+    except Exception as e:
+        logger.error("Error al actualizar el estado de ánimo tras crear un mensaje: %s", e)
+
+
+async def aplicar_mensaje_eliminado(db: AsyncIOMotorDatabase, conversacion: Dict[str, Any]) -> None:
+    """
+    Descuenta un mensaje del resumen de su usuario; el día se elimina al quedarse sin mensajes.
+    """
+    if conversacion.get("sentimiento") is None:
+        return
+    try:
+        filtro = {"usuario_id": conversacion.get("usuario_id")}
+        resumen = await db.estado_animo_usuario.find_one_and_update(
+            filtro,
+            {"$inc": _incrementos(conversacion, -1), "$set": {"actualizado": datetime.now(timezone.utc)}},
+            return_document=ReturnDocument.AFTER
+        )
+        dia = _clave_dia(conversacion.get("fecha"))
+        if resumen and dia and resumen.get("dias", {}).get(dia, {}).get("conteo", 0) <= 0:
+            await db.estado_animo_usuario.update_one(filtro, {"$unset": {f"dias.{dia}": ""}})
+    except Exception as e:
+        logger.error("Error al actualizar el estado de ánimo tras eliminar un mensaje: %s", e)
+
+
+async def aplicar_mensaje_actualizado(db: AsyncIOMotorDatabase, anterior: Dict[str, Any], actualizado: Dict[str, Any]) -> None:
+    await aplicar_mensaje_eliminado(db, anterior)
+    await aplicar_mensaje_creado(db, actualizado)
+
+# --- Reconstrucción completa ---
+
+async def reconstruir_estado_animo(
+    db: AsyncIOMotorDatabase,
+    usuario_id: Optional[str] = None,
+    recalcular: bool = False,
+    batch_size: int = 500
+) -> Dict[str, int]:
+    """
+    Recalcula los resúmenes desde las conversaciones (de un usuario o de todos).
+    Puntúa los mensajes que aún no tienen 'sentimiento' (o todos con 'recalcular', p. ej. tras
+    cambiar de backend) y guarda la puntuación en la conversación. Recorre las conversaciones
+    ordenadas por usuario y escribe los resúmenes por lotes de 'batch_size', así que en memoria
+    solo se mantienen el resumen del usuario en curso y el lote pendiente.
+    """
+    try:
+        filtro = {"usuario_id": usuario_id} if usuario_id is not None else {}
+        await db.estado_animo_usuario.delete_many(filtro)
+
+        cursor = db.conversaciones.find(filtro, {"usuario_id": 1, "fecha": 1, "rol": 1, "mensaje": 1, "sentimiento": 1}) \
+            .sort("usuario_id", 1).batch_size(batch_size)
+        puntuaciones: List[UpdateOne] = []
+        resumenes: List[Dict[str, Any]] = []
+        resumen: Optional[Dict[str, Any]] = None
+        puntuados = 0
+        escritos = 0
+
+        async for conversacion in cursor:
+            if recalcular or ("sentimiento" not in conversacion and debe_puntuarse(conversacion)):
+                conversacion["sentimiento"] = puntuar_mensaje(conversacion)
+                puntuaciones.append(UpdateOne({"_id": conversacion["_id"]}, {"$set": {"sentimiento": conversacion["sentimiento"]}}))
+                puntuados += 1
+            if len(puntuaciones) >= batch_size:
+                await db.conversaciones.bulk_write(puntuaciones, ordered=False)
+                puntuaciones = []
+
+            if conversacion.get("sentimiento") is None:
+                continue
+            if resumen is None or resumen["usuario_id"] != conversacion.get("usuario_id"):
+                if resumen is not None:
+                    resumenes.append(resumen)
+                if len(resumenes) >= batch_size:
+                    await db.estado_animo_usuario.insert_many(resumenes)
+                    escritos += len(resumenes)
+                    resumenes = []
+                resumen = {"usuario_id": conversacion.get("usuario_id"), "conteo": 0, "suma": 0.0,
+                           "positivos": 0, "negativos": 0, "neutros": 0, "dias": {},
+                           "actualizado": datetime.now(timezone.utc)}
+            for campo, valor in _incrementos(conversacion, 1).items():
+                partes = campo.split(".")
+                destino = resumen
+                for parte in partes[:-1]:
+                    destino = destino.setdefault(parte, {})
+                destino[partes[-1]] = destino.get(partes[-1], 0) + valor
+
+        if puntuaciones:
+            await db.conversaciones.bulk_write(puntuaciones, ordered=False)
+        if resumen is not None:
+            resumenes.append(resumen)
+        if resumenes:
+            await db.estado_animo_usuario.insert_many(resumenes)
+            escritos += len(resumenes)
+
+        logger.debug("Estado de ánimo reconstruido para %s: %s mensajes puntuados, %s resúmenes",
+                     usuario_id or 'todos los usuarios', puntuados, escritos)
+        return {"mensajes_puntuados": puntuados, "resumenes": escritos}
+    except Exception as e:
+        logger.error("Error al reconstruir el estado de ánimo para %s: %s", usuario_id or 'todos los usuarios', e)
+        return {"mensajes_puntuados": 0, "resumenes": 0}
+
+
+async def asegurar_estado_animo(db: AsyncIOMotorDatabase) -> None:
+    """
+    En el arranque, puntúa las conversaciones existentes y construye los resúmenes si la
+    colección está vacía y ya hay conversaciones (solo el worker que obtiene el bloqueo,
+    como asegurar_progreso).
+    """
+    try:
+        if await db.estado_animo_usuario.estimated_document_count() == 0 and await db.conversaciones.estimated_document_count() > 0:
+            async with bloqueo(db, "estado_animo_usuario") as obtenido:
+                if obtenido and await db.estado_animo_usuario.estimated_document_count() == 0:
+                    await reconstruir_estado_animo(db)
+    except Exception as e:
+        logger.error("Error al comprobar la colección de estado de ánimo: %s", e)
+
+# --- Consulta ---
+
+async def get_estado_animo(db: AsyncIOMotorDatabase, usuario_id: str, dias: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Estado de ánimo de un usuario leyendo solo su documento de resumen. Con 'dias', solo cuentan
+    los mensajes de los últimos 'dias' días (incluido hoy, en UTC).
+    """
+    resultado: Dict[str, Any] = {
+        "usuario_id": usuario_id,
+        "estado_animo": "No disponible",
+        "puntuacion_media": None,
+        "mensajes": 0,
+        "positivos": 0,
+        "negativos": 0,
+        "neutros": 0,
+        "dias": dias,
+        "backend": get_sentiment_backend().nombre,
+    }
+    try:
+        if dias is None:
+            resumen = await db.estado_animo_usuario.find_one({"usuario_id": usuario_id}, {"dias": 0})
+            totales = resumen or {}
+        else:
+            resumen = await db.estado_animo_usuario.find_one({"usuario_id": usuario_id}, {"dias": 1})
+            desde = (datetime.now(timezone.utc) - timedelta(days=dias - 1)).strftime("%Y-%m-%d")
+            totales = {"conteo": 0, "suma": 0.0, "positivos": 0, "negativos": 0, "neutros": 0}
+            for dia, datos in ((resumen or {}).get("dias") or {}).items():
+                if dia >= desde:
+                    for campo in totales:
+                        totales[campo] += datos.get(campo, 0)
+
+        conteo = totales.get("conteo", 0)
+        if conteo <= 0:
+            logger.debug("Sin mensajes puntuados para %s", usuario_id)
+            return resultado
+
+        media = totales.get("suma", 0.0) / conteo
+        resultado.update({
+            "estado_animo": _estado(media),
+            "puntuacion_media": round(media, 4),
+            "mensajes": conteo,
+            "positivos": totales.get("positivos", 0),
+            "negativos": totales.get("negativos", 0),
+            "neutros": totales.get("neutros", 0),
+        })
+        logger.debug("Estado de ánimo para %s: %s", usuario_id, resultado["estado_animo"])
+        return resultado
+    except Exception as e:
+        logger.error("Error al analizar el estado de ánimo del usuario '%s': %s", usuario_id, e)
+        resultado["estado_animo"] = "Error al analizar"
+        return resultado
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from utils.cache import TTLCache
+from utils.logger import get_logger
+
+logger = get_logger("controllers.llm_cache")
+
+# Caché de respuestas del chatbot en dos niveles: memoria del proceso (TTL + LRU) y la colección
+# 'llm_cache' de MongoDB, compartida entre workers y reinicios, cuyos documentos caducan con un
+# índice TTL sobre 'expira'. La clave combina la pregunta normalizada, el usuario, un hash de su
+# progreso y los parámetros del modelo: si el usuario registra entrenamientos nuevos, la clave cambia,
+# y un usuario nunca recibe una respuesta generada para otro. Con la caché activa el chat no envía el
+# historial de la conversación al modelo, así que la clave describe todo lo que el modelo ve.
+
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "86400"))              # nivel MongoDB (segundos)
+LLM_CACHE_MEMORY_TTL = float(os.getenv("LLM_CACHE_MEMORY_TTL", "3600"))  # nivel en memoria (segundos)
+LLM_CACHE_MAXSIZE = int(os.getenv("LLM_CACHE_MAXSIZE", "1024"))
+
+_memoria = TTLCache(maxsize=LLM_CACHE_MAXSIZE, ttl=LLM_CACHE_MEMORY_TTL)
+_lock = threading.Lock()
+_metricas = {"consultas": 0, "aciertos_memoria": 0, "aciertos_mongo": 0, "fallos": 0, "guardadas": 0, "errores": 0}
+
+# --- Claves ---
+
+def normalizar_prompt(texto: str) -> str:
+    """
+    Minúsculas, sin tildes ni signos de puntuación y con los espacios colapsados:
+    "¿Cómo mejoro mi Press de Banca?" y "como mejoro mi press de banca" dan la misma clave.
+    """
+    sin_tildes = "".join(c for c in unicodedata.normalize("NFKD", texto.lower()) if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[^\w\s]", " ", sin_tildes).split())
+
+
+def hash_progreso(analytics: Dict[str, Any]) -> str:
+    """
+    Hash del resumen de progreso que ve el modelo (último peso, mejores marcas y totales).
+    """
+    snapshot = {
+        "conteo_registros": analytics.get("conteo_registros", 0),
+        "volumen_total": round(analytics.get("volumen_total", 0.0), 1),
+        "ultimo": [(u.get("ejercicio_nombre"), u.get("ultimo_peso"), u.get("ultimas_repeticiones")) for u in analytics.get("ultimo_peso", [])],
+        "mejores": [(m.get("ejercicio_nombre"), (m.get("mejor_marca") or {}).get("peso_levantado"), (m.get("mejor_marca") or {}).get("repeticiones"))
+                    for m in analytics.get("mejores_marcas", [])],
+    }
+    return hashlib.sha256(json.dumps(snapshot, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:16]
+
+
+def clave_cache(prompt: str, usuario_id: str, progreso_hash: str, parametros: Dict[str, Any]) -> str:
+    contenido = json.dumps(
+        {"prompt": normalizar_prompt(prompt), "usuario_id": usuario_id, "progreso": progreso_hash, "modelo": parametros},
+        sort_keys=True
+    )
+    return hashlib.sha256(contenido.encode("utf-8")).hexdigest()
+
+
+def _contar(metrica: str) -> None:
+    with _lock:
+        _metricas[metrica] += 1
+
+# --- Lectura y escritura ---
+
+async def get_respuesta(db: AsyncIOMotorDatabase, clave: str) -> Optional[str]:
+    """
+    Busca una respuesta en memoria y, si no está, en 'llm_cache' (que repuebla la memoria).
+    """
+    if not LLM_CACHE_ENABLED:
+        return None
+    _contar("consultas")
+
+    respuesta = _memoria.get(clave)
+    if respuesta is not None:
+        _contar("aciertos_memoria")
+        return respuesta
+
+    try:
+        documento = await db.llm_cache.find_one({"_id": clave, "expira": {"$gt": datetime.now(timezone.utc)}}, {"respuesta": 1})
+    except Exception as e:
+        _contar("errores")
+        logger.error("Error al leer la caché de respuestas: %s", e)
+        return None
+
+    if documento is None:
+        _contar("fallos")
+        return None
+    _contar("aciertos_mongo")
+    _memoria.set(clave, documento["respuesta"])
+    return documento["respuesta"]
+
+
+async def guardar_respuesta(db: AsyncIOMotorDatabase, clave: str, prompt: str, respuesta: str, parametros: Dict[str, Any]) -> None:
+    """
+    Guarda una respuesta en los dos niveles.
+    """
+    if not LLM_CACHE_ENABLED or not respuesta:
+        return
+    _memoria.set(clave, respuesta)
+    try:
+        ahora = datetime.now(timezone.utc)
+        await db.llm_cache.update_one(
+            {"_id": clave},
+            {"$set": {
+                "prompt": normalizar_prompt(prompt),
+                "respuesta": respuesta,
+                "parametros": parametros,
+                "creado": ahora,
+                "expira": ahora + timedelta(seconds=LLM_CACHE_TTL),
+            }},
+            upsert=True
+        )
+        _contar("guardadas")
+    except Exception as e:
+        _contar("errores")
+        logger.error("Error al guardar en la caché de respuestas: %s", e)
+
+
+async def vaciar(db: AsyncIOMotorDatabase) -> int:
+    """
+    Vacía los dos niveles. Devuelve el número de documentos borrados de 'llm_cache'.
+    """
+    _memoria.clear()
+    try:
+        result = await db.llm_cache.delete_many({})
+        return result.deleted_count
+    except Exception as e:
+        logger.error("Error al vaciar la caché de respuestas: %s", e)
+        return 0
+
+
+def get_metricas() -> Dict[str, Any]:
+    """
+    Contadores de la caché de este proceso y tasa de aciertos (memoria + MongoDB).
+    """
+    with _lock:
+        metricas: Dict[str, Any] = dict(_metricas)
+    consultas = metricas["consultas"]
+    aciertos = metricas["aciertos_memoria"] + metricas["aciertos_mongo"]
+    metricas["tasa_aciertos"] = aciertos / consultas if consultas else 0.0
+    metricas["habilitada"] = LLM_CACHE_ENABLED
+    metricas["memoria"] = _memoria.stats()
+    return metricas
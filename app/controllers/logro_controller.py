@@ -2,23 +2,11 @@ from bson import ObjectId
 from datetime import datetime
 from typing import List, Optional, Dict, Any
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from utils.serialization import convert_id_to_str
+from utils.logger import get_logger, payload
 
-# --- Función auxiliar para convertir ObjectId a str de forma recursiva ---
-def _convert_id_to_str(document: Any) -> Any:
-    """
-    Convierte ObjectId en str dentro de un diccionario o lista de diccionarios.
-    Útil para la serialización de respuestas de la API.
-    """
-    if isinstance(document, dict):
-        return {
-            k: str(v) if isinstance(v, ObjectId) else _convert_id_to_str(v)
-            for k, v in document.items()
-        }
-    elif isinstance(document, list):
-        return [_convert_id_to_str(elem) for elem in document]
-    elif isinstance(document, ObjectId):
-        return str(document)
-    return document
+logger = get_logger("controllers.logro")
 
 # --- Funciones CRUD para Logros ---
 
@@ -28,35 +16,35 @@ async def get_logro_by_id(db: AsyncIOMotorDatabase, logro_id: str) -> Optional[D
     """
     try:
         if not ObjectId.is_valid(logro_id):
-            print(f"ERROR (Controller): ID de logro inválido: {logro_id}")
+            logger.warning("ID de logro inválido: %s", logro_id)
             return None
 
         logro = await db.logros.find_one({"_id": ObjectId(logro_id)})
         if logro:
-            processed_logro = _convert_id_to_str(logro)
-            print(f"DEBUG (Controller): Logro recuperado por ID ({logro_id}): {processed_logro}")
+            processed_logro = convert_id_to_str(logro)
+            logger.debug("Logro recuperado por ID (%s): %s", logro_id, payload(processed_logro))
             return processed_logro
-        print(f"DEBUG (Controller): Logro no encontrado para ID: {logro_id}")
+        logger.debug("Logro no encontrado para ID: %s", logro_id)
         return None
     except Exception as e:
-        print(f"ERROR (Controller): Error al recuperar el logro '{logro_id}': {e}")
+        logger.error("Error al recuperar el logro '%s': %s", logro_id, e)
         return None
 
 
-async def get_all_logros(db: AsyncIOMotorDatabase) -> List[Dict[str, Any]]:
+async def get_all_logros(db: AsyncIOMotorDatabase, projection: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
     """
     Obtiene todos los logros de la base de datos.
+    Con 'projection' solo se leen los campos indicados.
     """
     try:
-        logros = await db.logros.find().to_list(None)
-        processed_logros = [_convert_id_to_str(l) for l in logros]
-        if not processed_logros:
-            print("DEBUG (Controller): No se encontraron logros.")
+        logros = await db.logros.find({}, projection).to_list(None)
+        if not logros:
+            logger.debug("No se encontraron logros.")
         
-        print(f"DEBUG (Controller): Logros recuperados: {processed_logros}")
-        return processed_logros
+        logger.debug("Logros recuperados: %s", payload(logros))
+        return logros
     except Exception as e:
-        print(f"ERROR (Controller): Error al recuperar los logros: {e}")
+        logger.error("Error al recuperar los logros: %s", e)
         return []
 
 
@@ -71,18 +59,16 @@ async def create_logro(db: AsyncIOMotorDatabase, logro_data: Dict[str, Any]) ->
         result = await db.logros.insert_one(logro_data)
         
         if not result.acknowledged:
-            print("ERROR (Controller): Fallo en el reconocimiento de la inserción de logro.")
+            logger.error("Fallo en el reconocimiento de la inserción de logro.")
             return None
         
-        created_logro = await db.logros.find_one({"_id": result.inserted_id})
-        if created_logro:
-            processed_logro = _convert_id_to_str(created_logro)
-            print(f"DEBUG (Controller): Logro creado: {processed_logro}")
-            return processed_logro
-        print("ERROR (Controller): No se pudo recuperar el logro recién creado.")
-        return None
+        # insert_one añade el _id generado al propio diccionario: no hace falta volver a leerlo
+        logro_data["_id"] = result.inserted_id
+        processed_logro = convert_id_to_str(logro_data)
+        logger.debug("Logro creado: %s", payload(processed_logro))
+        return processed_logro
     except Exception as e:
-        print(f"ERROR (Controller): Error al crear el logro: {e}")
+        logger.error("Error al crear el logro: %s", e)
         return None
 
 
@@ -92,7 +78,7 @@ async def update_logro(db: AsyncIOMotorDatabase, logro_id: str, logro_data: Dict
     """
     try:
         if not ObjectId.is_valid(logro_id):
-            print(f"ERROR (Controller): ID de logro inválido: {logro_id}")
+            logger.warning("ID de logro inválido: %s", logro_id)
             return None
 
         object_id = ObjectId(logro_id)
@@ -100,20 +86,19 @@ async def update_logro(db: AsyncIOMotorDatabase, logro_id: str, logro_data: Dict
         logro_data.pop('id', None)
         logro_data.pop('_id', None)
 
-        await db.logros.update_one(
+        updated_logro = await db.logros.find_one_and_update(
             {"_id": object_id},
-            {"$set": logro_data}
+            {"$set": logro_data},
+            return_document=ReturnDocument.AFTER
         )
-        
-        updated_logro = await db.logros.find_one({"_id": object_id})
         if updated_logro:
-            processed_logro = _convert_id_to_str(updated_logro)
-            print(f"DEBUG (Controller): Logro actualizado: {processed_logro}")
+            processed_logro = convert_id_to_str(updated_logro)
+            logger.debug("Logro actualizado: %s", payload(processed_logro))
             return processed_logro
-        print(f"DEBUG (Controller): Logro no encontrado o no se pudo recuperar después de la actualización para ID: {logro_id}")
+        logger.debug("Logro no encontrado para actualizar con ID: %s", logro_id)
         return None
     except Exception as e:
-        print(f"ERROR (Controller): Error al actualizar el logro '{logro_id}': {e}")
+        logger.error("Error al actualizar el logro '%s': %s", logro_id, e)
         return None
 
 
@@ -123,19 +108,19 @@ async def delete_logro(db: AsyncIOMotorDatabase, logro_id: str) -> bool:
     """
     try:
         if not ObjectId.is_valid(logro_id):
-            print(f"ERROR (Controller): ID de logro inválido: {logro_id}")
+            logger.warning("ID de logro inválido: %s", logro_id)
             return False
 
         result = await db.logros.delete_one({"_id": ObjectId(logro_id)})
         
         if result.deleted_count == 0:
-            print(f"DEBUG (Controller): Logro no encontrado para eliminar con ID: {logro_id}")
+            logger.debug("Logro no encontrado para eliminar con ID: %s", logro_id)
             return False
         
-        print(f"DEBUG (Controller): Logro eliminado ({logro_id}): True")
+        logger.debug("Logro eliminado (%s): True", logro_id)
         return True
     except Exception as e:
-        print(f"ERROR (Controller): Error al eliminar el logro '{logro_id}': {e}")
+        logger.error("Error al eliminar el logro '%s': %s", logro_id, e)
         return False
 
 
@@ -148,14 +133,13 @@ async def get_logros_by_usuario(db: AsyncIOMotorDatabase, usuario_id: str) -> Li
 
         logros = await db.logros.find({"usuario_id": query_user_id}).to_list(None)
         
-        processed_logros = [_convert_id_to_str(l) for l in logros]
-        if not processed_logros:
-            print(f"DEBUG (Controller): No se encontraron logros para el usuario {usuario_id}")
+        if not logros:
+            logger.debug("No se encontraron logros para el usuario %s", usuario_id)
         
-        print(f"DEBUG (Controller): Logros para usuario {usuario_id}: {processed_logros}")
-        return processed_logros
+        logger.debug("Logros para usuario %s: %s", usuario_id, payload(logros))
+        return logros
     except Exception as e:
-        print(f"ERROR (Controller): Error al recuperar los logros del usuario '{usuario_id}': {e}")
+        logger.error("Error al recuperar los logros del usuario '%s': %s", usuario_id, e)
         return []
 
 
@@ -168,12 +152,11 @@ async def get_logros_tipo(db: AsyncIOMotorDatabase, usuario_id: str, tipo: str)
 
         logros = await db.logros.find({"usuario_id": query_user_id, "tipo": tipo}).to_list(None)
         
-        processed_logros = [_convert_id_to_str(l) for l in logros]
-        if not processed_logros:
-            print(f"DEBUG (Controller): No se encontraron logros del tipo '{tipo}' para el usuario {usuario_id}")
+        if not logros:
+            logger.debug("No se encontraron logros del tipo '%s' para el usuario %s", tipo, usuario_id)
         
-        print(f"DEBUG (Controller): Logros de tipo '{tipo}' para usuario {usuario_id}: {processed_logros}")
-        return processed_logros
+        logger.debug("Logros de tipo '%s' para usuario %s: %s", tipo, usuario_id, payload(logros))
+        return logros
     except Exception as e:
-        print(f"ERROR (Controller): Error al recuperar los logros del tipo '{tipo}' del usuario '{usuario_id}': {e}")
+        logger.error("Error al recuperar los logros del tipo '%s' del usuario '%s': %s", tipo, usuario_id, e)
         return []
@@ -0,0 +1,275 @@
+from datetime import datetime
+from typing import List, Optional, Dict, Any, Tuple
+from pymongo import UpdateOne, ReturnDocument
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from connection.bloqueos import bloqueo
+from connection.registros_storage import get_registros_collection
+from utils.helpers import fecha_utc, volumen_registro
+from utils.logger import get_logger
+
+logger = get_logger("controllers.progreso")
+
+# Colección 'progreso_usuario': un documento por (usuario_id, ejercicio_id) con
+# el último peso, la mejor marca, los conteos semanales y el volumen acumulado.
+# Se mantiene de forma incremental desde registro_controller en cada escritura. El nombre del
+# ejercicio no se guarda aquí: las consultas lo añaden desde la tabla en caché del catálogo.
+
+# --- Funciones auxiliares ---
+
+def _semana(fecha: datetime) -> Tuple[str, int, int, str]:
+    """
+    Devuelve (clave, año, semana, día) con la misma semántica que $year, $week y
+    $dayOfWeek de MongoDB: semanas que empiezan en domingo y días de 1 (domingo) a 7.
+    """
+    fecha = fecha_utc(fecha)
+    año = fecha.year
+    semana = int(fecha.strftime("%U"))
+    dia = str(fecha.isoweekday() % 7 + 1)
+    return f"{año}-{semana:02d}", año, semana, dia
+
+
+def _clave_marca(registro: Dict[str, Any]) -> Tuple[float, float, int]:
+    """
+    Orden de la mejor marca: volumen, después peso y después repeticiones.
+    """
+    return (volumen_registro(registro), registro.get("peso_levantado", 0) or 0, registro.get("repeticiones", 0) or 0)
+
+
+def _snapshot_marca(registro: Dict[str, Any]) -> Dict[str, Any]:
+    marca = dict(registro)
+    marca["volumen"] = volumen_registro(registro)
+    return marca
+
+
+def _nuevo_resumen(usuario_id: str, ejercicio_id: Any) -> Dict[str, Any]:
+    return {
+        "usuario_id": usuario_id,
+        "ejercicio_id": ejercicio_id,
+        "conteo_registros": 0,
+        "volumen_total": 0.0,
+        "ultimo": None,
+        "mejor": None,
+        "semanas": {},
+    }
+
+
+def _acumular(resumen: Dict[str, Any], registro: Dict[str, Any]) -> None:
+    """
+    Añade un registro a un resumen parcial (en memoria).
+    """
+    resumen["conteo_registros"] += 1
+    resumen["volumen_total"] += volumen_registro(registro)
+
+    fecha = fecha_utc(registro["fecha_registro"])
+    ultimo = resumen["ultimo"]
+    if ultimo is None or fecha_utc(ultimo["fecha_registro"]) <= fecha:
+        resumen["ultimo"] = registro
+
+    mejor = resumen["mejor"]
+    if mejor is None or _clave_marca(mejor) < _clave_marca(registro):
+        resumen["mejor"] = registro
+
+    clave, año, semana, dia = _semana(fecha)
+    datos_semana = resumen["semanas"].setdefault(clave, {"año": año, "semana": semana, "conteo": 0, "dias": {}})
+    datos_semana["conteo"] += 1
+    datos_semana["dias"][dia] = datos_semana["dias"].get(dia, 0) + 1
+
+
+def _campos_ultimo(registro: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "ultimo_registro_id": registro["_id"],
+        "ultimo_peso": registro.get("peso_levantado"),
+        "ultimas_repeticiones": registro.get("repeticiones"),
+        "ultima_fecha": fecha_utc(registro["fecha_registro"]),
+    }
+
+
+def _resumen_a_documento(resumen: Dict[str, Any]) -> Dict[str, Any]:
+    documento = {
+        "usuario_id": resumen["usuario_id"],
+        "ejercicio_id": resumen["ejercicio_id"],
+        "conteo_registros": resumen["conteo_registros"],
+        "volumen_total": resumen["volumen_total"],
+        "mejor_marca": _snapshot_marca(resumen["mejor"]),
+        "semanas": resumen["semanas"],
+    }
+    documento.update(_campos_ultimo(resumen["ultimo"]))
+    return documento
+
+
+def _agrupar(registros: List[Dict[str, Any]]) -> Dict[Tuple[str, str], Dict[str, Any]]:
+    resumenes: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    for registro in registros:
+        clave = (registro.get("usuario_id"), registro.get("ejercicio_id"))
+        if clave not in resumenes:
+            resumenes[clave] = _nuevo_resumen(*clave)
+        _acumular(resumenes[clave], registro)
+    return resumenes
+
+# --- Mantenimiento incremental (llamado desde registro_controller) ---
+
+async def aplicar_registros_creados(db: AsyncIOMotorDatabase, registros: List[Dict[str, Any]]) -> None:
+    """
+    Incorpora registros recién insertados a sus documentos de progreso.
+    Los registros de un mismo usuario y ejercicio se agrupan antes de escribir, así que
+    cada par (usuario, ejercicio) cuesta tres operaciones en un único bulk_write.
+    """
+    try:
+        operaciones = []
+        for (usuario_id, ejercicio_id), resumen in _agrupar(registros).items():
+            filtro = {"usuario_id": usuario_id, "ejercicio_id": ejercicio_id}
+
+            incrementos: Dict[str, Any] = {
+                "conteo_registros": resumen["conteo_registros"],
+                "volumen_total": resumen["volumen_total"],
+            }
+            campos_semana: Dict[str, Any] = {}
+            for clave, datos in resumen["semanas"].items():
+                incrementos[f"semanas.{clave}.conteo"] = datos["conteo"]
+                for dia, conteo in datos["dias"].items():
+                    incrementos[f"semanas.{clave}.dias.{dia}"] = conteo
+                campos_semana[f"semanas.{clave}.año"] = datos["año"]
+                campos_semana[f"semanas.{clave}.semana"] = datos["semana"]
+            operaciones.append(UpdateOne(filtro, {"$inc": incrementos, "$set": campos_semana}, upsert=True))
+
+            # Último peso: solo si el registro es igual o más reciente que el guardado
+            ultimo = resumen["ultimo"]
+            ultima_fecha = fecha_utc(ultimo["fecha_registro"])
+            operaciones.append(UpdateOne(
+                {**filtro, "$or": [{"ultima_fecha": {"$exists": False}}, {"ultima_fecha": {"$lte": ultima_fecha}}]},
+                {"$set": _campos_ultimo(ultimo)}
+            ))
+
+            # Mejor marca: solo si supera a la guardada (volumen, peso, repeticiones)
+            mejor = resumen["mejor"]
+            volumen, peso, repeticiones = _clave_marca(mejor)
+            operaciones.append(UpdateOne(
+                {**filtro, "$or": [
+                    {"mejor_marca": {"$exists": False}},
+                    {"mejor_marca.volumen": {"$lt": volumen}},
+                    {"mejor_marca.volumen": volumen, "mejor_marca.peso_levantado": {"$lt": peso}},
+                    {"mejor_marca.volumen": volumen, "mejor_marca.peso_levantado": peso, "mejor_marca.repeticiones": {"$lt": repeticiones}},
+                ]},
+                {"$set": {"mejor_marca": _snapshot_marca(mejor)}}
+            ))
+
+        if operaciones:
+            await db.progreso_usuario.bulk_write(operaciones, ordered=True)
+            logger.debug("Progreso actualizado para %s registros nuevos", len(registros))
+    except Exception as e:
+        logger.error("Error al actualizar el progreso tras crear registros: %s", e)
+
+
+async def aplicar_registro_eliminado(db: AsyncIOMotorDatabase, registro: Dict[str, Any]) -> None:
+    """
+    Descuenta un registro eliminado de su documento de progreso. Solo si el registro era
+    el último o la mejor marca se vuelven a consultar los registros de ese ejercicio.
+    """
+    try:
+        usuario_id = registro.get("usuario_id")
+        ejercicio_id = registro.get("ejercicio_id")
+        filtro = {"usuario_id": usuario_id, "ejercicio_id": ejercicio_id}
+        clave, _, _, dia = _semana(registro["fecha_registro"])
+
+        resumen = await db.progreso_usuario.find_one_and_update(
+            filtro,
+            {"$inc": {
+                "conteo_registros": -1,
+                "volumen_total": -volumen_registro(registro),
+                f"semanas.{clave}.conteo": -1,
+                f"semanas.{clave}.dias.{dia}": -1,
+            }},
+            return_document=ReturnDocument.AFTER
+        )
+        if resumen is None:
+            return
+
+        if resumen.get("conteo_registros", 0) <= 0:
+            await db.progreso_usuario.delete_one(filtro)
+            return
+
+        cambios: Dict[str, Any] = {}
+        if resumen.get("ultimo_registro_id") == registro["_id"]:
+            ultimo = await get_registros_collection(db).find_one(filtro, sort=[("fecha_registro", -1)])
+            if ultimo:
+                cambios.update(_campos_ultimo(ultimo))
+        if (resumen.get("mejor_marca") or {}).get("_id") == registro["_id"]:
+            mejores = await get_registros_collection(db).aggregate([
+                {"$match": filtro},
+                {"$addFields": {"volumen": {"$multiply": ["$peso_levantado", "$repeticiones"]}}},
+                {"$sort": {"volumen": -1, "peso_levantado": -1, "repeticiones": -1}},
+                {"$limit": 1}
+            ]).to_list(1)
+            if mejores:
+                cambios["mejor_marca"] = mejores[0]
+        if cambios:
+            await db.progreso_usuario.update_one(filtro, {"$set": cambios})
+        logger.debug("Progreso actualizado tras eliminar el registro %s", registro['_id'])
+    except Exception as e:
+        logger.error("Error al actualizar el progreso tras eliminar un registro: %s", e)
+
+
+async def aplicar_registro_actualizado(db: AsyncIOMotorDatabase, anterior: Dict[str, Any], actualizado: Dict[str, Any]) -> None:
+    """
+    Una actualización equivale a retirar la versión anterior y añadir la nueva.
+    """
+    await aplicar_registro_eliminado(db, anterior)
+    await aplicar_registros_creados(db, [actualizado])
+
+# --- Reconstrucción completa ---
+
+async def reconstruir_progreso(db: AsyncIOMotorDatabase, usuario_id: Optional[str] = None, batch_size: int = 500) -> int:
+    """
+    Recalcula los documentos de progreso desde los registros (de un usuario o de todos).
+    Recorre los registros ordenados por (usuario_id, ejercicio_id), de modo que en
+    memoria solo se mantiene el resumen del par en curso.
+    Devuelve el número de documentos de progreso escritos.
+    """
+    try:
+        filtro = {"usuario_id": usuario_id} if usuario_id is not None else {}
+        await db.progreso_usuario.delete_many(filtro)
+
+        cursor = get_registros_collection(db).find(filtro).sort([("usuario_id", 1), ("ejercicio_id", 1)]).batch_size(batch_size)
+        pendientes: List[Dict[str, Any]] = []
+        escritos = 0
+        resumen: Optional[Dict[str, Any]] = None
+        async for registro in cursor:
+            clave = (registro.get("usuario_id"), registro.get("ejercicio_id"))
+            if resumen is None or (resumen["usuario_id"], resumen["ejercicio_id"]) != clave:
+                if resumen is not None:
+                    pendientes.append(_resumen_a_documento(resumen))
+                resumen = _nuevo_resumen(*clave)
+            _acumular(resumen, registro)
+
+            if len(pendientes) >= batch_size:
+                await db.progreso_usuario.insert_many(pendientes)
+                escritos += len(pendientes)
+                pendientes = []
+
+        if resumen is not None:
+            pendientes.append(_resumen_a_documento(resumen))
+        if pendientes:
+            await db.progreso_usuario.insert_many(pendientes)
+            escritos += len(pendientes)
+
+        logger.debug("Progreso reconstruido (%s documentos) para %s", escritos, usuario_id or 'todos los usuarios')
+        return escritos
+    except Exception as e:
+        logger.error("Error al reconstruir el progreso para %s: %s", usuario_id or 'todos los usuarios', e)
+        return 0
+
+
+async def asegurar_progreso(db: AsyncIOMotorDatabase) -> None:
+    """
+    En el arranque, construye la colección de progreso si está vacía y ya hay registros
+    (por ejemplo, la primera vez que se despliega esta versión). Con varios workers, solo
+    la construye el que obtiene el bloqueo; el resto sigue arrancando sin esperar.
+    """
+    try:
+        if await db.progreso_usuario.estimated_document_count() == 0 and await get_registros_collection(db).estimated_document_count() > 0:
+            async with bloqueo(db, "progreso_usuario") as obtenido:
+                # Se vuelve a comprobar: otro worker puede haberla construido mientras tanto
+                if obtenido and await db.progreso_usuario.estimated_document_count() == 0:
+                    await reconstruir_progreso(db)
+    except Exception as e:
+        logger.error("Error al comprobar la colección de progreso: %s", e)
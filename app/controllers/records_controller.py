@@ -0,0 +1,315 @@
+from datetime import datetime, timezone
+from typing import List, Optional, Dict, Any, Tuple
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from controllers import ejercicio_controller
+from connection.bloqueos import bloqueo
+from connection.registros_storage import get_registros_collection
+from utils.helpers import fecha_utc
+from utils.serialization import convert_id_to_str
+from utils.logger import get_logger, payload
+
+logger = get_logger("controllers.records")
+
+# Colección 'records_personales': un documento por (usuario_id, ejercicio_id) con los máximos
+# históricos de peso, repeticiones, volumen (peso * repeticiones) y 1RM estimado (Epley).
+# Cada serie nueva se compara con ese documento en una sola operación atómica ($max que
+# devuelve la versión ANTERIOR): si supera algún máximo, se crea un logro por cada métrica
+# mejorada. La primera serie de un ejercicio solo fija la referencia y no genera logros.
+# Los logros automáticos llevan 'registro_id' y el índice único (registro_id, tipo) evita
+# duplicarlos si un registro se procesa dos veces.
+# Al editar o eliminar un registro que tenía algún máximo, el documento de su par
+# (usuario_id, ejercicio_id) se recalcula desde los registros y sus logros automáticos se borran.
+
+# Campos del registro que determinan los máximos
+CAMPOS_REGISTRO = ("peso_levantado", "repeticiones", "ejercicio_id")
+
+# (campo del documento, tipo del logro, unidad)
+METRICAS: List[Tuple[str, str, str]] = [
+    ("peso", "Peso", "kg"),
+    ("repeticiones", "Repeticiones", "reps"),
+    ("volumen", "Volumen", "kg"),
+    ("e1rm", "1RM estimado", "kg"),
+]
+
+# --- Funciones auxiliares ---
+
+def e1rm_epley(peso: float, repeticiones: int) -> float:
+    """
+    1RM estimado con la fórmula de Epley: peso * (1 + repeticiones / 30); con una repetición, el peso.
+    """
+    if repeticiones <= 1:
+        return float(peso)
+    return round(peso * (1 + repeticiones / 30), 2)
+
+
+def _metricas(registro: Dict[str, Any]) -> Dict[str, float]:
+    peso = registro.get("peso_levantado", 0) or 0
+    repeticiones = registro.get("repeticiones", 0) or 0
+    return {
+        "peso": peso,
+        "repeticiones": repeticiones,
+        "volumen": peso * repeticiones,
+        "e1rm": e1rm_epley(peso, repeticiones),
+    }
+
+
+def _formatear(valor: float, unidad: str) -> str:
+    return f"{valor:g} {unidad}"
+
+
+def _nuevos_logros(registro: Dict[str, Any], anterior: Dict[str, Any], actuales: Dict[str, float]) -> List[Dict[str, Any]]:
+    logros = []
+    ejercicio = registro.get("ejercicio_nombre") or str(registro.get("ejercicio_id"))
+    for campo, tipo, unidad in METRICAS:
+        previo = anterior.get(campo)
+        if previo is None or actuales[campo] <= previo:
+            continue
+        logros.append({
+            "usuario_id": registro.get("usuario_id"),
+            "ejercicio_id": str(registro["ejercicio_id"]),
+            "registro_id": registro["_id"],
+            "descripcion": f"Nuevo récord de {tipo.lower()} en {ejercicio}: {_formatear(actuales[campo], unidad)} "
+                           f"(anterior: {_formatear(previo, unidad)})",
+            "valor": _formatear(actuales[campo], unidad),
+            "fecha_logro": registro.get("fecha_registro") or datetime.now(timezone.utc),
+            "tipo": tipo,
+            "automatico": True,
+        })
+    return logros
+
+def _tiene_maximo(metricas: Dict[str, float], record: Dict[str, Any]) -> bool:
+    """
+    True si alguna métrica de la serie iguala (o supera) el máximo guardado: la serie puede ser
+    la que lo sostiene y, si desaparece o baja, hay que recalcularlo.
+    """
+    return any(metricas[campo] >= record.get(campo, 0) for campo, _, _ in METRICAS)
+
+
+def _cambia_serie(anterior: Dict[str, Any], actualizado: Dict[str, Any]) -> bool:
+    return any(anterior.get(campo) != actualizado.get(campo) for campo in CAMPOS_REGISTRO)
+
+
+def _pipeline_maximos(filtro: Dict[str, Any]) -> List[Dict[str, Any]]:
+    peso = {"$ifNull": ["$peso_levantado", 0]}
+    repeticiones = {"$ifNull": ["$repeticiones", 0]}
+    return [
+        {"$match": {**filtro, "ejercicio_id": filtro.get("ejercicio_id", {"$type": "objectId"})}},
+        {"$group": {
+            "_id": {"usuario_id": "$usuario_id", "ejercicio_id": "$ejercicio_id"},
+            "peso": {"$max": peso},
+            "repeticiones": {"$max": repeticiones},
+            "volumen": {"$max": {"$multiply": [peso, repeticiones]}},
+            "e1rm": {"$max": {"$cond": [
+                {"$lte": [repeticiones, 1]},
+                peso,
+                {"$round": [{"$multiply": [peso, {"$add": [1, {"$divide": [repeticiones, 30]}]}]}, 2]}
+            ]}},
+            "series": {"$sum": 1},
+        }},
+        {"$project": {
+            "_id": 0,
+            "usuario_id": "$_id.usuario_id",
+            "ejercicio_id": "$_id.ejercicio_id",
+            "peso": 1, "repeticiones": 1, "volumen": 1, "e1rm": 1, "series": 1,
+            "actualizado": "$$NOW",
+        }},
+    ]
+
+
+async def _insertar_logros(db: AsyncIOMotorDatabase, registro: Dict[str, Any], logros: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    if not logros:
+        return logros
+    try:
+        await db.logros.insert_many(logros, ordered=False)
+    except BulkWriteError as e:
+        # Récords ya registrados para este registro (índice único registro_id + tipo)
+        duplicados = {w["index"] for w in e.details.get("writeErrors", []) if w.get("code") == 11000}
+        logros = [l for i, l in enumerate(logros) if i not in duplicados]
+    logger.info("Récords personales de %s: %s", registro.get("usuario_id"), [l["tipo"] for l in logros])
+    return logros
+
+# --- Detección de récords (llamada desde registro_controller) ---
+
+async def _aplicar_maximos(db: AsyncIOMotorDatabase, registro: Dict[str, Any], actuales: Dict[str, float], nueva_serie: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    $max atómico sobre el documento de récords; devuelve la versión anterior (None si es la primera serie).
+    Con nueva_serie=False (edición de un registro ya contado) no se incrementa 'series'.
+    """
+    filtro = {"usuario_id": registro.get("usuario_id"), "ejercicio_id": registro["ejercicio_id"]}
+    cambios: Dict[str, Any] = {"$max": actuales, "$set": {"actualizado": datetime.now(timezone.utc)}}
+    if nueva_serie:
+        cambios["$inc"] = {"series": 1}
+    try:
+        return await db.records_personales.find_one_and_update(filtro, cambios, upsert=True, return_document=ReturnDocument.BEFORE)
+    except DuplicateKeyError:
+        # Dos primeras series simultáneas del mismo ejercicio: el upsert perdedor se repite como update
+        return await db.records_personales.find_one_and_update(filtro, cambios, return_document=ReturnDocument.BEFORE)
+
+
+async def registrar_serie(db: AsyncIOMotorDatabase, registro: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Actualiza los máximos del usuario en el ejercicio del registro y crea un logro por cada
+    récord batido. Devuelve los logros creados.
+    """
+    if registro.get("ejercicio_id") is None or registro.get("_id") is None:
+        return []
+    try:
+        actuales = _metricas(registro)
+        anterior = await _aplicar_maximos(db, registro, actuales)
+        if anterior is None:
+            return []
+
+        return await _insertar_logros(db, registro, _nuevos_logros(registro, anterior, actuales))
+    except Exception as e:
+        logger.error("Error al comprobar los récords del registro %s: %s", registro.get("_id"), e)
+        return []
+
+
+async def registrar_series(db: AsyncIOMotorDatabase, registros: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Procesa varias series en orden cronológico (para las altas en bloque). Las fechas se
+    comparan en UTC, así que se pueden mezclar fechas con y sin zona horaria.
+    """
+    try:
+        ordenados = sorted(registros, key=lambda r: fecha_utc(r["fecha_registro"]) if r.get("fecha_registro") else datetime.min)
+    except Exception as e:
+        logger.warning("No se pudieron ordenar las series por fecha; se procesan en el orden recibido: %s", e)
+        ordenados = list(registros)
+    logros: List[Dict[str, Any]] = []
+    for registro in ordenados:
+        logros.extend(await registrar_serie(db, registro))
+    return logros
+
+
+async def recalcular_record(db: AsyncIOMotorDatabase, usuario_id: Optional[str], ejercicio_id: Any) -> Optional[Dict[str, Any]]:
+    """
+    Recalcula el documento de un solo par (usuario_id, ejercicio_id) con el mismo $group que la
+    reconstrucción completa. Si ya no quedan registros del par, el documento se elimina.
+    """
+    filtro = {"usuario_id": usuario_id, "ejercicio_id": ejercicio_id}
+    records = await get_registros_collection(db).aggregate(_pipeline_maximos(filtro)).to_list(1)
+    if not records:
+        await db.records_personales.delete_one(filtro)
+        return None
+    await db.records_personales.replace_one(filtro, records[0], upsert=True)
+    return records[0]
+
+
+async def aplicar_registro_eliminado(db: AsyncIOMotorDatabase, registro: Dict[str, Any]) -> None:
+    """
+    Borra los logros automáticos del registro eliminado y lo descuenta de sus récords. Solo si la
+    serie sostenía algún máximo se vuelven a consultar los registros de ese ejercicio.
+    """
+    if registro.get("ejercicio_id") is None or registro.get("_id") is None:
+        return
+    try:
+        await db.logros.delete_many({"registro_id": registro["_id"], "automatico": True})
+        filtro = {"usuario_id": registro.get("usuario_id"), "ejercicio_id": registro["ejercicio_id"]}
+        record = await db.records_personales.find_one_and_update(
+            filtro, {"$inc": {"series": -1}}, return_document=ReturnDocument.AFTER
+        )
+        if record is None:
+            return
+        if record.get("series", 0) <= 0:
+            await db.records_personales.delete_one(filtro)
+        elif _tiene_maximo(_metricas(registro), record):
+            await recalcular_record(db, registro.get("usuario_id"), registro["ejercicio_id"])
+        logger.debug("Récords actualizados tras eliminar el registro %s", registro["_id"])
+    except Exception as e:
+        logger.error("Error al actualizar los récords tras eliminar el registro %s: %s", registro.get("_id"), e)
+
+
+async def aplicar_registro_actualizado(db: AsyncIOMotorDatabase, anterior: Dict[str, Any], actualizado: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Aplica la edición de un registro a los récords. Las ediciones que no tocan peso, repeticiones
+    ni ejercicio (p. ej. solo notas) no hacen nada. Si la serie sostenía un máximo que baja, el par
+    se recalcula; si sube por encima del máximo guardado, se crea el logro correspondiente.
+    Devuelve los logros creados.
+    """
+    if not _cambia_serie(anterior, actualizado):
+        return []
+    if anterior.get("ejercicio_id") != actualizado.get("ejercicio_id"):
+        # Cambio de ejercicio: sale del par anterior y entra en el nuevo como serie nueva
+        await aplicar_registro_eliminado(db, anterior)
+        return await registrar_serie(db, actualizado)
+    if actualizado.get("ejercicio_id") is None or actualizado.get("_id") is None:
+        return []
+    try:
+        # Los logros anteriores se referían a los valores corregidos
+        await db.logros.delete_many({"registro_id": actualizado["_id"], "automatico": True})
+        filtro = {"usuario_id": actualizado.get("usuario_id"), "ejercicio_id": actualizado["ejercicio_id"]}
+        previas = _metricas(anterior)
+        actuales = _metricas(actualizado)
+        record = await db.records_personales.find_one(filtro)
+        if record is None:
+            await recalcular_record(db, actualizado.get("usuario_id"), actualizado["ejercicio_id"])
+            return []
+
+        baja_maximo = any(
+            actuales[campo] < previas[campo] and previas[campo] >= record.get(campo, 0)
+            for campo, _, _ in METRICAS
+        )
+        if baja_maximo:
+            # El registro ya está actualizado en la colección: el $group lo incluye con sus valores nuevos
+            await recalcular_record(db, actualizado.get("usuario_id"), actualizado["ejercicio_id"])
+        else:
+            record = await _aplicar_maximos(db, actualizado, actuales, nueva_serie=False) or record
+        return await _insertar_logros(db, actualizado, _nuevos_logros(actualizado, record, actuales))
+    except Exception as e:
+        logger.error("Error al actualizar los récords del registro %s: %s", actualizado.get("_id"), e)
+        return []
+
+# --- Reconstrucción completa ---
+
+async def reconstruir_records(db: AsyncIOMotorDatabase, usuario_id: Optional[str] = None) -> int:
+    """
+    Recalcula los máximos desde los registros (de un usuario o de todos) con un único $group.
+    No crea logros: sirve para inicializar la colección o repararla.
+    """
+    try:
+        filtro = {"usuario_id": usuario_id} if usuario_id is not None else {}
+        pipeline = _pipeline_maximos(filtro)
+        records = await get_registros_collection(db).aggregate(pipeline, allowDiskUse=True).to_list(None)
+        await db.records_personales.delete_many(filtro)
+        if records:
+            await db.records_personales.insert_many(records)
+        logger.debug("Récords reconstruidos para %s: %s documentos", usuario_id or 'todos los usuarios', len(records))
+        return len(records)
+    except Exception as e:
+        logger.error("Error al reconstruir los récords para %s: %s", usuario_id or 'todos los usuarios', e)
+        return 0
+
+
+async def asegurar_records(db: AsyncIOMotorDatabase) -> None:
+    """
+    En el arranque, construye los récords si la colección está vacía y ya hay registros
+    (solo el worker que obtiene el bloqueo, como asegurar_progreso).
+    """
+    try:
+        if await db.records_personales.estimated_document_count() == 0 and await get_registros_collection(db).estimated_document_count() > 0:
+            async with bloqueo(db, "records_personales") as obtenido:
+                if obtenido and await db.records_personales.estimated_document_count() == 0:
+                    await reconstruir_records(db)
+    except Exception as e:
+        logger.error("Error al comprobar la colección de récords: %s", e)
+
+# --- Consulta ---
+
+async def get_records_usuario(db: AsyncIOMotorDatabase, usuario_id: str) -> List[Dict[str, Any]]:
+    """
+    Récords personales de un usuario por ejercicio (con el nombre del catálogo).
+    """
+    try:
+        records = await db.records_personales.find({"usuario_id": usuario_id}, {"_id": 0}).to_list(None)
+        nombres = await ejercicio_controller.get_nombres_ejercicios(db)
+        for record in records:
+            record["ejercicio_nombre"] = ejercicio_controller.nombre_de(nombres, record.get("ejercicio_id"))
+        records.sort(key=lambda r: (r["ejercicio_nombre"] or "").lower())
+        processed_records = convert_id_to_str(records)
+        logger.debug("Récords de %s: %s", usuario_id, payload(processed_records))
+        return processed_records
+    except Exception as e:
+        logger.error("Error al obtener los récords del usuario '%s': %s", usuario_id, e)
+        return []
@@ -1,24 +1,67 @@
 from bson import ObjectId
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple, AsyncIterator
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+from controllers import ejercicio_controller, progreso_controller, rollup_controller, records_controller
+from utils.serialization import convert_id_to_str
+from connection.registros_storage import get_registros_collection, es_timeseries
+from utils.logger import get_logger, payload
 
-# --- Función auxiliar para convertir ObjectId a str de forma recursiva ---
-def _convert_id_to_str(document: Any) -> Any:
+logger = get_logger("controllers.registro")
+
+# --- Escrituras según el modo de almacenamiento ---
+# Las colecciones de series temporales no admiten findAndModify: allí se lee la versión anterior
+# y se actualiza o elimina por _id con compare-and-set (el filtro exige los valores leídos), de
+# modo que la versión anterior que reciben el progreso y los rollups es la que se sustituyó de
+# verdad; si otra petición cambió el registro entre medias, se vuelve a leer y se reintenta.
+# Los update/delete arbitrarios (campos que no son 'metaField') requieren MongoDB 7.0 o
+# posterior en modo REGISTROS_STORAGE=timeseries.
+_REINTENTOS_CAS = 5
+
+
+def _filtro_version(documento: Dict[str, Any], cambios: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
     """
-    Convierte ObjectId en str dentro de un diccionario o lista de diccionarios.
-    Útil para la serialización de respuestas de la API.
+    Filtro que solo coincide con el documento si sigue teniendo los valores leídos.
     """
-    if isinstance(document, dict):
-        return {
-            k: str(v) if isinstance(v, ObjectId) else _convert_id_to_str(v)
-            for k, v in document.items()
-        }
-    elif isinstance(document, list):
-        return [_convert_id_to_str(elem) for elem in document]
-    elif isinstance(document, ObjectId):
-        return str(document)
-    return document
+    filtro = dict(documento)
+    for campo in cambios or {}:
+        if campo not in documento:
+            filtro[campo] = {"$exists": False}
+    return filtro
+
+
+async def _actualizar_devolviendo_anterior(db: AsyncIOMotorDatabase, object_id: ObjectId, cambios: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    coleccion = get_registros_collection(db)
+    if not es_timeseries():
+        return await coleccion.find_one_and_update(
+            {"_id": object_id},
+            {"$set": cambios},
+            return_document=ReturnDocument.BEFORE
+        )
+    for _ in range(_REINTENTOS_CAS):
+        anterior = await coleccion.find_one({"_id": object_id})
+        if anterior is None:
+            return None
+        result = await coleccion.update_one(_filtro_version(anterior, cambios), {"$set": cambios})
+        if result.matched_count:
+            return anterior
+    raise RuntimeError(f"El registro {object_id} cambió durante la actualización {_REINTENTOS_CAS} veces seguidas")
+
+
+async def _eliminar_devolviendo_documento(db: AsyncIOMotorDatabase, object_id: ObjectId) -> Optional[Dict[str, Any]]:
+    coleccion = get_registros_collection(db)
+    if not es_timeseries():
+        return await coleccion.find_one_and_delete({"_id": object_id})
+    for _ in range(_REINTENTOS_CAS):
+        eliminado = await coleccion.find_one({"_id": object_id})
+        if eliminado is None:
+            return None
+        result = await coleccion.delete_one(_filtro_version(eliminado))
+        if result.deleted_count:
+            return eliminado
+    raise RuntimeError(f"El registro {object_id} cambió durante la eliminación {_REINTENTOS_CAS} veces seguidas")
 
 # --- Funciones CRUD para Registros ---
 
@@ -28,35 +71,78 @@ async def get_registro_by_id(db: AsyncIOMotorDatabase, registro_id: str) -> Opti
     """
     try:
         if not ObjectId.is_valid(registro_id):
-            print(f"ERROR (Controller): ID de registro inválido: {registro_id}")
+            logger.warning("ID de registro inválido: %s", registro_id)
             return None
 
-        registro = await db.registros.find_one({"_id": ObjectId(registro_id)})
+        registro = await get_registros_collection(db).find_one({"_id": ObjectId(registro_id)})
         if registro:
-            processed_registro = _convert_id_to_str(registro)
-            print(f"DEBUG (Controller): Registro recuperado por ID ({registro_id}): {processed_registro}")
+            processed_registro = convert_id_to_str(registro)
+            logger.debug("Registro recuperado por ID (%s): %s", registro_id, payload(processed_registro))
             return processed_registro
-        print(f"DEBUG (Controller): Registro no encontrado para ID: {registro_id}")
+        logger.debug("Registro no encontrado para ID: %s", registro_id)
         return None
     except Exception as e:
-        print(f"ERROR (Controller): Error al recuperar el registro '{registro_id}': {e}")
+        logger.error("Error al recuperar el registro '%s': %s", registro_id, e)
         return None
 
 
-async def get_all_registros(db: AsyncIOMotorDatabase) -> List[Dict[str, Any]]:
+async def get_all_registros(db: AsyncIOMotorDatabase, projection: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
     """
     Obtiene todos los registros de la base de datos.
+    Con 'projection' solo se leen los campos indicados.
     """
     try:
-        registros = await db.registros.find().to_list(None)
-        processed_registros = [_convert_id_to_str(r) for r in registros]
-        if not processed_registros:
-            print("DEBUG (Controller): No se encontraron registros.")
+        registros = await get_registros_collection(db).find({}, projection).to_list(None)
+        if not registros:
+            logger.debug("No se encontraron registros.")
         
-        print(f"DEBUG (Controller): Registros recuperados: {processed_registros}")
-        return processed_registros
+        logger.debug("Registros recuperados: %s", payload(registros))
+        return registros
+    except Exception as e:
+        logger.error("Error al recuperar los registros: %s", e)
+        return []
+
+
+async def get_registros_paginados(db: AsyncIOMotorDatabase, after: Optional[str], limit: int, projection: Optional[Dict[str, int]] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Obtiene una página de registros usando paginación por cursor (keyset) sobre _id.
+    Devuelve la página y el cursor para pedir la siguiente (None si no hay más registros).
+    """
+    try:
+        query: Dict[str, Any] = {}
+        if after is not None:
+            query["_id"] = {"$gt": ObjectId(after)}
+
+        registros = await get_registros_collection(db).find(query, projection).sort("_id", 1).limit(limit).to_list(limit)
+        next_cursor = str(registros[-1]["_id"]) if len(registros) == limit else None
+
+        logger.debug("Página de registros recuperada (%s registros, siguiente cursor: %s)", len(registros), next_cursor)
+        return registros, next_cursor
+    except Exception as e:
+        logger.error("Error al recuperar la página de registros (after=%s): %s", after, e)
+        return [], None
+
+
+async def stream_registros(db: AsyncIOMotorDatabase, batch_size: int = 500, projection: Optional[Dict[str, int]] = None) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Recorre todos los registros con el cursor de Motor, pidiendo lotes de 'batch_size'
+    documentos al servidor. La memoria usada no depende del tamaño de la colección.
+    """
+    cursor = get_registros_collection(db).find({}, projection).sort("_id", 1).batch_size(batch_size)
+    async for registro in cursor:
+        yield registro
+
+
+async def get_ultimos_registros(db: AsyncIOMotorDatabase, n: int) -> List[Dict[str, Any]]:
+    """
+    Obtiene los n registros más recientes (por fecha_registro) de todos los usuarios.
+    """
+    try:
+        registros = await get_registros_collection(db).find().sort("fecha_registro", -1).limit(n).to_list(n)
+        logger.debug("Últimos %s registros: %s", n, payload(registros))
+        return registros
     except Exception as e:
-        print(f"ERROR (Controller): Error al recuperar los registros: {e}")
+        logger.error("Error al recuperar los últimos registros: %s", e)
         return []
 
 
@@ -67,53 +153,113 @@ async def create_registro(db: AsyncIOMotorDatabase, registro_data: Dict[str, Any
     try:
         if "fecha_registro" in registro_data and isinstance(registro_data["fecha_registro"], str):
             registro_data["fecha_registro"] = datetime.fromisoformat(registro_data["fecha_registro"])
+        await ejercicio_controller.resolver_registros(db, [registro_data])
 
-        result = await db.registros.insert_one(registro_data)
+        result = await get_registros_collection(db).insert_one(registro_data)
         
         if not result.acknowledged:
-            print("ERROR (Controller): Fallo en el reconocimiento de la inserción.")
+            logger.error("Fallo en el reconocimiento de la inserción.")
             return None
         
-        created_registro = await db.registros.find_one({"_id": result.inserted_id})
-        if created_registro:
-            processed_registro = _convert_id_to_str(created_registro)
-            print(f"DEBUG (Controller): Registro creado: {processed_registro}")
-            return processed_registro
-        print("ERROR (Controller): No se pudo recuperar el registro recién creado.")
-        return None
+        # insert_one añade el _id generado al propio diccionario: no hace falta volver a leerlo
+        registro_data["_id"] = result.inserted_id
+        await progreso_controller.aplicar_registros_creados(db, [registro_data])
+        await rollup_controller.aplicar_registros_creados(db, [registro_data])
+        await records_controller.registrar_serie(db, registro_data)
+        processed_registro = convert_id_to_str(registro_data)
+        logger.debug("Registro creado: %s", payload(processed_registro))
+        return processed_registro
     except Exception as e:
-        print(f"ERROR (Controller): Error al crear el registro: {e}")
+        logger.error("Error al crear el registro: %s", e)
         return None
 
 
+async def create_registros_bulk(db: AsyncIOMotorDatabase, registros_data: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+    """
+    Crea varios registros con un único insert_many(ordered=False).
+    Devuelve un resultado por elemento (en el mismo orden) sin volver a leer los documentos:
+    el driver asigna el _id a cada documento antes de enviarlo. Si la escritura se interrumpe
+    por otro error (p. ej., de red), se consulta qué _id llegaron a escribirse; si tampoco se
+    puede saber, devuelve None.
+    """
+    for registro_data in registros_data:
+        if "fecha_registro" in registro_data and isinstance(registro_data["fecha_registro"], str):
+            registro_data["fecha_registro"] = datetime.fromisoformat(registro_data["fecha_registro"])
+
+    try:
+        await ejercicio_controller.resolver_registros(db, registros_data)
+    except Exception as e:
+        # Todavía no se ha escrito ningún registro
+        logger.error("Error al resolver los ejercicios de los registros en bloque: %s", e)
+        return [{"indice": i, "ok": False, "id": None, "error": str(e)} for i in range(len(registros_data))]
+
+    errores: Dict[int, str] = {}
+    try:
+        await get_registros_collection(db).insert_many(registros_data, ordered=False)
+    except BulkWriteError as e:
+        for write_error in e.details.get("writeErrors", []):
+            errores[write_error["index"]] = write_error.get("errmsg", "Error de escritura")
+    except Exception as e:
+        logger.error("Error al crear registros en bloque: %s", e)
+        try:
+            ids = [r["_id"] for r in registros_data if "_id" in r]
+            escritos = {d["_id"] async for d in get_registros_collection(db).find({"_id": {"$in": ids}}, {"_id": 1})}
+        except Exception as e_consulta:
+            logger.error("No se pudo comprobar qué registros en bloque se escribieron: %s", e_consulta)
+            return None
+        for indice, registro in enumerate(registros_data):
+            if registro.get("_id") not in escritos:
+                errores[indice] = str(e)
+
+    resultados = []
+    insertados = []
+    for indice, registro in enumerate(registros_data):
+        if indice in errores:
+            resultados.append({"indice": indice, "ok": False, "id": None, "error": errores[indice]})
+        else:
+            insertados.append(registro)
+            resultados.append({"indice": indice, "ok": True, "id": str(registro["_id"]), "error": None})
+
+    if insertados:
+        await progreso_controller.aplicar_registros_creados(db, insertados)
+        await rollup_controller.aplicar_registros_creados(db, insertados)
+        await records_controller.registrar_series(db, insertados)
+    logger.debug("Registros creados en bloque: %s correctos, %s con error", len(insertados), len(errores))
+    return resultados
+
+
 async def update_registro(db: AsyncIOMotorDatabase, registro_id: str, registro_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
     """
     Actualiza un registro existente en la base de datos.
     """
     try:
         if not ObjectId.is_valid(registro_id):
-            print(f"ERROR (Controller): ID de registro inválido: {registro_id}")
+            logger.warning("ID de registro inválido: %s", registro_id)
             return None
 
         object_id = ObjectId(registro_id)
         
         registro_data.pop('id', None)
         registro_data.pop('_id', None)
+        if registro_data.get("ejercicio_id") is not None or registro_data.get("ejercicio_nombre"):
+            # Un nombre nuevo sin ID cambia de ejercicio: no se conserva el ID anterior
+            await ejercicio_controller.resolver_registros(db, [registro_data])
 
-        await db.registros.update_one(
-            {"_id": object_id},
-            {"$set": registro_data}
-        )
-        
-        updated_registro = await db.registros.find_one({"_id": object_id})
-        if updated_registro:
-            processed_registro = _convert_id_to_str(updated_registro)
-            print(f"DEBUG (Controller): Registro actualizado: {processed_registro}")
+        # Se pide la versión ANTERIOR (la necesita el progreso) y la nueva se obtiene
+        # aplicando el mismo $set en memoria: una sola ida y vuelta a la base de datos.
+        registro_anterior = await _actualizar_devolviendo_anterior(db, object_id, registro_data)
+        if registro_anterior:
+            updated_registro = {**registro_anterior, **registro_data}
+            await progreso_controller.aplicar_registro_actualizado(db, registro_anterior, updated_registro)
+            await rollup_controller.aplicar_registro_actualizado(db, registro_anterior, updated_registro)
+            await records_controller.aplicar_registro_actualizado(db, registro_anterior, updated_registro)
+            processed_registro = convert_id_to_str(updated_registro)
+            logger.debug("Registro actualizado: %s", payload(processed_registro))
             return processed_registro
-        print(f"DEBUG (Controller): Registro no encontrado o no se pudo recuperar después de la actualización para ID: {registro_id}")
+        logger.debug("Registro no encontrado para actualizar con ID: %s", registro_id)
         return None
     except Exception as e:
-        print(f"ERROR (Controller): Error al actualizar el registro '{registro_id}': {e}")
+        logger.error("Error al actualizar el registro '%s': %s", registro_id, e)
         return None
 
 
@@ -123,63 +269,116 @@ async def delete_registro(db: AsyncIOMotorDatabase, registro_id: str) -> bool:
     """
     try:
         if not ObjectId.is_valid(registro_id):
-            print(f"ERROR (Controller): ID de registro inválido: {registro_id}")
+            logger.warning("ID de registro inválido: %s", registro_id)
             return False
 
-        result = await db.registros.delete_one({"_id": ObjectId(registro_id)})
+        deleted_registro = await _eliminar_devolviendo_documento(db, ObjectId(registro_id))
         
-        if result.deleted_count == 0:
-            print(f"DEBUG (Controller): Registro no encontrado para eliminar con ID: {registro_id}")
+        if deleted_registro is None:
+            logger.debug("Registro no encontrado para eliminar con ID: %s", registro_id)
             return False
         
-        print(f"DEBUG (Controller): Registro eliminado ({registro_id}): True")
+        await progreso_controller.aplicar_registro_eliminado(db, deleted_registro)
+        await rollup_controller.aplicar_registro_eliminado(db, deleted_registro)
+        await records_controller.aplicar_registro_eliminado(db, deleted_registro)
+        logger.debug("Registro eliminado (%s): True", registro_id)
         return True
     except Exception as e:
-        print(f"ERROR (Controller): Error al eliminar el registro '{registro_id}': {e}")
+        logger.error("Error al eliminar el registro '%s': %s", registro_id, e)
         return False
 
 
-async def get_registros_by_usuario(db: AsyncIOMotorDatabase, usuario_id: str) -> List[Dict[str, Any]]:
+async def get_registros_by_usuario(
+    db: AsyncIOMotorDatabase,
+    usuario_id: str,
+    projection: Optional[Dict[str, int]] = None,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    ejercicio_nombre: Optional[str] = None,
+    limit: Optional[int] = None,
+    offset: int = 0
+) -> List[Dict[str, Any]]:
     """
-    Recupera los registros de entrenamiento de un usuario específico.
+    Recupera los registros de entrenamiento de un usuario específico, del más reciente al más antiguo.
+    Admite filtros por rango de fechas y ejercicio, y paginación con limit/offset, todos resueltos
+    en MongoDB con los índices (usuario_id, fecha_registro) y (usuario_id, ejercicio_id, fecha_registro).
+    El ejercicio (nombre o ID) se resuelve contra el catálogo.
+    Con 'projection' solo se leen los campos indicados.
     """
     try:
         # Asumimos que usuario_id se almacena como string en la colección 'registros'
-        query_user_id = usuario_id
+        query: Dict[str, Any] = {"usuario_id": usuario_id}
+        if ejercicio_nombre is not None:
+            ejercicio_id = await ejercicio_controller.buscar_ejercicio_id(db, ejercicio_nombre)
+            if ejercicio_id is None:
+                logger.debug("Ejercicio no encontrado en el catálogo: %s", ejercicio_nombre)
+                return []
+            query["ejercicio_id"] = ejercicio_id
+        if desde is not None or hasta is not None:
+            query["fecha_registro"] = {}
+            if desde is not None:
+                query["fecha_registro"]["$gte"] = desde
+            if hasta is not None:
+                query["fecha_registro"]["$lte"] = hasta
 
-        registros = await db.registros.find({"usuario_id": query_user_id}).to_list(None)
+        cursor = get_registros_collection(db).find(query, projection).sort("fecha_registro", -1)
+        if offset:
+            cursor = cursor.skip(offset)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        registros = await cursor.to_list(limit)
         
-        processed_registros = [_convert_id_to_str(r) for r in registros]
-        if not processed_registros:
-            print(f"DEBUG (Controller): No se encontraron registros para el usuario {usuario_id}")
+        if not registros:
+            logger.debug("No se encontraron registros para el usuario %s", usuario_id)
         
-        print(f"DEBUG (Controller): Registros para usuario {usuario_id}: {processed_registros}")
-        return processed_registros
+        logger.debug("Registros para usuario %s: %s", usuario_id, payload(registros))
+        return registros
+    except Exception as e:
+        logger.error("Error al recuperar los registros del usuario '%s': %s", usuario_id, e)
+        return []
+
+
+async def get_ejercicios_distintos(db: AsyncIOMotorDatabase, usuario_id: str) -> List[str]:
+    """
+    Devuelve los nombres de ejercicio distintos que ha registrado un usuario (ordenados),
+    calculados en MongoDB con distinct() sobre 'ejercicio_id' en lugar de descargar todos sus
+    registros; los nombres salen de la tabla en caché del catálogo.
+    """
+    try:
+        ids = await get_registros_collection(db).distinct("ejercicio_id", {"usuario_id": usuario_id})
+        tabla = await ejercicio_controller.get_nombres_ejercicios(db)
+        nombres = sorted({ejercicio_controller.nombre_de(tabla, i) for i in ids if i is not None}, key=str.lower)
+        logger.debug("Ejercicios distintos para %s: %s", usuario_id, payload(nombres))
+        return nombres
     except Exception as e:
-        print(f"ERROR (Controller): Error al recuperar los registros del usuario '{usuario_id}': {e}")
+        logger.error("Error al recuperar los ejercicios del usuario '%s': %s", usuario_id, e)
         return []
 
 
 async def get_historial_por_ejercicio(db: AsyncIOMotorDatabase, usuario_id: str, ejercicio_nombre: str) -> List[Dict[str, Any]]:
     """
     Obtiene el historial de registros para un ejercicio específico de un usuario.
+    El nombre (o el ID) del ejercicio se resuelve contra el catálogo y se filtra por 'ejercicio_id'.
     """
     try:
         query_user_id = usuario_id
+        ejercicio_id = await ejercicio_controller.buscar_ejercicio_id(db, ejercicio_nombre)
+        if ejercicio_id is None:
+            logger.debug("Ejercicio no encontrado en el catálogo: %s", ejercicio_nombre)
+            return []
 
-        registros = await db.registros.find({
+        registros = await get_registros_collection(db).find({
             "usuario_id": query_user_id,
-            "ejercicio_nombre": ejercicio_nombre
+            "ejercicio_id": ejercicio_id
         }).sort("fecha_registro", -1).to_list(None)
 
-        processed_registros = [_convert_id_to_str(r) for r in registros]
-        if not processed_registros:
-            print(f"DEBUG (Controller): No se encontraron registros para el ejercicio '{ejercicio_nombre}' del usuario {usuario_id}")
+        if not registros:
+            logger.debug("No se encontraron registros para el ejercicio '%s' del usuario %s", ejercicio_nombre, usuario_id)
         
-        print(f"DEBUG (Controller): Historial para {ejercicio_nombre} de {usuario_id}: {processed_registros}")
-        return processed_registros
+        logger.debug("Historial para %s de %s: %s", ejercicio_nombre, usuario_id, payload(registros))
+        return registros
     except Exception as e:
-        print(f"ERROR (Controller): Error al recuperar el historial del ejercicio '{ejercicio_nombre}' para el usuario '{usuario_id}': {e}")
+        logger.error("Error al recuperar el historial del ejercicio '%s' para el usuario '%s': %s", ejercicio_nombre, usuario_id, e)
         return []
 
 
@@ -190,7 +389,7 @@ async def get_registros_por_fecha(db: AsyncIOMotorDatabase, usuario_id: str, fec
     try:
         query_user_id = usuario_id
 
-        registros = await db.registros.find({
+        registros = await get_registros_collection(db).find({
             "usuario_id": query_user_id,
             "fecha_registro": {
                 "$gte": fecha_inicio,
@@ -198,12 +397,11 @@ async def get_registros_por_fecha(db: AsyncIOMotorDatabase, usuario_id: str, fec
             }
         }).sort("fecha_registro", -1).to_list(None)
 
-        processed_registros = [_convert_id_to_str(r) for r in registros]
-        if not processed_registros:
-            print(f"DEBUG (Controller): No se encontraron registros para el usuario {usuario_id} en el rango {fecha_inicio} a {fecha_fin}")
+        if not registros:
+            logger.debug("No se encontraron registros para el usuario %s en el rango %s a %s", usuario_id, fecha_inicio, fecha_fin)
         
-        print(f"DEBUG (Controller): Registros por fecha para {usuario_id}: {processed_registros}")
-        return processed_registros
+        logger.debug("Registros por fecha para %s: %s", usuario_id, payload(registros))
+        return registros
     except Exception as e:
-        print(f"ERROR (Controller): Error al recuperar los registros por fecha para el usuario '{usuario_id}': {e}")
+        logger.error("Error al recuperar los registros por fecha para el usuario '%s': %s", usuario_id, e)
         return []
@@ -0,0 +1,298 @@
+from datetime import datetime, timedelta
+from typing import List, Optional, Dict, Any, Tuple
+from pymongo import UpdateOne, ReturnDocument
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from connection.bloqueos import bloqueo
+from controllers import ejercicio_controller
+from connection.registros_storage import get_registros_collection
+from utils.helpers import fecha_utc, volumen_registro
+from utils.logger import get_logger
+
+logger = get_logger("controllers.rollup")
+
+# Colección 'registros_rollup': un documento (bucket) por usuario, ejercicio, granularidad
+# ('dia', 'semana' o 'mes') e inicio del periodo, con el número de series, las repeticiones,
+# el volumen, el peso máximo y los días entrenados. Se mantiene de forma incremental desde
+# registro_controller en cada escritura y se puede reconstruir desde los registros.
+
+GRANULARIDADES = ("dia", "semana", "mes")
+
+# --- Funciones auxiliares ---
+
+def _inicio_periodo(fecha: datetime, granularidad: str) -> datetime:
+    """
+    Inicio del periodo que contiene 'fecha' (UTC): el día, el lunes de la semana ISO o el día 1 del mes.
+    """
+    dia = fecha_utc(fecha).replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularidad == "dia":
+        return dia
+    if granularidad == "semana":
+        return dia - timedelta(days=dia.weekday())
+    if granularidad == "mes":
+        return dia.replace(day=1)
+    raise ValueError(f"Granularidad desconocida: {granularidad}")
+
+
+def _fin_periodo(inicio: datetime, granularidad: str) -> datetime:
+    if granularidad == "dia":
+        return inicio + timedelta(days=1)
+    if granularidad == "semana":
+        return inicio + timedelta(days=7)
+    if inicio.month == 12:
+        return inicio.replace(year=inicio.year + 1, month=1)
+    return inicio.replace(month=inicio.month + 1)
+
+
+def _clave_dia(fecha: datetime) -> str:
+    return fecha_utc(fecha).strftime("%Y-%m-%d")
+
+
+def _filtro_bucket(usuario_id: str, ejercicio_id: Any, granularidad: str, inicio: datetime) -> Dict[str, Any]:
+    return {"usuario_id": usuario_id, "ejercicio_id": ejercicio_id, "granularidad": granularidad, "inicio": inicio}
+
+
+def _nuevo_bucket() -> Dict[str, Any]:
+    return {"conteo": 0, "repeticiones_total": 0, "volumen": 0.0, "peso_max": None, "dias": {}}
+
+
+def _acumular(bucket: Dict[str, Any], registro: Dict[str, Any]) -> None:
+    peso = registro.get("peso_levantado", 0) or 0
+    bucket["conteo"] += 1
+    bucket["repeticiones_total"] += registro.get("repeticiones", 0) or 0
+    bucket["volumen"] += volumen_registro(registro)
+    bucket["peso_max"] = peso if bucket["peso_max"] is None else max(bucket["peso_max"], peso)
+    dia = _clave_dia(registro["fecha_registro"])
+    bucket["dias"][dia] = bucket["dias"].get(dia, 0) + 1
+
+
+def _agrupar(registros: List[Dict[str, Any]]) -> Dict[Tuple[str, str, str, datetime], Dict[str, Any]]:
+    buckets: Dict[Tuple[str, str, str, datetime], Dict[str, Any]] = {}
+    for registro in registros:
+        for granularidad in GRANULARIDADES:
+            clave = (registro.get("usuario_id"), registro.get("ejercicio_id"), granularidad,
+                     _inicio_periodo(registro["fecha_registro"], granularidad))
+            if clave not in buckets:
+                buckets[clave] = _nuevo_bucket()
+            _acumular(buckets[clave], registro)
+    return buckets
+
+
+def _bucket_a_documento(clave: Tuple[str, str, str, datetime], bucket: Dict[str, Any]) -> Dict[str, Any]:
+    return {**_filtro_bucket(*clave), **bucket}
+
+
+def _dias_entrenados(dias: Optional[Dict[str, int]]) -> set:
+    return {dia for dia, conteo in (dias or {}).items() if conteo > 0}
+
+# --- Mantenimiento incremental (llamado desde registro_controller) ---
+
+async def aplicar_registros_creados(db: AsyncIOMotorDatabase, registros: List[Dict[str, Any]]) -> None:
+    """
+    Suma registros recién insertados a sus buckets diario, semanal y mensual.
+    Los registros que caen en el mismo bucket se agrupan: una operación por bucket en un único bulk_write.
+    """
+    try:
+        operaciones = []
+        for clave, bucket in _agrupar(registros).items():
+            incrementos: Dict[str, Any] = {
+                "conteo": bucket["conteo"],
+                "repeticiones_total": bucket["repeticiones_total"],
+                "volumen": bucket["volumen"],
+            }
+            for dia, conteo in bucket["dias"].items():
+                incrementos[f"dias.{dia}"] = conteo
+            operaciones.append(UpdateOne(
+                _filtro_bucket(*clave),
+                {"$inc": incrementos, "$max": {"peso_max": bucket["peso_max"]}},
+                upsert=True
+            ))
+
+        if operaciones:
+            await db.registros_rollup.bulk_write(operaciones, ordered=False)
+            logger.debug("Rollups actualizados para %s registros nuevos (%s buckets)", len(registros), len(operaciones))
+    except Exception as e:
+        logger.error("Error al actualizar los rollups tras crear registros: %s", e)
+
+
+async def aplicar_registro_eliminado(db: AsyncIOMotorDatabase, registro: Dict[str, Any]) -> None:
+    """
+    Descuenta un registro eliminado de sus tres buckets. Un bucket vacío se borra; si el
+    registro tenía el peso máximo del bucket, se recalcula solo con los registros de ese periodo.
+    """
+    try:
+        usuario_id = registro.get("usuario_id")
+        ejercicio_id = registro.get("ejercicio_id")
+        peso = registro.get("peso_levantado", 0) or 0
+        dia = _clave_dia(registro["fecha_registro"])
+
+        for granularidad in GRANULARIDADES:
+            inicio = _inicio_periodo(registro["fecha_registro"], granularidad)
+            filtro = _filtro_bucket(usuario_id, ejercicio_id, granularidad, inicio)
+            bucket = await db.registros_rollup.find_one_and_update(
+                filtro,
+                {"$inc": {
+                    "conteo": -1,
+                    "repeticiones_total": -(registro.get("repeticiones", 0) or 0),
+                    "volumen": -volumen_registro(registro),
+                    f"dias.{dia}": -1,
+                }},
+                return_document=ReturnDocument.AFTER
+            )
+            if bucket is None:
+                continue
+
+            if bucket.get("conteo", 0) <= 0:
+                await db.registros_rollup.delete_one(filtro)
+                continue
+
+            cambios: Dict[str, Any] = {}
+            if bucket.get("peso_max") is not None and peso >= bucket["peso_max"]:
+                mayor = await get_registros_collection(db).find_one(
+                    {"usuario_id": usuario_id, "ejercicio_id": ejercicio_id,
+                     "fecha_registro": {"$gte": inicio, "$lt": _fin_periodo(inicio, granularidad)}},
+                    {"peso_levantado": 1},
+                    sort=[("peso_levantado", -1)]
+                )
+                cambios["$set"] = {"peso_max": mayor.get("peso_levantado") if mayor else None}
+            if bucket.get("dias", {}).get(dia, 0) <= 0:
+                cambios["$unset"] = {f"dias.{dia}": ""}
+            if cambios:
+                await db.registros_rollup.update_one(filtro, cambios)
+        logger.debug("Rollups actualizados tras eliminar el registro %s", registro.get("_id"))
+    except Exception as e:
+        logger.error("Error al actualizar los rollups tras eliminar un registro: %s", e)
+
+
+async def aplicar_registro_actualizado(db: AsyncIOMotorDatabase, anterior: Dict[str, Any], actualizado: Dict[str, Any]) -> None:
+    """
+    Una actualización equivale a retirar la versión anterior y añadir la nueva.
+    """
+    await aplicar_registro_eliminado(db, anterior)
+    await aplicar_registros_creados(db, [actualizado])
+
+# --- Reconstrucción completa ---
+
+async def reconstruir_rollups(db: AsyncIOMotorDatabase, usuario_id: Optional[str] = None, batch_size: int = 500) -> int:
+    """
+    Recalcula los buckets desde los registros (de un usuario o de todos).
+    Recorre los registros ordenados por (usuario_id, ejercicio_id), así que en memoria
+    solo se mantienen los buckets del par en curso.
+    Devuelve el número de buckets escritos.
+    """
+    try:
+        filtro = {"usuario_id": usuario_id} if usuario_id is not None else {}
+        await db.registros_rollup.delete_many(filtro)
+
+        cursor = get_registros_collection(db).find(filtro).sort([("usuario_id", 1), ("ejercicio_id", 1)]).batch_size(batch_size)
+        par_actual: Optional[Tuple[str, str]] = None
+        lote: List[Dict[str, Any]] = []
+        pendientes: List[Dict[str, Any]] = []
+        escritos = 0
+
+        async def volcar(registros_par: List[Dict[str, Any]]) -> None:
+            nonlocal pendientes, escritos
+            pendientes.extend(_bucket_a_documento(clave, bucket) for clave, bucket in _agrupar(registros_par).items())
+            if len(pendientes) >= batch_size:
+                await db.registros_rollup.insert_many(pendientes)
+                escritos += len(pendientes)
+                pendientes = []
+
+        async for registro in cursor:
+            clave = (registro.get("usuario_id"), registro.get("ejercicio_id"))
+            if clave != par_actual and lote:
+                await volcar(lote)
+                lote = []
+            par_actual = clave
+            # Solo se guardan los campos que necesitan los buckets
+            lote.append({
+                "usuario_id": registro.get("usuario_id"),
+                "ejercicio_id": registro.get("ejercicio_id"),
+                "peso_levantado": registro.get("peso_levantado"),
+                "repeticiones": registro.get("repeticiones"),
+                "fecha_registro": registro["fecha_registro"],
+            })
+
+        if lote:
+            await volcar(lote)
+        if pendientes:
+            await db.registros_rollup.insert_many(pendientes)
+            escritos += len(pendientes)
+
+        logger.debug("Rollups reconstruidos (%s buckets) para %s", escritos, usuario_id or 'todos los usuarios')
+        return escritos
+    except Exception as e:
+        logger.error("Error al reconstruir los rollups para %s: %s", usuario_id or 'todos los usuarios', e)
+        return 0
+
+
+async def asegurar_rollups(db: AsyncIOMotorDatabase) -> None:
+    """
+    En el arranque, construye los rollups si la colección está vacía y ya hay registros
+    (solo el worker que obtiene el bloqueo, como asegurar_progreso).
+    """
+    try:
+        if await db.registros_rollup.estimated_document_count() == 0 and await get_registros_collection(db).estimated_document_count() > 0:
+            async with bloqueo(db, "registros_rollup") as obtenido:
+                if obtenido and await db.registros_rollup.estimated_document_count() == 0:
+                    await reconstruir_rollups(db)
+    except Exception as e:
+        logger.error("Error al comprobar la colección de rollups: %s", e)
+
+# --- Consultas por rango (gráficas) ---
+
+async def get_rollups(
+    db: AsyncIOMotorDatabase,
+    usuario_id: str,
+    granularidad: str,
+    desde: Optional[datetime] = None,
+    hasta: Optional[datetime] = None,
+    ejercicio: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Devuelve la serie temporal de un usuario leyendo solo los buckets de la granularidad pedida.
+    'ejercicio' (nombre o ID) se resuelve contra el catálogo. Sin él, los buckets de todos los
+    ejercicios de un mismo periodo se combinan (se suman conteos, repeticiones y volumen, y
+    se unen los días entrenados).
+    """
+    try:
+        filtro: Dict[str, Any] = {"usuario_id": usuario_id, "granularidad": granularidad}
+        if ejercicio:
+            ejercicio_id = await ejercicio_controller.buscar_ejercicio_id(db, ejercicio)
+            if ejercicio_id is None:
+                return []
+            filtro["ejercicio_id"] = ejercicio_id
+        if desde is not None or hasta is not None:
+            filtro["inicio"] = {}
+            if desde is not None:
+                filtro["inicio"]["$gte"] = _inicio_periodo(desde, granularidad)
+            if hasta is not None:
+                filtro["inicio"]["$lte"] = fecha_utc(hasta)
+
+        buckets = await db.registros_rollup.find(filtro, {"_id": 0}).sort("inicio", 1).to_list(None)
+
+        periodos: Dict[datetime, Dict[str, Any]] = {}
+        for bucket in buckets:
+            periodo = periodos.setdefault(bucket["inicio"], {
+                "inicio": bucket["inicio"],
+                "conteo": 0,
+                "repeticiones_total": 0,
+                "volumen": 0.0,
+                "peso_max": None,
+                "dias": set(),
+            })
+            periodo["conteo"] += bucket.get("conteo", 0)
+            periodo["repeticiones_total"] += bucket.get("repeticiones_total", 0)
+            periodo["volumen"] += bucket.get("volumen", 0.0)
+            if bucket.get("peso_max") is not None:
+                periodo["peso_max"] = bucket["peso_max"] if periodo["peso_max"] is None else max(periodo["peso_max"], bucket["peso_max"])
+            periodo["dias"] |= _dias_entrenados(bucket.get("dias"))
+
+        result = []
+        for periodo in periodos.values():
+            periodo["dias_entrenados"] = len(periodo.pop("dias"))
+            result.append(periodo)
+        logger.debug("Rollups (%s) para %s: %s", granularidad, usuario_id, len(result))
+        return result
+    except Exception as e:
+        logger.error("Error al obtener los rollups (%s) para %s: %s", granularidad, usuario_id, e)
+        return []
@@ -0,0 +1,47 @@
+import os
+from typing import Optional, Dict, Any
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from connection.registros_storage import get_registros_collection
+from utils.cache import TTLCache
+from utils.logger import get_logger, payload
+
+logger = get_logger("controllers.stats")
+
+# Caché corta para que el dashboard no vuelva a contar en cada recarga
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "10"))
+_stats_cache = TTLCache(maxsize=1024, ttl=STATS_CACHE_TTL)
+
+COLECCIONES_GLOBALES = ["usuarios", "registros", "logros", "ejercicios", "conversaciones"]
+COLECCIONES_POR_USUARIO = ["registros", "logros", "conversaciones"]
+
+
+def _coleccion(db: AsyncIOMotorDatabase, nombre: str):
+    # 'registros' puede estar en una colección de series temporales (REGISTROS_STORAGE)
+    return get_registros_collection(db) if nombre == "registros" else db[nombre]
+
+async def get_stats(db: AsyncIOMotorDatabase, usuario_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Devuelve el número de documentos por colección.
+    Sin usuario se usa estimated_document_count (metadatos de la colección, sin recorrerla);
+    con usuario, count_documents sobre el índice de usuario_id.
+    """
+    cached = _stats_cache.get(usuario_id)
+    if cached is not None:
+        return cached
+
+    try:
+        conteos: Dict[str, int] = {}
+        if usuario_id is None:
+            for coleccion in COLECCIONES_GLOBALES:
+                conteos[coleccion] = await _coleccion(db, coleccion).estimated_document_count()
+        else:
+            for coleccion in COLECCIONES_POR_USUARIO:
+                conteos[coleccion] = await _coleccion(db, coleccion).count_documents({"usuario_id": usuario_id})
+
+        stats = {"usuario_id": usuario_id, "conteos": conteos}
+        _stats_cache.set(usuario_id, stats)
+        logger.debug("Estadísticas calculadas para %s: %s", usuario_id or 'todas las colecciones', payload(conteos))
+        return stats
+    except Exception as e:
+        logger.error("Error al calcular las estadísticas para %s: %s", usuario_id or 'todas las colecciones', e)
+        return {"usuario_id": usuario_id, "conteos": {}}
@@ -2,39 +2,27 @@ from bson import ObjectId
 from datetime import datetime
 from typing import List, Optional, Dict, Any
 from motor.motor_asyncio import AsyncIOMotorDatabase
+from pymongo import ReturnDocument
+from controllers import ejercicio_controller
+from utils.serialization import convert_id_to_str
+from utils.logger import get_logger, payload
 
-# --- Función auxiliar para convertir ObjectId a str de forma recursiva ---
-def _convert_id_to_str(document: Any) -> Any:
-    """
-    Convierte ObjectId en str dentro de un diccionario o lista de diccionarios.
-    Útil para la serialización de respuestas de la API.
-    """
-    if isinstance(document, dict):
-        return {
-            k: str(v) if isinstance(v, ObjectId) else _convert_id_to_str(v)
-            for k, v in document.items()
-        }
-    elif isinstance(document, list):
-        return [_convert_id_to_str(elem) for elem in document]
-    elif isinstance(document, ObjectId):
-        return str(document)
-    return document
+logger = get_logger("controllers.usuario")
 
 # --- Funciones CRUD para Usuarios ---
 
-async def get_all_usuarios(db: AsyncIOMotorDatabase) -> List[Dict[str, Any]]:
+async def get_all_usuarios(db: AsyncIOMotorDatabase, projection: Optional[Dict[str, int]] = None) -> List[Dict[str, Any]]:
     """
     Obtiene todos los usuarios de la base de datos.
     Devuelve una lista de diccionarios que incluyen el _id.
+    Con 'projection' solo se leen los campos indicados.
     """
     try:
-        users = await db.usuarios.find().to_list(None)
-        # Asegúrate de que los _id sean str para la respuesta JSON
-        processed_users = [_convert_id_to_str(user) for user in users]
-        print(f"DEBUG (Controller): Usuarios recuperados: {processed_users}")
-        return processed_users
+        users = await db.usuarios.find({}, projection).to_list(None)
+        logger.debug("Usuarios recuperados: %s", payload(users))
+        return users
     except Exception as e:
-        print(f"ERROR (Controller): Error al obtener todos los usuarios: {e}")
+        logger.error("Error al obtener todos los usuarios: %s", e)
         return []
 
 async def get_usuario_by_id(db: AsyncIOMotorDatabase, usuario_id: str) -> Optional[Dict[str, Any]]:
@@ -45,13 +33,13 @@ async def get_usuario_by_id(db: AsyncIOMotorDatabase, usuario_id: str) -> Option
         object_id = ObjectId(usuario_id)
         user = await db.usuarios.find_one({"_id": object_id})
         if user:
-            processed_user = _convert_id_to_str(user)
-            print(f"DEBUG (Controller): Usuario recuperado por ID ({usuario_id}): {processed_user}")
+            processed_user = convert_id_to_str(user)
+            logger.debug("Usuario recuperado por ID (%s): %s", usuario_id, payload(processed_user))
             return processed_user
-        print(f"DEBUG (Controller): Usuario no encontrado para ID '{usuario_id}'")
+        logger.debug("Usuario no encontrado para ID '%s'", usuario_id)
         return None
     except Exception as e:
-        print(f"ERROR (Controller): Error al obtener usuario por ID '{usuario_id}': {e}")
+        logger.error("Error al obtener usuario por ID '%s': %s", usuario_id, e)
         return None
 
 async def create_usuario(db: AsyncIOMotorDatabase, usuario_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -65,15 +53,13 @@ async def create_usuario(db: AsyncIOMotorDatabase, usuario_data: Dict[str, Any])
 
         result = await db.usuarios.insert_one(usuario_data)
         
-        created_user = await db.usuarios.find_one({"_id": result.inserted_id})
-        if created_user:
-            processed_user = _convert_id_to_str(created_user)
-            print(f"DEBUG (Controller): Usuario creado: {processed_user}")
-            return processed_user
-        print("ERROR (Controller): No se pudo recuperar el usuario recién creado.")
-        return None
+        # insert_one añade el _id generado al propio diccionario: no hace falta volver a leerlo
+        usuario_data["_id"] = result.inserted_id
+        processed_user = convert_id_to_str(usuario_data)
+        logger.debug("Usuario creado: %s", payload(processed_user))
+        return processed_user
     except Exception as e:
-        print(f"ERROR (Controller): Error al crear usuario: {e}")
+        logger.error("Error al crear usuario: %s", e)
         return None
 
 async def update_usuario(db: AsyncIOMotorDatabase, usuario_id: str, usuario_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -87,23 +73,20 @@ async def update_usuario(db: AsyncIOMotorDatabase, usuario_id: str, usuario_data
         usuario_data.pop('id', None)
         usuario_data.pop('_id', None)
 
-        result = await db.usuarios.update_one(
+        updated_user = await db.usuarios.find_one_and_update(
             {"_id": object_id},
-            {"$set": usuario_data}
+            {"$set": usuario_data},
+            return_document=ReturnDocument.AFTER
         )
-        if result.matched_count == 0:
-            print(f"DEBUG (Controller): No se encontró usuario para actualizar con ID: {usuario_id}")
+        if updated_user is None:
+            logger.debug("No se encontró usuario para actualizar con ID: %s", usuario_id)
             return None
         
-        updated_user = await db.usuarios.find_one({"_id": object_id})
-        if updated_user:
-            processed_user = _convert_id_to_str(updated_user)
-            print(f"DEBUG (Controller): Usuario actualizado: {processed_user}")
-            return processed_user
-        print(f"ERROR (Controller): No se pudo recuperar el usuario actualizado para ID: {usuario_id}")
-        return None
+        processed_user = convert_id_to_str(updated_user)
+        logger.debug("Usuario actualizado: %s", payload(processed_user))
+        return processed_user
     except Exception as e:
-        print(f"ERROR (Controller): Error al actualizar usuario '{usuario_id}': {e}")
+        logger.error("Error al actualizar usuario '%s': %s", usuario_id, e)
         return None
 
 async def delete_usuario(db: AsyncIOMotorDatabase, usuario_id: str) -> bool:
@@ -112,119 +95,230 @@ async def delete_usuario(db: AsyncIOMotorDatabase, usuario_id: str) -> bool:
     """
     try:
         result = await db.usuarios.delete_one({"_id": ObjectId(usuario_id)})
-        print(f"DEBUG (Controller): Usuario eliminado ({usuario_id}): {result.deleted_count > 0}")
+        logger.debug("Usuario eliminado (%s): %s", usuario_id, result.deleted_count > 0)
         return result.deleted_count > 0
     except Exception as e:
-        print(f"ERROR (Controller): Error al eliminar usuario '{usuario_id}': {e}")
+        logger.error("Error al eliminar usuario '%s': %s", usuario_id, e)
         return False
 
 # --- Funciones de Progreso ---
+# Leen los documentos de 'progreso_usuario' que progreso_controller mantiene en cada
+# escritura de registros, en lugar de agregar todos los registros del usuario.
+# Los documentos se agrupan por 'ejercicio_id'; el nombre se añade desde la tabla del catálogo.
+
+def _con_nombres(documentos: List[Dict[str, Any]], nombres: Dict[ObjectId, str]) -> List[Dict[str, Any]]:
+    """
+    Añade 'ejercicio_nombre' a cada documento y los ordena por ese nombre.
+    """
+    for documento in documentos:
+        documento["ejercicio_nombre"] = ejercicio_controller.nombre_de(nombres, documento.get("ejercicio_id"))
+    return sorted(documentos, key=lambda d: (d["ejercicio_nombre"] or "").lower())
+
 
 async def get_ultimo_peso_por_ejercicio(db: AsyncIOMotorDatabase, usuario_id: str) -> List[Dict[str, Any]]:
     """
     Obtiene el último peso registrado por ejercicio para un usuario.
     """
     try:
-        pipeline = [
-            {"$match": {"usuario_id": usuario_id}},
-            {"$sort": {"fecha_registro": -1}},
-            {"$group": {
-                "_id": "$ejercicio_nombre",
-                "ultimo_peso": {"$first": "$peso_levantado"},
-                "ultimas_repeticiones": {"$first": "$repeticiones"},
-                "ultima_fecha": {"$first": "$fecha_registro"}
-            }},
-            {"$project": {
-                "ejercicio_nombre": "$_id",
-                "ultimo_peso": 1,
-                "ultimas_repeticiones": 1,
-                "ultima_fecha": 1,
-                "_id": 0 # Excluir el _id del grupo para este caso específico si no lo necesitas
-            }}
-        ]
-        result = await db.registros.aggregate(pipeline).to_list(None)
-        # Convertir cualquier ObjectId residual en el resultado de la agregación
-        processed_result = _convert_id_to_str(result)
-        print(f"DEBUG (Controller): Último peso por ejercicio para {usuario_id}: {processed_result}")
+        result = await db.progreso_usuario.find(
+            {"usuario_id": usuario_id},
+            {"_id": 0, "ejercicio_id": 1, "ultimo_peso": 1, "ultimas_repeticiones": 1, "ultima_fecha": 1}
+        ).to_list(None)
+        nombres = await ejercicio_controller.get_nombres_ejercicios(db)
+        processed_result = convert_id_to_str(_con_nombres(result, nombres))
+        logger.debug("Último peso por ejercicio para %s: %s", usuario_id, payload(processed_result))
         return processed_result
     except Exception as e:
-        print(f"ERROR (Controller): Error al obtener último peso por ejercicio para {usuario_id}: {e}")
+        logger.error("Error al obtener último peso por ejercicio para %s: %s", usuario_id, e)
         return []
 
 async def get_mejor_marca(db: AsyncIOMotorDatabase, usuario_id: str, ejercicio_nombre: str) -> Optional[Dict[str, Any]]:
     """
     Obtiene la mejor marca (peso * repeticiones o solo peso) para un ejercicio específico de un usuario.
+    'ejercicio_nombre' (o el ID del ejercicio) se resuelve contra el catálogo.
     """
     try:
-        pipeline = [
-            {"$match": {"usuario_id": usuario_id, "ejercicio_nombre": ejercicio_nombre}},
-            {"$addFields": {"volumen": {"$multiply": ["$peso_levantado", "$repeticiones"]}}},
-            {"$sort": {"volumen": -1, "peso_levantado": -1, "repeticiones": -1}},
-            {"$limit": 1}
-        ]
-        result = await db.registros.aggregate(pipeline).to_list(None)
-        if result:
-            # Convertir cualquier ObjectId residual en el resultado de la agregación
-            processed_result = _convert_id_to_str(result[0])
-            print(f"DEBUG (Controller): Mejor marca para {usuario_id} - {ejercicio_nombre}: {processed_result}")
+        ejercicio_id = await ejercicio_controller.buscar_ejercicio_id(db, ejercicio_nombre)
+        if ejercicio_id is None:
+            logger.debug("Ejercicio no encontrado en el catálogo: %s", ejercicio_nombre)
+            return None
+        progreso = await db.progreso_usuario.find_one(
+            {"usuario_id": usuario_id, "ejercicio_id": ejercicio_id},
+            {"_id": 0, "mejor_marca": 1}
+        )
+        if progreso and progreso.get("mejor_marca"):
+            processed_result = convert_id_to_str(progreso["mejor_marca"])
+            logger.debug("Mejor marca para %s - %s: %s", usuario_id, ejercicio_nombre, payload(processed_result))
             return processed_result
-        print(f"DEBUG (Controller): No se encontró mejor marca para {usuario_id} - {ejercicio_nombre}")
+        logger.debug("No se encontró mejor marca para %s - %s", usuario_id, ejercicio_nombre)
         return None
     except Exception as e:
-        print(f"ERROR (Controller): Error al obtener mejor marca para {usuario_id} - {ejercicio_nombre}: {e}")
+        logger.error("Error al obtener mejor marca para %s - %s: %s", usuario_id, ejercicio_nombre, e)
         return None
 
 async def get_frecuencia_semanal(db: AsyncIOMotorDatabase, usuario_id: str) -> List[Dict[str, Any]]:
     """
     Calcula la frecuencia semanal de registros para un usuario.
+    Combina los conteos semanales de cada ejercicio: suma los registros y une los días entrenados.
+    """
+    try:
+        progresos = await db.progreso_usuario.find({"usuario_id": usuario_id}, {"_id": 0, "semanas": 1}).to_list(None)
+
+        semanas: Dict[str, Dict[str, Any]] = {}
+        for progreso in progresos:
+            for clave, datos in (progreso.get("semanas") or {}).items():
+                if datos.get("conteo", 0) <= 0:
+                    continue
+                semana = semanas.setdefault(clave, {"año": datos["año"], "semana": datos["semana"], "dias": set(), "conteo_registros": 0})
+                semana["conteo_registros"] += datos["conteo"]
+                semana["dias"].update(dia for dia, conteo in (datos.get("dias") or {}).items() if conteo > 0)
+
+        result = [
+            {"año": s["año"], "semana": s["semana"], "dias": len(s["dias"]), "conteo_registros": s["conteo_registros"]}
+            for s in sorted(semanas.values(), key=lambda s: (s["año"], s["semana"]))
+        ]
+        logger.debug("Frecuencia semanal para %s: %s", usuario_id, payload(result))
+        return result
+    except Exception as e:
+        logger.error("Error al obtener frecuencia semanal para %s: %s", usuario_id, e)
+        return []
+
+
+async def get_volumen_total(db: AsyncIOMotorDatabase, usuario_id: str) -> float:
+    """
+    Calcula el volumen total de levantamiento para un usuario.
     """
     try:
         pipeline = [
             {"$match": {"usuario_id": usuario_id}},
-            {"$group": {
-                "_id": {
-                    "año": {"$year": "$fecha_registro"},
-                    "semana": {"$week": "$fecha_registro"}
-                },
-                "dias": {"$addToSet": {"$dayOfWeek": "$fecha_registro"}},
-                "conteo": {"$sum": 1}
+            {"$group": {"_id": None, "volumen_total": {"$sum": "$volumen_total"}}}
+        ]
+        result = await db.progreso_usuario.aggregate(pipeline).to_list(None)
+        volumen = result[0]["volumen_total"] if result else 0.0
+        logger.debug("Volumen total para %s: %s", usuario_id, volumen)
+        return volumen
+    except Exception as e:
+        logger.error("Error al obtener volumen total para %s: %s", usuario_id, e)
+        return 0.0
+
+
+async def get_volumen_total_usuarios(db: AsyncIOMotorDatabase, usuario_ids: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Calcula el volumen total de todos los usuarios (o de los indicados) en una sola agregación:
+    parte de 'usuarios' y suma con un $lookup sus documentos de 'progreso_usuario', de modo que
+    los usuarios sin registros aparecen con volumen 0.
+    """
+    try:
+        pipeline: List[Dict[str, Any]] = []
+        if usuario_ids is not None:
+            pipeline.append({"$match": {"_id": {"$in": [ObjectId(i) for i in usuario_ids if ObjectId.is_valid(i)]}}})
+        pipeline += [
+            {"$lookup": {
+                "from": "progreso_usuario",
+                "let": {"uid": {"$toString": "$_id"}},
+                "pipeline": [
+                    {"$match": {"$expr": {"$eq": ["$usuario_id", "$$uid"]}}},
+                    {"$group": {"_id": None, "volumen_total": {"$sum": "$volumen_total"}}}
+                ],
+                "as": "progreso"
             }},
             {"$project": {
-                "año": "$_id.año",
-                "semana": "$_id.semana",
-                "dias": {"$size": "$dias"},
-                "conteo_registros": "$conteo",
-                "_id": 0
+                "_id": 0,
+                "usuario_id": {"$toString": "$_id"},
+                "nombre": 1,
+                "volumen_total": {"$ifNull": [{"$first": "$progreso.volumen_total"}, 0]}
             }},
-            {"$sort": {"año": 1, "semana": 1}}
+            {"$sort": {"volumen_total": -1}}
         ]
-        result = await db.registros.aggregate(pipeline).to_list(None)
-        # Convertir cualquier ObjectId residual en el resultado de la agregación (si _id del grupo fuera ObjectId, etc.)
-        processed_result = _convert_id_to_str(result)
-        print(f"DEBUG (Controller): Frecuencia semanal para {usuario_id}: {processed_result}")
-        return processed_result
+        result = await db.usuarios.aggregate(pipeline).to_list(None)
+        logger.debug("Volumen total por usuario: %s", payload(result))
+        return result
     except Exception as e:
-        print(f"ERROR (Controller): Error al obtener frecuencia semanal para {usuario_id}: {e}")
+        logger.error("Error al obtener el volumen total por usuario: %s", e)
         return []
 
 
-async def get_volumen_total(db: AsyncIOMotorDatabase, usuario_id: str) -> float:
+async def get_analytics_usuario(db: AsyncIOMotorDatabase, usuario_id: str) -> Dict[str, Any]:
     """
-    Calcula el volumen total de levantamiento para un usuario.
+    Obtiene todo el análisis de progreso de un usuario en una única agregación ($facet) sobre
+    sus documentos de 'progreso_usuario', que se leen una sola vez: último peso y mejor marca
+    por ejercicio, lista de ejercicios, frecuencia semanal y volumen total.
     """
+    analytics: Dict[str, Any] = {
+        "usuario_id": usuario_id,
+        "ejercicios": [],
+        "ultimo_peso": [],
+        "mejores_marcas": [],
+        "frecuencia_semanal": [],
+        "volumen_total": 0.0,
+        "conteo_registros": 0,
+    }
     try:
         pipeline = [
             {"$match": {"usuario_id": usuario_id}},
-            {"$group": {
-                "_id": None,
-                "volumen_total": {"$sum": {"$multiply": ["$peso_levantado", "$repeticiones"]}}
+            {"$facet": {
+                "ultimo_peso": [
+                    {"$project": {"_id": 0, "ejercicio_id": 1, "ultimo_peso": 1, "ultimas_repeticiones": 1, "ultima_fecha": 1}}
+                ],
+                "mejores_marcas": [
+                    {"$match": {"mejor_marca": {"$ne": None}}},
+                    {"$project": {"_id": 0, "ejercicio_id": 1, "mejor_marca": 1}}
+                ],
+                "volumen": [
+                    {"$group": {"_id": None, "volumen_total": {"$sum": "$volumen_total"}, "conteo_registros": {"$sum": "$conteo_registros"}}}
+                ],
+                # Mismo resultado que get_frecuencia_semanal: por semana se suman los registros
+                # de todos los ejercicios y se unen los días con algún registro.
+                "frecuencia_semanal": [
+                    {"$project": {"semana": {"$objectToArray": "$semanas"}}},
+                    {"$unwind": "$semana"},
+                    {"$match": {"semana.v.conteo": {"$gt": 0}}},
+                    {"$project": {
+                        "clave": "$semana.k",
+                        "año": "$semana.v.año",
+                        "semana": "$semana.v.semana",
+                        "conteo": "$semana.v.conteo",
+                        "dias": {"$map": {
+                            "input": {"$filter": {
+                                "input": {"$objectToArray": {"$ifNull": ["$semana.v.dias", {}]}},
+                                "cond": {"$gt": ["$$this.v", 0]}
+                            }},
+                            "in": "$$this.k"
+                        }}
+                    }},
+                    {"$group": {
+                        "_id": "$clave",
+                        "año": {"$first": "$año"},
+                        "semana": {"$first": "$semana"},
+                        "conteo_registros": {"$sum": "$conteo"},
+                        "dias": {"$push": "$dias"}
+                    }},
+                    {"$project": {
+                        "_id": 0,
+                        "año": 1,
+                        "semana": 1,
+                        "conteo_registros": 1,
+                        "dias": {"$size": {"$reduce": {"input": "$dias", "initialValue": [], "in": {"$setUnion": ["$$value", "$$this"]}}}}
+                    }},
+                    {"$sort": {"año": 1, "semana": 1}}
+                ]
             }}
         ]
-        result = await db.registros.aggregate(pipeline).to_list(None)
-        # La agregación aquí es simple y debería devolver un número, no un ObjectId.
-        volumen = result[0]["volumen_total"] if result else 0.0
-        print(f"DEBUG (Controller): Volumen total para {usuario_id}: {volumen}")
-        return volumen
+        result = await db.progreso_usuario.aggregate(pipeline).to_list(1)
+        facetas = result[0] if result else {}
+
+        nombres = await ejercicio_controller.get_nombres_ejercicios(db)
+        analytics["ultimo_peso"] = _con_nombres(facetas.get("ultimo_peso", []), nombres)
+        analytics["ejercicios"] = [p["ejercicio_nombre"] for p in analytics["ultimo_peso"]]
+        analytics["mejores_marcas"] = _con_nombres(facetas.get("mejores_marcas", []), nombres)
+        analytics["frecuencia_semanal"] = facetas.get("frecuencia_semanal", [])
+        if facetas.get("volumen"):
+            analytics["volumen_total"] = facetas["volumen"][0]["volumen_total"]
+            analytics["conteo_registros"] = facetas["volumen"][0]["conteo_registros"]
+
+        processed_analytics = convert_id_to_str(analytics)
+        logger.debug("Analytics para %s: %s", usuario_id, payload(processed_analytics))
+        return processed_analytics
     except Exception as e:
-        print(f"ERROR (Controller): Error al obtener volumen total para {usuario_id}: {e}")
-        return 0.0
+        logger.error("Error al obtener el análisis de progreso para %s: %s", usuario_id, e)
+        return analytics
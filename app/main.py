@@ -1,18 +1,66 @@
-from fastapi import FastAPI
+import asyncio
+import os
+import time
+from fastapi import FastAPI, Request
+from fastapi.middleware.gzip import GZipMiddleware
 from connection.database import connect_to_mongo, close_mongo_connection # Importa tus funciones de conexión
-from routes import usuarios, registros, logros, ejercicios, chatbot # Tus routers
+from controllers import progreso_controller, rollup_controller, estado_animo_controller, records_controller
+from routes import usuarios, registros, logros, ejercicios, chatbot, admin, stats # Tus routers
+from utils.logger import get_logger
+from utils.http_cache import ETagMiddleware, SSESinCompresionMiddleware
+from utils.invalidacion import CACHE_INVALIDATION, vigilar_coleccion
+
+try: # Dependencia opcional: con brotli-asgi instalado se ofrece Brotli (y gzip como alternativa)
+    from brotli_asgi import BrotliMiddleware
+except ImportError:
+    BrotliMiddleware = None
+
+logger = get_logger("main")
+access_logger = get_logger("access")
 
 app = FastAPI()
 
+# Respuestas más pequeñas que esto (en bytes) no se comprimen
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1000"))
+
+# --- Compresión y GET condicional ---
+# El último middleware añadido es el más externo: la compresión envuelve al ETag, así que el
+# hash se calcula sobre el JSON sin comprimir y una respuesta 304 no llega a comprimirse.
+app.add_middleware(ETagMiddleware)
+if BrotliMiddleware is not None:
+    app.add_middleware(BrotliMiddleware, minimum_size=COMPRESSION_MIN_SIZE, gzip_fallback=True)
+else:
+    app.add_middleware(GZipMiddleware, minimum_size=COMPRESSION_MIN_SIZE)
+# El chat en streaming (SSE) no se comprime: cada evento debe salir en cuanto se genera
+app.add_middleware(SSESinCompresionMiddleware)
+
+# Log de acceso: una línea por petición (nivel INFO, sujeta a LOG_SAMPLE_RATE)
+@app.middleware("http")
+async def log_requests(request: Request, call_next):
+    inicio = time.perf_counter()
+    response = await call_next(request)
+    access_logger.info("%s %s -> %s (%.1f ms)", request.method, request.url.path, response.status_code, (time.perf_counter() - inicio) * 1000)
+    return response
+
 # Eventos de startup/shutdown para manejar la conexión a la DB
 @app.on_event("startup")
 async def startup_db_client():
-    print("Conectando a la base de datos MongoDB...")
-    await connect_to_mongo() # ¡CORREGIDO: Añadido await!
+    logger.info("Conectando a la base de datos MongoDB...")
+    db = await connect_to_mongo() # ¡CORREGIDO: Añadido await!
+    await progreso_controller.asegurar_progreso(db) # Construye 'progreso_usuario' si aún no existe
+    await rollup_controller.asegurar_rollups(db) # Construye 'registros_rollup' si aún no existe
+    await records_controller.asegurar_records(db) # Construye 'records_personales' si aún no existe
+    await estado_animo_controller.asegurar_estado_animo(db) # Puntúa las conversaciones existentes la primera vez
+    if CACHE_INVALIDATION == "changestream":
+        # Vacía la caché del catálogo de este worker ante cualquier cambio en 'ejercicios'
+        app.state.vigilante_ejercicios = asyncio.create_task(vigilar_coleccion(db, "ejercicios", "ejercicios"))
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    print("Cerrando conexión a la base de datos MongoDB...")
+    logger.info("Cerrando conexión a la base de datos MongoDB...")
+    vigilante = getattr(app.state, "vigilante_ejercicios", None)
+    if vigilante is not None:
+        vigilante.cancel()
     await close_mongo_connection() # ¡CORREGIDO: Añadido await si no estaba!
 
 # Incluir los routers
@@ -21,6 +69,8 @@ app.include_router(registros.router, prefix="/registros", tags=["Registros de En
 app.include_router(logros.router, prefix="/logros", tags=["Logros"])
 app.include_router(ejercicios.router, prefix="/ejercicios", tags=["Ejercicios"])
 app.include_router(chatbot.router, prefix="/conversaciones", tags=["Conversaciones y Chatbot"])
+app.include_router(stats.router, prefix="/stats", tags=["Estadísticas"])
+app.include_router(admin.router, prefix="/admin", tags=["Administración"])
 
 # Puedes añadir una ruta raíz de ejemplo si lo deseas
 @app.get("/")
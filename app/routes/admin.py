@@ -0,0 +1,98 @@
+from fastapi import APIRouter, status, Depends, Query
+from connection.indexes import ensure_indexes, explain_query_shapes
+from controllers import progreso_controller, rollup_controller, llm_cache_controller, estado_animo_controller, ejercicio_controller, records_controller
+from typing import List, Dict, Any, Optional
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from connection.database import get_database, get_pool_metrics # Dependencias compartidas de base de datos
+
+
+router = APIRouter()
+
+@router.get("/indexes/collscan", response_model=List[Dict[str, Any]], status_code=status.HTTP_200_OK)
+async def get_collscan_report(db: AsyncIOMotorDatabase = Depends(get_database)):
+    """
+    Informa, a partir de explain(), qué consultas de los controladores se resuelven con un COLLSCAN.
+    """
+    return await explain_query_shapes(db)
+
+
+@router.post("/indexes", response_model=Dict[str, List[str]], status_code=status.HTTP_200_OK)
+async def apply_indexes(db: AsyncIOMotorDatabase = Depends(get_database)):
+    """
+    Vuelve a aplicar el registro de índices (idempotente).
+    """
+    return await ensure_indexes(db)
+
+
+@router.post("/progreso/reconstruir", response_model=Dict[str, int], status_code=status.HTTP_200_OK)
+async def rebuild_progreso(usuario_id: Optional[str] = Query(None), db: AsyncIOMotorDatabase = Depends(get_database)):
+    """
+    Recalcula la colección 'progreso_usuario' desde los registros (de un usuario o de todos).
+    """
+    escritos = await progreso_controller.reconstruir_progreso(db, usuario_id)
+    return {"documentos": escritos}
+
+
+@router.post("/rollups/reconstruir", response_model=Dict[str, int], status_code=status.HTTP_200_OK)
+async def rebuild_rollups(usuario_id: Optional[str] = Query(None), db: AsyncIOMotorDatabase = Depends(get_database)):
+    """
+    Recalcula la colección 'registros_rollup' desde los registros (de un usuario o de todos).
+    """
+    escritos = await rollup_controller.reconstruir_rollups(db, usuario_id)
+    return {"buckets": escritos}
+
+
+@router.post("/records/reconstruir", response_model=Dict[str, int], status_code=status.HTTP_200_OK)
+async def rebuild_records(usuario_id: Optional[str] = Query(None), db: AsyncIOMotorDatabase = Depends(get_database)):
+    """
+    Recalcula la colección 'records_personales' desde los registros (de un usuario o de todos), sin crear logros.
+    """
+    escritos = await records_controller.reconstruir_records(db, usuario_id)
+    return {"documentos": escritos}
+
+
+@router.post("/estado_animo/reconstruir", response_model=Dict[str, int], status_code=status.HTTP_200_OK)
+async def rebuild_estado_animo(
+    usuario_id: Optional[str] = Query(None),
+    recalcular: bool = Query(False, description="Vuelve a puntuar todos los mensajes (p. ej., tras cambiar SENTIMENT_BACKEND)"),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Puntúa los mensajes pendientes y recalcula 'estado_animo_usuario' (de un usuario o de todos).
+    """
+    return await estado_animo_controller.reconstruir_estado_animo(db, usuario_id, recalcular)
+
+
+@router.get("/pool", response_model=Dict[str, Any], status_code=status.HTTP_200_OK)
+async def get_pool_status():
+    """
+    Configuración y utilización del pool de conexiones a MongoDB (conexiones abiertas,
+    en uso, peticiones esperando una conexión y tiempos de espera), por servidor.
+    """
+    return get_pool_metrics()
+
+
+@router.get("/llm_cache", response_model=Dict[str, Any], status_code=status.HTTP_200_OK)
+async def get_llm_cache_status():
+    """
+    Métricas de la caché de respuestas del chatbot en este proceso: consultas, aciertos en
+    memoria y en MongoDB, fallos y tasa de aciertos.
+    """
+    return llm_cache_controller.get_metricas()
+
+
+@router.delete("/llm_cache", response_model=Dict[str, int], status_code=status.HTTP_200_OK)
+async def clear_llm_cache(db: AsyncIOMotorDatabase = Depends(get_database)):
+    """
+    Vacía la caché de respuestas del chatbot (memoria y colección 'llm_cache').
+    """
+    borrados = await llm_cache_controller.vaciar(db)
+    return {"documentos": borrados}
+
+
+@router.get("/cache/ejercicios", response_model=Dict[str, Any], status_code=status.HTTP_200_OK)
+async def get_ejercicios_cache_status():
+    """
+    Tamaño y tasa de aciertos de la caché del catálogo de ejercicios en este proceso.
+    """
+    return ejercicio_controller.get_catalogo_stats()
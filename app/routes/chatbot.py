@@ -1,26 +1,35 @@
-from fastapi import APIRouter, HTTPException, status, Response, Depends
-from controllers import conversacion_controller # Tu controlador corregido
-from schemas.conversacion_schema import ConversacionCreate, ConversacionResponse # Nuevos esquemas
-from typing import List, Dict
+from fastapi import APIRouter, HTTPException, status, Response, Depends, Query
+from fastapi.responses import StreamingResponse
+from controllers import conversacion_controller, chat_controller, busqueda_controller # Tu controlador corregido
+from schemas.conversacion_schema import ConversacionCreate, ConversacionResponse, ConversacionParcialResponse, ChatRequest # Nuevos esquemas
+from typing import Any, List, Dict, Optional, Union
 from motor.motor_asyncio import AsyncIOMotorDatabase
-import os
-from dotenv import load_dotenv
-from connection.database import Database # Importa la clase Database
+from connection.database import get_database, get_analytics_database # Dependencias compartidas de base de datos
+from utils.serialization import BSONJSONResponse
+from utils.helpers import build_projection
 from datetime import datetime # Para tipos de fecha en path params
 
-load_dotenv()
-DB_NAME = os.getenv("DB_NAME")
 
 router = APIRouter()
 
-# Función de dependencia para obtener la instancia de la base de datos
-async def get_database_instance() -> AsyncIOMotorDatabase:
-    if Database.client is None:
-        raise HTTPException(status_code=500, detail="Database client not initialized")
-    return Database.client[DB_NAME]
+# Declarada antes de "/{conversacion_id}" para que "buscar" no se interprete como un ID
+@router.get("/buscar", response_model=Dict[str, Any], status_code=status.HTTP_200_OK, tags=["Chatbot"])
+async def search_conversaciones(
+    q: str = Query(..., min_length=1, description="Texto a buscar en los mensajes"),
+    usuario_id: Optional[str] = Query(None, description="Solo los mensajes de este usuario"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Busca en el texto de los mensajes con el índice de texto de 'conversaciones'.
+    Devuelve {total, limit, offset, resultados}, ordenados por relevancia ('puntuacion').
+    """
+    return BSONJSONResponse(await busqueda_controller.buscar_conversaciones(db, q, usuario_id, limit, offset))
+
 
 @router.get("/{conversacion_id}", response_model=ConversacionResponse, status_code=status.HTTP_200_OK)
-async def get_conversacion(conversacion_id: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def get_conversacion(conversacion_id: str, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Obtiene una conversación por su ID.
     """
@@ -30,19 +39,28 @@ async def get_conversacion(conversacion_id: str, db: AsyncIOMotorDatabase = Depe
     return conversacion
 
 
-@router.get("/", response_model=List[ConversacionResponse], status_code=status.HTTP_200_OK)
-async def get_all_conversaciones(db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+@router.get("/", response_model=List[Union[ConversacionResponse, ConversacionParcialResponse]], status_code=status.HTTP_200_OK)
+async def get_all_conversaciones(
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por comas (p. ej. 'usuario_id,fecha'); '_id' se incluye siempre"),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
     """
     Obtiene todas las conversaciones.
+    Con 'fields' solo se devuelven los campos indicados (p. ej., sin el texto de los mensajes).
     """
-    conversaciones = await conversacion_controller.get_all_conversaciones(db)
+    try:
+        projection = build_projection(fields, ConversacionResponse)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    conversaciones = await conversacion_controller.get_all_conversaciones(db, projection)
     if not conversaciones: # Opcional: lanzar 404 si no hay ninguno. Considera 200 con lista vacía.
         raise HTTPException(status_code=404, detail="No se encontraron conversaciones") # Quitar esta línea si prefieres 200 con lista vacía
-    return conversaciones
+    return BSONJSONResponse(conversaciones, model=ConversacionResponse)
 
 
 @router.post("/", response_model=ConversacionResponse, status_code=status.HTTP_201_CREATED) # Retorna el objeto creado
-async def create_conversacion(conversacion_data: ConversacionCreate, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def create_conversacion(conversacion_data: ConversacionCreate, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Crea una nueva conversación.
     """
@@ -53,7 +71,7 @@ async def create_conversacion(conversacion_data: ConversacionCreate, db: AsyncIO
 
 
 @router.put("/{conversacion_id}", response_model=ConversacionResponse, status_code=status.HTTP_200_OK) # Retorna el objeto actualizado
-async def update_conversacion(conversacion_id: str, conversacion_data: ConversacionCreate, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def update_conversacion(conversacion_id: str, conversacion_data: ConversacionCreate, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Actualiza una conversación existente.
     """
@@ -64,7 +82,7 @@ async def update_conversacion(conversacion_id: str, conversacion_data: Conversac
 
 
 @router.delete("/{conversacion_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_conversacion(conversacion_id: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def delete_conversacion(conversacion_id: str, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Elimina una conversación por su ID.
     """
@@ -75,35 +93,54 @@ async def delete_conversacion(conversacion_id: str, db: AsyncIOMotorDatabase = D
 
 
 # Rutas específicas para el chatbot/conversaciones
+@router.post("/chat", tags=["Chatbot"], response_class=StreamingResponse)
+async def chat(chat_data: ChatRequest, db: AsyncIOMotorDatabase = Depends(get_database)):
+    """
+    Envía un mensaje al asistente y devuelve su respuesta en streaming (Server-Sent Events):
+    eventos 'token' con cada fragmento, 'fin' con los IDs de los mensajes guardados o 'error'.
+    El contexto es el resumen de progreso del usuario (y sus últimos mensajes si la caché de
+    respuestas está desactivada); los dos turnos (usuario y asistente) se guardan en 'conversaciones'.
+    """
+    return StreamingResponse(
+        chat_controller.chat_stream(db, chat_data.usuario_id, chat_data.mensaje, chat_data.tema),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}, # Sin buffering en proxies
+    )
+
+
 @router.get("/ultimos_mensajes/{usuario_id}/{n_mensajes}", response_model=List[ConversacionResponse], tags=["Chatbot"])
-async def get_latest_messages_for_user(usuario_id: str, n_mensajes: int, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def get_latest_messages_for_user(usuario_id: str, n_mensajes: int, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Obtiene los últimos N mensajes de un usuario.
     """
     messages = await conversacion_controller.get_ultimos_mensajes(db, usuario_id, n_mensajes)
     if not messages:
         raise HTTPException(status_code=404, detail=f"No se encontraron mensajes recientes para el usuario {usuario_id}")
-    return messages
+    return BSONJSONResponse(messages, model=ConversacionResponse)
 
 
 @router.get("/por_tema/{usuario_id}/{tema}", response_model=List[ConversacionResponse], tags=["Chatbot"])
-async def get_messages_by_topic_for_user(usuario_id: str, tema: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def get_messages_by_topic_for_user(usuario_id: str, tema: str, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Obtiene mensajes de un usuario filtrados por tema.
     """
     messages = await conversacion_controller.get_mensajes_por_tema(db, usuario_id, tema)
     if not messages:
         raise HTTPException(status_code=404, detail=f"No se encontraron mensajes sobre el tema '{tema}' para el usuario {usuario_id}")
-    return messages
+    return BSONJSONResponse(messages, model=ConversacionResponse)
 
 
-@router.get("/analizar_estado_animo/{usuario_id}", response_model=Dict[str, str], tags=["Chatbot"])
-async def analyze_user_mood(usuario_id: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+@router.get("/analizar_estado_animo/{usuario_id}", response_model=Dict[str, Any], tags=["Chatbot"])
+async def analyze_user_mood(
+    usuario_id: str,
+    dias: Optional[int] = Query(None, ge=1, le=3650, description="Solo los mensajes de los últimos N días"),
+    db: AsyncIOMotorDatabase = Depends(get_analytics_database)
+):
     """
-    Analiza el estado de ánimo de un usuario basado en sus conversaciones.
+    Analiza el estado de ánimo de un usuario basado en sus conversaciones: estado global,
+    puntuación media y número de mensajes positivos, negativos y neutros.
     """
-    mood_analysis = await conversacion_controller.analizar_estado_animo(db, usuario_id)
+    mood_analysis = await conversacion_controller.analizar_estado_animo(db, usuario_id, dias)
     # El controlador ya maneja si no hay conversaciones devolviendo un dict,
     # así que no necesitamos un HTTPException aquí a menos que el controlador falle de otra manera.
-    return mood_analysis
-    
\ No newline at end of file
+    return BSONJSONResponse(mood_analysis)
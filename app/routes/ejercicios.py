@@ -1,25 +1,31 @@
-from fastapi import APIRouter, HTTPException, status, Response, Depends
-from controllers import ejercicio_controller # Tu controlador corregido
+from fastapi import APIRouter, HTTPException, status, Response, Depends, Query
+from controllers import ejercicio_controller, busqueda_controller # Tu controlador corregido
 from schemas.ejercicio_schema import EjercicioCreate, EjercicioResponse # Nuevos esquemas
-from typing import List
+from typing import Any, Dict, List
 from motor.motor_asyncio import AsyncIOMotorDatabase
-import os
-from dotenv import load_dotenv
-from connection.database import Database # Importa la clase Database
+from connection.database import get_database # Dependencias compartidas de base de datos
+from utils.serialization import BSONJSONResponse
 
-load_dotenv()
-DB_NAME = os.getenv("DB_NAME")
 
 router = APIRouter()
 
-# Función de dependencia para obtener la instancia de la base de datos
-async def get_database_instance() -> AsyncIOMotorDatabase:
-    if Database.client is None:
-        raise HTTPException(status_code=500, detail="Database client not initialized")
-    return Database.client[DB_NAME]
+# Declarada antes de "/{ejercicio_id}" para que "buscar" no se interprete como un ID
+@router.get("/buscar", response_model=Dict[str, Any], status_code=status.HTTP_200_OK)
+async def search_ejercicios(
+    q: str = Query(..., min_length=1, description="Texto a buscar en el nombre y la descripción"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Busca ejercicios por nombre y descripción con el índice de texto de 'ejercicios'.
+    Devuelve {total, limit, offset, resultados}, ordenados por relevancia ('puntuacion').
+    """
+    return BSONJSONResponse(await busqueda_controller.buscar_ejercicios(db, q, limit, offset))
+
 
 @router.get("/{ejercicio_id}", response_model=EjercicioResponse, status_code=status.HTTP_200_OK)
-async def get_ejercicio(ejercicio_id: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def get_ejercicio(ejercicio_id: str, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Obtiene un ejercicio por su ID.
     """
@@ -30,18 +36,18 @@ async def get_ejercicio(ejercicio_id: str, db: AsyncIOMotorDatabase = Depends(ge
 
 
 @router.get("/", response_model=List[EjercicioResponse], status_code=status.HTTP_200_OK)
-async def get_all_ejercicios(db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def get_all_ejercicios(db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Obtiene todos los ejercicios.
     """
     ejercicios = await ejercicio_controller.get_all_ejercicios(db)
     if not ejercicios: # Opcional: lanzar 404 si no hay ninguno. Considera 200 con lista vacía.
         raise HTTPException(status_code=404, detail="No se encontraron ejercicios") # Quitar esta línea si prefieres 200 con lista vacía
-    return ejercicios
+    return BSONJSONResponse(ejercicios, model=EjercicioResponse)
 
 
 @router.post("/", response_model=EjercicioResponse, status_code=status.HTTP_201_CREATED) # Retorna el objeto creado
-async def create_ejercicio(ejercicio_data: EjercicioCreate, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def create_ejercicio(ejercicio_data: EjercicioCreate, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Crea un nuevo ejercicio.
     """
@@ -52,7 +58,7 @@ async def create_ejercicio(ejercicio_data: EjercicioCreate, db: AsyncIOMotorData
 
 
 @router.put("/{ejercicio_id}", response_model=EjercicioResponse, status_code=status.HTTP_200_OK) # Retorna el objeto actualizado
-async def update_ejercicio(ejercicio_id: str, ejercicio_data: EjercicioCreate, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def update_ejercicio(ejercicio_id: str, ejercicio_data: EjercicioCreate, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Actualiza un ejercicio existente.
     """
@@ -63,7 +69,7 @@ async def update_ejercicio(ejercicio_id: str, ejercicio_data: EjercicioCreate, d
 
 
 @router.delete("/{ejercicio_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_ejercicio(ejercicio_id: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def delete_ejercicio(ejercicio_id: str, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Elimina un ejercicio por su ID.
     """
@@ -79,22 +85,22 @@ async def delete_ejercicio(ejercicio_id: str, db: AsyncIOMotorDatabase = Depends
 # solo plantillas generales, estas funciones podrían no ser aplicables
 # y los enlaces se manejarían en otras colecciones (e.g., Registros).
 @router.get("/usuario/{usuario_id}", response_model=List[EjercicioResponse], tags=["Ejercicios por Usuario"])
-async def get_ejercicios_by_user(usuario_id: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def get_ejercicios_by_user(usuario_id: str, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Obtiene ejercicios asociados a un usuario específico.
     """
     ejercicios = await ejercicio_controller.get_ejercicios_by_usuario(db, usuario_id)
     if not ejercicios:
         raise HTTPException(status_code=404, detail=f"No se encontraron ejercicios para el usuario {usuario_id}")
-    return ejercicios
+    return BSONJSONResponse(ejercicios, model=EjercicioResponse)
 
 
 @router.get("/conversacion/{conversacion_id}", response_model=List[EjercicioResponse], tags=["Ejercicios por Conversación"])
-async def get_ejercicios_by_conversation(conversacion_id: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def get_ejercicios_by_conversation(conversacion_id: str, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Obtiene ejercicios asociados a una conversación específica.
     """
     ejercicios = await ejercicio_controller.get_ejercicios_by_conversacion(db, conversacion_id)
     if not ejercicios:
         raise HTTPException(status_code=404, detail=f"No se encontraron ejercicios para la conversación {conversacion_id}")
-    return ejercicios
+    return BSONJSONResponse(ejercicios, model=EjercicioResponse)
@@ -1,26 +1,18 @@
-from fastapi import APIRouter, HTTPException, status, Response, Depends
+from fastapi import APIRouter, HTTPException, status, Response, Depends, Query
 from controllers import logro_controller # Tu controlador corregido
-from schemas.logro_schema import LogroCreate, LogroResponse # Nuevos esquemas
-from typing import List
+from schemas.logro_schema import LogroCreate, LogroResponse, LogroParcialResponse # Nuevos esquemas
+from typing import List, Optional, Union
 from motor.motor_asyncio import AsyncIOMotorDatabase
-import os
-from dotenv import load_dotenv
-from connection.database import Database # Importa la clase Database
+from connection.database import get_database # Dependencias compartidas de base de datos
+from utils.serialization import BSONJSONResponse
+from utils.helpers import build_projection
 from datetime import datetime # Para tipos de fecha si se usan en path params
 
-load_dotenv()
-DB_NAME = os.getenv("DB_NAME")
 
 router = APIRouter()
 
-# Función de dependencia para obtener la instancia de la base de datos
-async def get_database_instance() -> AsyncIOMotorDatabase:
-    if Database.client is None:
-        raise HTTPException(status_code=500, detail="Database client not initialized")
-    return Database.client[DB_NAME]
-
 @router.get("/{logro_id}", response_model=LogroResponse, status_code=status.HTTP_200_OK)
-async def get_logro(logro_id: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def get_logro(logro_id: str, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Obtiene un logro por su ID.
     """
@@ -30,19 +22,28 @@ async def get_logro(logro_id: str, db: AsyncIOMotorDatabase = Depends(get_databa
     return logro
 
 
-@router.get("/", response_model=List[LogroResponse], status_code=status.HTTP_200_OK)
-async def get_all_logros(db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+@router.get("/", response_model=List[Union[LogroResponse, LogroParcialResponse]], status_code=status.HTTP_200_OK)
+async def get_all_logros(
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por comas (p. ej. 'descripcion'); '_id' se incluye siempre"),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
     """
     Obtiene todos los logros.
+    Con 'fields' solo se devuelven los campos indicados.
     """
-    logros = await logro_controller.get_all_logros(db)
+    try:
+        projection = build_projection(fields, LogroResponse)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    logros = await logro_controller.get_all_logros(db, projection)
     if not logros: # Opcional: lanzar 404 si no hay ninguno. Considera 200 con lista vacía.
         raise HTTPException(status_code=404, detail="No se encontraron logros") # Quitar esta línea si prefieres 200 con lista vacía
-    return logros
+    return BSONJSONResponse(logros, model=LogroResponse)
 
 
 @router.post("/", response_model=LogroResponse, status_code=status.HTTP_201_CREATED) # Retorna el objeto creado
-async def create_logro(logro_data: LogroCreate, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def create_logro(logro_data: LogroCreate, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Crea un nuevo logro.
     """
@@ -53,7 +54,7 @@ async def create_logro(logro_data: LogroCreate, db: AsyncIOMotorDatabase = Depen
 
 
 @router.put("/{logro_id}", response_model=LogroResponse, status_code=status.HTTP_200_OK) # Retorna el objeto actualizado
-async def update_logro(logro_id: str, logro_data: LogroCreate, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def update_logro(logro_id: str, logro_data: LogroCreate, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Actualiza un logro existente.
     """
@@ -64,7 +65,7 @@ async def update_logro(logro_id: str, logro_data: LogroCreate, db: AsyncIOMotorD
 
 
 @router.delete("/{logro_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_logro(logro_id: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def delete_logro(logro_id: str, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Elimina un logro por su ID.
     """
@@ -75,22 +76,22 @@ async def delete_logro(logro_id: str, db: AsyncIOMotorDatabase = Depends(get_dat
 
 
 @router.get("/usuario/{usuario_id}", response_model=List[LogroResponse], tags=["Logros por Usuario"])
-async def get_logros_for_usuario(usuario_id: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def get_logros_for_usuario(usuario_id: str, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Obtiene todos los logros para un usuario específico.
     """
     logros = await logro_controller.get_logros_by_usuario(db, usuario_id)
     if not logros:
         raise HTTPException(status_code=404, detail=f"No se encontraron logros para el usuario {usuario_id}")
-    return logros
+    return BSONJSONResponse(logros, model=LogroResponse)
 
 
 @router.get("/usuario/{usuario_id}/tipo/{tipo}", response_model=List[LogroResponse], tags=["Logros por Tipo"])
-async def get_logros_by_type_for_usuario(usuario_id: str, tipo: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def get_logros_by_type_for_usuario(usuario_id: str, tipo: str, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Obtiene los logros de un usuario filtrados por tipo.
     """
     logros = await logro_controller.get_logros_tipo(db, usuario_id, tipo)
     if not logros:
         raise HTTPException(status_code=404, detail=f"No se encontraron logros del tipo '{tipo}' para el usuario {usuario_id}")
-    return logros
+    return BSONJSONResponse(logros, model=LogroResponse)
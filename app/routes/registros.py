@@ -1,26 +1,36 @@
-from fastapi import APIRouter, HTTPException, status, Response, Depends
-from controllers import registro_controller # Tu controlador corregido
-from schemas.registro_schema import RegistroCreate, RegistroResponse # Nuevos esquemas
-from typing import List
+from fastapi import APIRouter, HTTPException, status, Response, Depends, Query
+from fastapi.responses import StreamingResponse
+from controllers import registro_controller, busqueda_controller # Tu controlador corregido
+from schemas.registro_schema import RegistroCreate, RegistroResponse, RegistroParcialResponse, RegistroBulkResponse # Nuevos esquemas
+from typing import Any, Dict, List, Optional, Union
+from bson import ObjectId
 from motor.motor_asyncio import AsyncIOMotorDatabase
-import os
-from dotenv import load_dotenv
-from connection.database import Database # Importa la clase Database
+from connection.database import get_database # Dependencias compartidas de base de datos
 from datetime import datetime # Para tipos de fecha en path params
+from utils.serialization import to_ndjson_line, solo_campos, BSONJSONResponse
+from utils.helpers import build_projection
 
-load_dotenv()
-DB_NAME = os.getenv("DB_NAME")
 
 router = APIRouter()
 
-# Función de dependencia para obtener la instancia de la base de datos
-async def get_database_instance() -> AsyncIOMotorDatabase:
-    if Database.client is None:
-        raise HTTPException(status_code=500, detail="Database client not initialized")
-    return Database.client[DB_NAME]
+# Declarada antes de "/{registro_id}" para que "buscar" no se interprete como un ID
+@router.get("/buscar", response_model=Dict[str, Any], status_code=status.HTTP_200_OK)
+async def search_registros(
+    q: str = Query(..., min_length=1, description="Texto a buscar en las notas"),
+    usuario_id: Optional[str] = Query(None, description="Solo los registros de este usuario"),
+    limit: int = Query(20, ge=1, le=100),
+    offset: int = Query(0, ge=0),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
+    """
+    Busca en las notas de los registros. Devuelve {total, limit, offset, resultados},
+    ordenados por relevancia ('puntuacion') o, con REGISTROS_STORAGE=timeseries, por fecha.
+    """
+    return BSONJSONResponse(await busqueda_controller.buscar_registros(db, q, usuario_id, limit, offset))
+
 
 @router.get("/{registro_id}", response_model=RegistroResponse, status_code=status.HTTP_200_OK)
-async def get_registro(registro_id: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def get_registro(registro_id: str, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Obtiene un registro por su ID.
     """
@@ -30,19 +40,68 @@ async def get_registro(registro_id: str, db: AsyncIOMotorDatabase = Depends(get_
     return registro
 
 
-@router.get("/", response_model=List[RegistroResponse], status_code=status.HTTP_200_OK)
-async def get_all_registros(db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+STREAM_BATCH_SIZE = 500
+
+@router.get("/", response_model=List[Union[RegistroResponse, RegistroParcialResponse]], status_code=status.HTTP_200_OK)
+async def get_all_registros(
+    after: Optional[str] = Query(None, description="Cursor: _id del último registro de la página anterior"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Tamaño de página"),
+    stream: bool = Query(False, description="Devuelve todos los registros como NDJSON en streaming"),
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por comas (p. ej. 'ejercicio_nombre,fecha_registro'); '_id' se incluye siempre"),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
     """
     Obtiene todos los registros.
+    - Con 'limit' y/o 'after' se usa paginación por cursor; el cursor de la siguiente
+      página se devuelve en la cabecera 'X-Next-Cursor'.
+    - Con 'stream=true' se devuelven todos los registros en formato NDJSON, leyendo
+      el cursor de MongoDB por lotes (memoria constante).
+    - Con 'fields' solo se leen y devuelven los campos indicados.
     """
-    registros = await registro_controller.get_all_registros(db)
+    if after is not None and not ObjectId.is_valid(after):
+        raise HTTPException(status_code=400, detail="Cursor 'after' inválido.")
+
+    try:
+        projection = build_projection(fields, RegistroResponse)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    if stream:
+        async def generar_ndjson():
+            lineas = []
+            async for registro in registro_controller.stream_registros(db, STREAM_BATCH_SIZE, projection):
+                lineas.append(to_ndjson_line(solo_campos(registro, RegistroResponse)))
+                if len(lineas) >= STREAM_BATCH_SIZE:
+                    yield "".join(lineas)
+                    lineas = []
+            if lineas:
+                yield "".join(lineas)
+
+        return StreamingResponse(generar_ndjson(), media_type="application/x-ndjson")
+
+    if after is not None or limit is not None:
+        registros, next_cursor = await registro_controller.get_registros_paginados(db, after, limit or 100, projection)
+        headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+        return BSONJSONResponse(registros, model=RegistroResponse, headers=headers)
+
+    registros = await registro_controller.get_all_registros(db, projection)
     if not registros: # Opcional: lanzar 404 si no hay ninguno. Considera 200 con lista vacía.
             raise HTTPException(status_code=404, detail="No se encontraron registros") # Quitar esta línea si prefieres 200 con lista vacía
-    return registros
+    return BSONJSONResponse(registros, model=RegistroResponse)
+
+
+@router.get("/ultimos/{n}", response_model=List[RegistroResponse], status_code=status.HTTP_200_OK)
+async def get_ultimos_registros(n: int, db: AsyncIOMotorDatabase = Depends(get_database)):
+    """
+    Obtiene los n registros más recientes.
+    """
+    if n < 1 or n > 100:
+        raise HTTPException(status_code=400, detail="n debe estar entre 1 y 100.")
+    return BSONJSONResponse(await registro_controller.get_ultimos_registros(db, n), model=RegistroResponse)
 
 
 @router.post("/", response_model=RegistroResponse, status_code=status.HTTP_201_CREATED) # Retorna el objeto creado
-async def create_registro(registro_data: RegistroCreate, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def create_registro(registro_data: RegistroCreate, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Crea un nuevo registro.
     """
@@ -52,8 +111,28 @@ async def create_registro(registro_data: RegistroCreate, db: AsyncIOMotorDatabas
     return created_registro
 
 
+BULK_MAX_REGISTROS = 1000
+
+@router.post("/bulk", response_model=RegistroBulkResponse, status_code=status.HTTP_200_OK)
+async def create_registros_bulk(registros_data: List[RegistroCreate], db: AsyncIOMotorDatabase = Depends(get_database)):
+    """
+    Crea varios registros de una vez (p. ej., una sesión completa sincronizada desde un terminal).
+    Devuelve el resultado de cada elemento; los que fallen no impiden insertar el resto.
+    """
+    if not registros_data:
+        raise HTTPException(status_code=400, detail="La lista de registros está vacía.")
+    if len(registros_data) > BULK_MAX_REGISTROS:
+        raise HTTPException(status_code=400, detail=f"Se admiten como máximo {BULK_MAX_REGISTROS} registros por petición.")
+
+    resultados = await registro_controller.create_registros_bulk(db, [r.model_dump() for r in registros_data])
+    if resultados is None:
+        raise HTTPException(status_code=500, detail="Error al crear los registros; no se sabe cuáles se han guardado.")
+    insertados = sum(1 for r in resultados if r["ok"])
+    return {"insertados": insertados, "errores": len(resultados) - insertados, "resultados": resultados}
+
+
 @router.put("/{registro_id}", response_model=RegistroResponse, status_code=status.HTTP_200_OK) # Retorna el objeto actualizado
-async def update_registro(registro_id: str, registro_data: RegistroCreate, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def update_registro(registro_id: str, registro_data: RegistroCreate, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Actualiza un registro existente.
     """
@@ -64,7 +143,7 @@ async def update_registro(registro_id: str, registro_data: RegistroCreate, db: A
 
 
 @router.delete("/{registro_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_registro(registro_id: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def delete_registro(registro_id: str, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Elimina un registro por su ID.
     """
@@ -74,27 +153,54 @@ async def delete_registro(registro_id: str, db: AsyncIOMotorDatabase = Depends(g
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
-@router.get("/usuario/{usuario_id}", response_model=List[RegistroResponse], status_code=status.HTTP_200_OK) # Nueva ruta, importante para Streamlit
-async def get_registros_for_usuario(usuario_id: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+@router.get("/usuario/{usuario_id}", response_model=List[Union[RegistroResponse, RegistroParcialResponse]], status_code=status.HTTP_200_OK) # Nueva ruta, importante para Streamlit
+async def get_registros_for_usuario(
+    usuario_id: str,
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por comas (p. ej. 'ejercicio_nombre'); '_id' se incluye siempre"),
+    desde: Optional[datetime] = Query(None, description="Fecha mínima (ISO 8601)"),
+    hasta: Optional[datetime] = Query(None, description="Fecha máxima (ISO 8601)"),
+    ejercicio: Optional[str] = Query(None, description="Nombre del ejercicio"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Tamaño de página"),
+    offset: int = Query(0, ge=0, description="Registros que se saltan (paginación)"),
+    db: AsyncIOMotorDatabase = Depends(get_database)
+):
     """
-    Obtiene todos los registros para un usuario específico.
+    Obtiene los registros de un usuario específico, del más reciente al más antiguo.
+    - 'desde', 'hasta' y 'ejercicio' filtran en el servidor.
+    - 'limit' y 'offset' paginan el resultado.
+    - Con 'fields' solo se devuelven los campos indicados.
     """
-    registros = await registro_controller.get_registros_by_usuario(db, usuario_id)
-    if not registros:
+    try:
+        projection = build_projection(fields, RegistroResponse)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    registros = await registro_controller.get_registros_by_usuario(db, usuario_id, projection, desde, hasta, ejercicio, limit, offset)
+    filtrado = any(v is not None for v in (desde, hasta, ejercicio, limit)) or offset > 0
+    if not registros and not filtrado:
         # Puedes devolver un 200 con lista vacía o un 404 si es un recurso que siempre debe existir
         raise HTTPException(status_code=404, detail=f"No se encontraron registros para el usuario {usuario_id}")
-    return registros
+    # Con filtros o paginación, una página vacía es una respuesta válida
+    return BSONJSONResponse(registros, model=RegistroResponse)
+
+
+@router.get("/usuario/{usuario_id}/ejercicios", response_model=List[str], status_code=status.HTTP_200_OK)
+async def get_ejercicios_for_usuario(usuario_id: str, db: AsyncIOMotorDatabase = Depends(get_database)):
+    """
+    Obtiene los nombres de ejercicio distintos registrados por un usuario.
+    """
+    return await registro_controller.get_ejercicios_distintos(db, usuario_id)
 
 
 @router.get("/historial/{usuario_id}/{ejercicio_nombre}", response_model=List[RegistroResponse], tags=["Historial"])
-async def get_historial_for_ejercicio(usuario_id: str, ejercicio_nombre: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)):
+async def get_historial_for_ejercicio(usuario_id: str, ejercicio_nombre: str, db: AsyncIOMotorDatabase = Depends(get_database)):
     """
     Obtiene el historial de registros para un ejercicio específico de un usuario.
     """
     historial = await registro_controller.get_historial_por_ejercicio(db, usuario_id, ejercicio_nombre)
     if not historial:
         raise HTTPException(status_code=404, detail=f"No se encontraron registros para el ejercicio '{ejercicio_nombre}' del usuario {usuario_id}")
-    return historial
+    return BSONJSONResponse(historial, model=RegistroResponse)
 
 
 @router.get("/fecha/{usuario_id}/{fecha_inicio}/{fecha_fin}", response_model=List[RegistroResponse], tags=["Historial"])
@@ -102,7 +208,7 @@ async def get_registros_by_date_range(
     usuario_id: str, 
     fecha_inicio: str, # Recibir como string, convertir a datetime en controller
     fecha_fin: str,    # Recibir como string, convertir a datetime en controller
-    db: AsyncIOMotorDatabase = Depends(get_database_instance)
+    db: AsyncIOMotorDatabase = Depends(get_database)
 ):
     """
     Obtiene los registros de un usuario dentro de un rango de fechas.
@@ -118,4 +224,4 @@ async def get_registros_by_date_range(
     registros = await registro_controller.get_registros_por_fecha(db, usuario_id, fecha_inicio_dt, fecha_fin_dt)
     if not registros:
         raise HTTPException(status_code=404, detail="No se encontraron registros en el rango de fechas especificado")
-    return registros
+    return BSONJSONResponse(registros, model=RegistroResponse)
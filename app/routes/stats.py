@@ -0,0 +1,15 @@
+from fastapi import APIRouter, status, Depends, Query
+from controllers import stats_controller
+from typing import Optional, Dict, Any
+from motor.motor_asyncio import AsyncIOMotorDatabase
+from connection.database import get_analytics_database # Dependencias compartidas de base de datos
+
+
+router = APIRouter()
+
+@router.get("/", response_model=Dict[str, Any], status_code=status.HTTP_200_OK)
+async def get_stats(usuario_id: Optional[str] = Query(None, description="Filtra los conteos por usuario"), db: AsyncIOMotorDatabase = Depends(get_analytics_database)):
+    """
+    Obtiene el número de documentos de cada colección, opcionalmente de un usuario.
+    """
+    return await stats_controller.get_stats(db, usuario_id)
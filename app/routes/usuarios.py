@@ -1,25 +1,27 @@
-from fastapi import APIRouter, HTTPException, status, Response, Depends
-from controllers import usuario_controller
-from schemas.usuario_schema import UsuarioCreate, UsuarioResponse
-from typing import List
+from fastapi import APIRouter, HTTPException, status, Response, Depends, Query
+from controllers import usuario_controller, rollup_controller, records_controller
+from schemas.usuario_schema import UsuarioCreate, UsuarioResponse, UsuarioParcialResponse, VolumenUsuarioResponse
+from typing import List, Optional, Union, Literal
+from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorDatabase
-import os
-from dotenv import load_dotenv
-from connection.database import Database # Importa la clase Database
+from connection.database import get_database, get_analytics_database # Dependencias compartidas de base de datos
+from utils.serialization import BSONJSONResponse
+from utils.helpers import build_projection
 
-load_dotenv()
-DB_NAME = os.getenv("DB_NAME")
 
 router = APIRouter()
 
-# Función de dependencia para obtener la instancia de la base de datos
-async def get_database_instance() -> AsyncIOMotorDatabase:
-    if Database.client is None:
-        raise HTTPException(status_code=500, detail="Database client not initialized")
-    return Database.client[DB_NAME]
+@router.get("/progreso/volumen_total", response_model=List[VolumenUsuarioResponse], tags=["Progreso"])
+async def obtener_volumen_total_usuarios(ids: Optional[List[str]] = Query(None, description="IDs de usuario; si se omite, todos"), db: AsyncIOMotorDatabase = Depends(get_analytics_database)):
+    """
+    Obtiene el volumen total de levantamiento de todos los usuarios (o de los indicados) en una sola consulta.
+    Los usuarios sin registros aparecen con volumen 0.
+    """
+    return await usuario_controller.get_volumen_total_usuarios(db, ids)
+
 
 @router.get("/{usuario_id}", response_model=UsuarioResponse, status_code=status.HTTP_200_OK)
-async def get_usuario(usuario_id: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)): # Inyección de dependencia
+async def get_usuario(usuario_id: str, db: AsyncIOMotorDatabase = Depends(get_database)): # Inyección de dependencia
     """
     Obtiene un usuario por su ID.
     """
@@ -29,17 +31,26 @@ async def get_usuario(usuario_id: str, db: AsyncIOMotorDatabase = Depends(get_da
     return user
 
 
-@router.get("/", response_model=List[UsuarioResponse], status_code=status.HTTP_200_OK)
-async def get_all_usuarios(db: AsyncIOMotorDatabase = Depends(get_database_instance)): # Inyección de dependencia
+@router.get("/", response_model=List[Union[UsuarioResponse, UsuarioParcialResponse]], status_code=status.HTTP_200_OK)
+async def get_all_usuarios(
+    fields: Optional[str] = Query(None, description="Campos a devolver separados por comas (p. ej. 'nombre'); '_id' se incluye siempre"),
+    db: AsyncIOMotorDatabase = Depends(get_database) # Inyección de dependencia
+):
     """
     Obtiene todos los usuarios.
+    Con 'fields' solo se devuelven los campos indicados (p. ej., para los desplegables).
     """
-    users = await usuario_controller.get_all_usuarios(db) # ¡IMPORTANTE: Aquí se pasa 'db'!
-    return users
+    try:
+        projection = build_projection(fields, UsuarioResponse)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    users = await usuario_controller.get_all_usuarios(db, projection) # ¡IMPORTANTE: Aquí se pasa 'db'!
+    return BSONJSONResponse(users, model=UsuarioResponse)
 
 
 @router.post("/", response_model=UsuarioResponse, status_code=status.HTTP_201_CREATED)
-async def create_usuario(usuario_data: UsuarioCreate, db: AsyncIOMotorDatabase = Depends(get_database_instance)): # Inyección de dependencia
+async def create_usuario(usuario_data: UsuarioCreate, db: AsyncIOMotorDatabase = Depends(get_database)): # Inyección de dependencia
     """
     Crea un nuevo usuario.
     """
@@ -50,7 +61,7 @@ async def create_usuario(usuario_data: UsuarioCreate, db: AsyncIOMotorDatabase =
 
 
 @router.put("/{usuario_id}", response_model=UsuarioResponse, status_code=status.HTTP_200_OK)
-async def update_usuario(usuario_id: str, usuario_data: UsuarioCreate, db: AsyncIOMotorDatabase = Depends(get_database_instance)): # Inyección de dependencia
+async def update_usuario(usuario_id: str, usuario_data: UsuarioCreate, db: AsyncIOMotorDatabase = Depends(get_database)): # Inyección de dependencia
     """
     Actualiza un usuario existente.
     """
@@ -61,7 +72,7 @@ async def update_usuario(usuario_id: str, usuario_data: UsuarioCreate, db: Async
 
 
 @router.delete("/{usuario_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_usuario(usuario_id: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)): # Inyección de dependencia
+async def delete_usuario(usuario_id: str, db: AsyncIOMotorDatabase = Depends(get_database)): # Inyección de dependencia
     """
     Elimina un usuario por su ID.
     """
@@ -72,7 +83,7 @@ async def delete_usuario(usuario_id: str, db: AsyncIOMotorDatabase = Depends(get
 
 
 @router.get("/{usuario_id}/progreso", tags=["Progreso"])
-async def obtener_ultimo_peso_por_ejercicio(usuario_id: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)): # Inyección de dependencia
+async def obtener_ultimo_peso_por_ejercicio(usuario_id: str, db: AsyncIOMotorDatabase = Depends(get_analytics_database)): # Inyección de dependencia
     """
     Obtiene el último peso registrado por ejercicio para un usuario.
     """
@@ -80,7 +91,7 @@ async def obtener_ultimo_peso_por_ejercicio(usuario_id: str, db: AsyncIOMotorDat
 
 
 @router.get("/{usuario_id}/progreso/{ejercicio_nombre}/mejor_marca", tags=["Progreso"])
-async def obtener_mejor_marca(usuario_id: str, ejercicio_nombre: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)): # Inyección de dependencia
+async def obtener_mejor_marca(usuario_id: str, ejercicio_nombre: str, db: AsyncIOMotorDatabase = Depends(get_analytics_database)): # Inyección de dependencia
     """
     Obtiene la mejor marca de un ejercicio específico para un usuario.
     """
@@ -88,7 +99,7 @@ async def obtener_mejor_marca(usuario_id: str, ejercicio_nombre: str, db: AsyncI
 
 
 @router.get("/{usuario_id}/progreso/frecuencia_semanal", tags=["Progreso"])
-async def obtener_frecuencia_semanal(usuario_id: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)): # Inyección de dependencia
+async def obtener_frecuencia_semanal(usuario_id: str, db: AsyncIOMotorDatabase = Depends(get_analytics_database)): # Inyección de dependencia
     """
     Obtiene la frecuencia semanal de registros de un usuario.
     """
@@ -96,9 +107,44 @@ async def obtener_frecuencia_semanal(usuario_id: str, db: AsyncIOMotorDatabase =
 
 
 @router.get("/{usuario_id}/progreso/volumen_total", tags=["Progreso"])
-async def obtener_volumen_total(usuario_id: str, db: AsyncIOMotorDatabase = Depends(get_database_instance)): # Inyección de dependencia
+async def obtener_volumen_total(usuario_id: str, db: AsyncIOMotorDatabase = Depends(get_analytics_database)): # Inyección de dependencia
     """
     Obtiene el volumen total de levantamiento de un usuario.
     """
     return await usuario_controller.get_volumen_total(db, usuario_id)
 
+
+
+@router.get("/{usuario_id}/analytics", tags=["Progreso"])
+async def obtener_analytics(usuario_id: str, db: AsyncIOMotorDatabase = Depends(get_analytics_database)):
+    """
+    Obtiene en una sola consulta todo el análisis de progreso de un usuario: último peso y
+    mejor marca por ejercicio, lista de ejercicios, frecuencia semanal y volumen total.
+    """
+    return await usuario_controller.get_analytics_usuario(db, usuario_id)
+
+
+@router.get("/{usuario_id}/records", tags=["Progreso"])
+async def obtener_records(usuario_id: str, db: AsyncIOMotorDatabase = Depends(get_analytics_database)):
+    """
+    Récords personales de un usuario por ejercicio (peso, repeticiones, volumen y 1RM estimado),
+    leídos del documento de máximos que se actualiza con cada registro.
+    """
+    return await records_controller.get_records_usuario(db, usuario_id)
+
+
+@router.get("/{usuario_id}/rollups", tags=["Progreso"])
+async def obtener_rollups(
+    usuario_id: str,
+    granularidad: Literal["dia", "semana", "mes"] = Query("semana", description="Tamaño del periodo"),
+    desde: Optional[datetime] = Query(None, description="Inicio del rango (ISO 8601)"),
+    hasta: Optional[datetime] = Query(None, description="Fin del rango (ISO 8601)"),
+    ejercicio: Optional[str] = Query(None, description="Limita la serie a un ejercicio"),
+    db: AsyncIOMotorDatabase = Depends(get_analytics_database)
+):
+    """
+    Serie temporal de un usuario (series, repeticiones, volumen, peso máximo y días entrenados
+    por periodo), leída de los buckets precalculados en lugar de los registros.
+    """
+    rollups = await rollup_controller.get_rollups(db, usuario_id, granularidad, desde, hasta, ejercicio)
+    return BSONJSONResponse(rollups)
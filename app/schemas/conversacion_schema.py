@@ -60,6 +60,7 @@ class ConversacionResponse(BaseModel):
     rol: str
     mensaje: str
     tema: Optional[str] = None
+    sentimiento: Optional[float] = None # Puntuación de -1 a 1 calculada al crear el mensaje
 
     class Config:
         arbitrary_types_allowed = True
@@ -75,3 +76,42 @@ class ConversacionResponse(BaseModel):
                 "tema": "entrenamiento"
             }
         }
+
+# --- MODELO DE SALIDA PARCIAL (listados con ?fields=...) ---
+# Solo '_id' está siempre presente; el resto de campos aparece si se pidió en 'fields'.
+class ConversacionParcialResponse(BaseModel):
+    id: PyObjectId = Field(alias="_id")
+    usuario_id: Optional[str] = None
+    fecha: Optional[datetime] = None
+    rol: Optional[str] = None
+    mensaje: Optional[str] = None
+    tema: Optional[str] = None
+    sentimiento: Optional[float] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+        populate_by_name = True
+        json_schema_extra = {
+            "example": {
+                "id": "60c72b2f9f1b2c3d4e5f6a80",
+                "usuario_id": "60c72b2f9f1b2c3d4e5f6a7b",
+                "fecha": "2023-11-05T09:00:00Z"
+            }
+        }
+
+# --- MODELO DE ENTRADA DEL CHAT (POST /conversaciones/chat) ---
+# La fecha y el rol los pone el servidor al guardar los dos turnos.
+class ChatRequest(BaseModel):
+    usuario_id: str
+    mensaje: str = Field(min_length=1)
+    tema: Optional[str] = "general"
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "usuario_id": "60c72b2f9f1b2c3d4e5f6a7b",
+                "mensaje": "¿Cuántas series de sentadilla debería hacer esta semana?",
+                "tema": "entrenamiento"
+            }
+        }
@@ -79,3 +79,25 @@ class LogroResponse(BaseModel):
                 "tipo": "Peso"
             }
         }
+
+# --- MODELO DE SALIDA PARCIAL (listados con ?fields=...) ---
+# Solo '_id' está siempre presente; el resto de campos aparece si se pidió en 'fields'.
+class LogroParcialResponse(BaseModel):
+    id: PyObjectId = Field(alias="_id")
+    usuario_id: Optional[str] = None
+    ejercicio_id: Optional[str] = None
+    descripcion: Optional[str] = None
+    valor: Optional[str] = None
+    fecha_logro: Optional[datetime] = None
+    tipo: Optional[str] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+        populate_by_name = True
+        json_schema_extra = {
+            "example": {
+                "id": "60c72b2f9f1b2c3d4e5f6a7e",
+                "descripcion": "Levantar 100kg en press de banca"
+            }
+        }
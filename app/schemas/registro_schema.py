@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, Any
+from typing import Optional, Any, List
 from datetime import datetime
 from bson import ObjectId # Importante: Necesario para manejar ObjectId de MongoDB
 from pydantic_core import CoreSchema
@@ -83,3 +83,49 @@ class RegistroResponse(BaseModel):
                 "notas": "Bien, pero pesado"
             }
         }
+
+# --- MODELOS PARA LA CARGA EN BLOQUE (POST /registros/bulk) ---
+class RegistroBulkResultado(BaseModel):
+    indice: int # Posición del registro en la lista enviada
+    ok: bool
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+class RegistroBulkResponse(BaseModel):
+    insertados: int
+    errores: int
+    resultados: List[RegistroBulkResultado]
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "insertados": 1,
+                "errores": 0,
+                "resultados": [
+                    {"indice": 0, "ok": True, "id": "60c72b2f9f1b2c3d4e5f6a7d", "error": None}
+                ]
+            }
+        }
+
+# --- MODELO DE SALIDA PARCIAL (listados con ?fields=...) ---
+# Solo '_id' está siempre presente; el resto de campos aparece si se pidió en 'fields'.
+class RegistroParcialResponse(BaseModel):
+    id: PyObjectId = Field(alias="_id")
+    usuario_id: Optional[str] = None
+    ejercicio_id: Optional[str] = None
+    ejercicio_nombre: Optional[str] = None
+    peso_levantado: Optional[float] = None
+    repeticiones: Optional[int] = None
+    fecha_registro: Optional[datetime] = None
+    notas: Optional[str] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+        populate_by_name = True
+        json_schema_extra = {
+            "example": {
+                "id": "60c72b2f9f1b2c3d4e5f6a7d",
+                "ejercicio_nombre": "Press de Banca"
+            }
+        }
@@ -70,3 +70,40 @@ class UsuarioResponse(BaseModel): # Renombremos tu UsuariosSchema a UsuarioRespo
             }
         }
 
+
+# --- MODELO DE SALIDA PARCIAL (listados con ?fields=...) ---
+# Solo '_id' está siempre presente; el resto de campos aparece si se pidió en 'fields'.
+class UsuarioParcialResponse(BaseModel):
+    id: PyObjectId = Field(alias="_id")
+    nombre: Optional[str] = None
+    email: Optional[str] = None
+    objetivo: Optional[str] = None
+    fecha_creacion: Optional[datetime] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+        json_encoders = {ObjectId: str}
+        populate_by_name = True
+        json_schema_extra = {
+            "example": {
+                "id": "60c72b2f9f1b2c3d4e5f6a7b",
+                "nombre": "Jane Doe"
+            }
+        }
+
+
+# --- MODELO DE SALIDA DEL VOLUMEN POR USUARIO (GET /usuarios/progreso/volumen_total) ---
+# Un elemento por usuario; los que no tienen registros aparecen con volumen 0.
+class VolumenUsuarioResponse(BaseModel):
+    usuario_id: str
+    nombre: Optional[str] = None
+    volumen_total: float = 0.0
+
+    class Config:
+        json_schema_extra = {
+            "example": {
+                "usuario_id": "60c72b2f9f1b2c3d4e5f6a7b",
+                "nombre": "Jane Doe",
+                "volumen_total": 12450.0
+            }
+        }
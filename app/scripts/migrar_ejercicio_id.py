@@ -0,0 +1,111 @@
+"""
+Normaliza las referencias a ejercicios de los registros: cada registro pasa a apuntar a un
+ejercicio del catálogo con 'ejercicio_id' (ObjectId) y 'ejercicio_nombre' queda como copia del
+nombre del catálogo. Después se reconstruyen 'progreso_usuario', 'registros_rollup' y
+'records_personales', que se agrupan por 'ejercicio_id'.
+
+Pasos:
+    1. Rellena 'nombre_normalizado' en el catálogo (si dos ejercicios comparten nombre, solo
+       el más antiguo lo recibe y es el que se usa al resolver por nombre).
+    2. Convierte a ObjectId los 'ejercicio_id' guardados como texto que existen en el catálogo.
+    3. Resuelve por nombre el resto de registros, dando de alta en el catálogo los ejercicios
+       que no existan.
+    4. Vacía los resúmenes, elimina los índices obsoletos, crea los nuevos y reconstruye.
+
+Es idempotente: se puede volver a ejecutar sin efectos. En modo de series temporales, los
+update_many sobre campos que no son 'metaField' requieren MongoDB 7.0 o posterior; con
+versiones anteriores, ejecútalo antes de scripts/migrar_registros_timeseries.py.
+
+Uso (desde la carpeta app/):
+    python -m scripts.migrar_ejercicio_id [--batch-size N]
+"""
+import argparse
+import asyncio
+import os
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from connection.indexes import ensure_indexes
+from connection.registros_storage import get_registros_collection
+from controllers import ejercicio_controller, progreso_controller, rollup_controller, records_controller
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI")
+DB_NAME = os.getenv("DB_NAME")
+
+
+async def normalizar_catalogo(db) -> int:
+    vistos = set(await db.ejercicios.distinct("nombre_normalizado", {"nombre_normalizado": {"$type": "string"}}))
+    actualizados = 0
+    async for ejercicio in db.ejercicios.find({"nombre_normalizado": {"$exists": False}}, {"nombre": 1}).sort("_id", 1):
+        normalizado = ejercicio_controller.normalizar_nombre(ejercicio.get("nombre"))
+        if not normalizado or normalizado in vistos:
+            continue
+        await db.ejercicios.update_one({"_id": ejercicio["_id"]}, {"$set": {"nombre_normalizado": normalizado}})
+        vistos.add(normalizado)
+        actualizados += 1
+    ejercicio_controller._vaciar_catalogo()
+    return actualizados
+
+
+async def convertir_ids_texto(db) -> int:
+    registros = get_registros_collection(db)
+    nombres = await ejercicio_controller.get_nombres_ejercicios(db)
+    convertidos = 0
+    for valor in await registros.distinct("ejercicio_id", {"ejercicio_id": {"$type": "string"}}):
+        if not ObjectId.is_valid(valor) or ObjectId(valor) not in nombres:
+            continue # Se resolverá por nombre en el paso siguiente
+        oid = ObjectId(valor)
+        result = await registros.update_many({"ejercicio_id": valor}, {"$set": {"ejercicio_id": oid, "ejercicio_nombre": nombres[oid]}})
+        convertidos += result.modified_count
+    return convertidos
+
+
+async def resolver_por_nombre(db) -> int:
+    registros = get_registros_collection(db)
+    pendientes = {"ejercicio_id": {"$not": {"$type": "objectId"}}}
+    resueltos = 0
+    for nombre in await registros.distinct("ejercicio_nombre", pendientes):
+        ejercicio = await ejercicio_controller.resolver_ejercicio(db, None, nombre)
+        if ejercicio is None:
+            continue
+        result = await registros.update_many(
+            {**pendientes, "ejercicio_nombre": nombre},
+            {"$set": {"ejercicio_id": ejercicio["_id"], "ejercicio_nombre": ejercicio["nombre"]}}
+        )
+        resueltos += result.modified_count
+    sin_resolver = await registros.count_documents(pendientes)
+    if sin_resolver:
+        print(f"Aviso: {sin_resolver} registros sin nombre de ejercicio no se han podido resolver")
+    return resueltos
+
+
+async def main(batch_size: int) -> None:
+    client = AsyncIOMotorClient(MONGO_URI)
+    try:
+        db = client[DB_NAME]
+        print(f"ejercicios: {await normalizar_catalogo(db)} nombres normalizados")
+        print(f"registros: {await convertir_ids_texto(db)} ejercicio_id convertidos a ObjectId")
+        print(f"registros: {await resolver_por_nombre(db)} resueltos por nombre")
+
+        # Los resúmenes antiguos no tienen 'ejercicio_id' y chocarían con los nuevos índices únicos
+        await db.progreso_usuario.delete_many({})
+        await db.registros_rollup.delete_many({})
+        await ensure_indexes(db)
+        documentos = await progreso_controller.reconstruir_progreso(db, None, batch_size)
+        print(f"progreso_usuario: {documentos} documentos escritos")
+        buckets = await rollup_controller.reconstruir_rollups(db, None, batch_size)
+        print(f"registros_rollup: {buckets} buckets escritos")
+        print(f"records_personales: {await records_controller.reconstruir_records(db)} documentos escritos")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Normalización de 'ejercicio_id' en los registros")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size))
@@ -0,0 +1,90 @@
+"""
+Copia la colección 'registros' a la colección de series temporales (REGISTROS_TS_COLLECTION)
+por lotes, leyendo el origen con un cursor ordenado por _id: la memoria usada no depende del
+tamaño de la colección y la copia se puede reanudar con --desde-id.
+
+La copia conserva los _id, así que las referencias existentes siguen siendo válidas. Cuando
+termine, arranca la API con REGISTROS_STORAGE=timeseries.
+
+Uso (desde la carpeta app/):
+    python -m scripts.migrar_registros_timeseries [--batch-size 1000] [--desde-id ID]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from bson import ObjectId
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.errors import BulkWriteError
+
+from connection.registros_storage import REGISTROS_COLLECTION, REGISTROS_TS_COLLECTION, crear_coleccion_timeseries
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI")
+DB_NAME = os.getenv("DB_NAME")
+
+
+async def migrar(db, batch_size: int, desde_id) -> int:
+    origen = db[REGISTROS_COLLECTION]
+    destino = db[REGISTROS_TS_COLLECTION]
+
+    filtro = {"_id": {"$gt": desde_id}} if desde_id is not None else {}
+    cursor = origen.find(filtro).sort("_id", 1).batch_size(batch_size)
+
+    copiados = 0
+    lote = []
+    inicio = time.perf_counter()
+
+    async def volcar():
+        nonlocal copiados, lote
+        try:
+            await destino.insert_many(lote, ordered=False)
+            copiados += len(lote)
+        except BulkWriteError as e:
+            errores = e.details.get("writeErrors", [])
+            copiados += len(lote) - len(errores)
+            for error in errores[:5]:
+                print(f"  Error en {lote[error['index']].get('_id')}: {error.get('errmsg')}")
+        # El último _id del lote permite reanudar la copia si se interrumpe
+        print(f"  {copiados} registros copiados (último _id: {lote[-1]['_id']}, {time.perf_counter() - inicio:.1f} s)")
+        lote = []
+
+    async for registro in cursor:
+        if registro.get("fecha_registro") is None:
+            # timeField es obligatorio en una colección de series temporales
+            print(f"  Registro {registro['_id']} sin fecha_registro: se omite")
+            continue
+        lote.append(registro)
+        if len(lote) >= batch_size:
+            await volcar()
+    if lote:
+        await volcar()
+    return copiados
+
+
+async def main(batch_size: int, desde_id) -> None:
+    client = AsyncIOMotorClient(MONGO_URI)
+    try:
+        db = client[DB_NAME]
+        if await crear_coleccion_timeseries(db):
+            print(f"Colección '{REGISTROS_TS_COLLECTION}' creada")
+        copiados = await migrar(db, batch_size, desde_id)
+
+        total_origen = await db[REGISTROS_COLLECTION].count_documents({})
+        total_destino = await db[REGISTROS_TS_COLLECTION].count_documents({})
+        print(f"Copiados {copiados} registros. Origen: {total_origen}, destino: {total_destino}")
+        if total_origen != total_destino:
+            print("Los totales no coinciden: revisa los errores anteriores antes de cambiar REGISTROS_STORAGE.")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migración de registros a una colección de series temporales")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--desde-id", type=ObjectId, default=None, help="Reanuda la copia después de este _id")
+    args = parser.parse_args()
+    asyncio.run(main(args.batch_size, args.desde_id))
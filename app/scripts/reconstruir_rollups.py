@@ -0,0 +1,54 @@
+"""
+Reconstruye fuera de línea la colección 'registros_rollup' (y opcionalmente 'progreso_usuario'
+y 'records_personales') a partir de los registros, sin pasar por la API. Con --estado-animo también puntúa los mensajes
+pendientes y reconstruye 'estado_animo_usuario' a partir de las conversaciones.
+
+Uso (desde la carpeta app/):
+    python -m scripts.reconstruir_rollups [--usuario-id ID] [--progreso] [--records] [--estado-animo [--recalcular]]
+"""
+import argparse
+import asyncio
+import os
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from connection.indexes import ensure_indexes
+from controllers import progreso_controller, rollup_controller, estado_animo_controller, records_controller
+
+load_dotenv()
+
+MONGO_URI = os.getenv("MONGO_URI")
+DB_NAME = os.getenv("DB_NAME")
+
+
+async def main(usuario_id, progreso: bool, records: bool, estado_animo: bool, recalcular: bool, batch_size: int) -> None:
+    client = AsyncIOMotorClient(MONGO_URI)
+    try:
+        db = client[DB_NAME]
+        await ensure_indexes(db)
+        buckets = await rollup_controller.reconstruir_rollups(db, usuario_id, batch_size)
+        print(f"registros_rollup: {buckets} buckets escritos")
+        if progreso:
+            documentos = await progreso_controller.reconstruir_progreso(db, usuario_id, batch_size)
+            print(f"progreso_usuario: {documentos} documentos escritos")
+        if records:
+            documentos = await records_controller.reconstruir_records(db, usuario_id)
+            print(f"records_personales: {documentos} documentos escritos")
+        if estado_animo:
+            resultado = await estado_animo_controller.reconstruir_estado_animo(db, usuario_id, recalcular, batch_size)
+            print(f"estado_animo_usuario: {resultado['resumenes']} resúmenes, {resultado['mensajes_puntuados']} mensajes puntuados")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Reconstrucción de los resúmenes de registros")
+    parser.add_argument("--usuario-id", default=None, help="Solo los registros de este usuario")
+    parser.add_argument("--progreso", action="store_true", help="Reconstruye también 'progreso_usuario'")
+    parser.add_argument("--records", action="store_true", help="Reconstruye también 'records_personales' (sin crear logros)")
+    parser.add_argument("--estado-animo", action="store_true", help="Reconstruye también 'estado_animo_usuario'")
+    parser.add_argument("--recalcular", action="store_true", help="Vuelve a puntuar todos los mensajes")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(main(args.usuario_id, args.progreso, args.records, args.estado_animo, args.recalcular, args.batch_size))
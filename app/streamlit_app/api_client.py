@@ -0,0 +1,269 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+import httpx
+import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+
+# --- Configuración de la API de FastAPI ---
+# ¡IMPORTANTE! Asegúrate de que esta URL coincida con la dirección donde tu backend FastAPI está corriendo.
+FASTAPI_BASE_URL = os.getenv("FASTAPI_BASE_URL", "http://localhost:8000")
+# Segundos que se reutiliza la respuesta de un GET antes de volver a pedirla
+API_CACHE_TTL = int(os.getenv("API_CACHE_TTL", "30"))
+API_TIMEOUT = float(os.getenv("API_TIMEOUT", "30"))
+# Peticiones GET independientes que se lanzan a la vez desde una misma página
+API_MAX_WORKERS = int(os.getenv("API_MAX_WORKERS", "8"))
+# Respuestas GET que se guardan con su ETag para revalidarlas con If-None-Match
+API_ETAG_MAX_ENTRIES = int(os.getenv("API_ETAG_MAX_ENTRIES", "200"))
+
+# --- Invalidación de la caché ---
+# Cada GET se guarda en caché junto con la versión de su recurso. Una escritura incrementa la
+# versión de los recursos a los que afecta, de modo que sus GET dejan de coincidir con la caché
+# y el resto de entradas se siguen reutilizando.
+
+# Recursos cuya versión cambia al escribir en cada colección
+INVALIDA = {
+    "usuarios": ("usuarios", "progreso", "stats"),   # el volumen total incluye el nombre del usuario
+    "registros": ("registros", "progreso", "logros", "ejercicios", "stats"),   # récords y altas en el catálogo
+    "logros": ("logros", "stats"),
+    "ejercicios": ("ejercicios", "progreso", "stats"),   # el progreso muestra los nombres del catálogo
+    "conversaciones": ("conversaciones", "stats"),
+}
+
+# Segmentos de ruta cuyas respuestas dependen de los registros
+RUTAS_PROGRESO = {"progreso", "analytics", "rollups", "records"}
+
+
+def _recurso(endpoint: str) -> str:
+    """
+    Recurso del que depende un endpoint: 'progreso' para las rutas de progreso, análisis,
+    rollups y récords (se calculan a partir de los registros) y, en otro caso, el primer segmento de la ruta.
+    """
+    segmentos = endpoint.strip("/").split("/")
+    if RUTAS_PROGRESO.intersection(segmentos):
+        return "progreso"
+    return segmentos[0]
+
+
+@st.cache_resource
+def _versiones() -> Dict[str, Any]:
+    # Compartido por todas las sesiones del servidor de Streamlit (igual que st.cache_data)
+    return {"lock": threading.Lock(), "versiones": {}}
+
+
+def _version(recurso: str) -> int:
+    return _versiones()["versiones"].get(recurso, 0)
+
+
+def invalidate(*recursos: str) -> None:
+    """
+    Invalida las respuestas en caché de los recursos indicados.
+    """
+    estado = _versiones()
+    with estado["lock"]:
+        for recurso in recursos:
+            estado["versiones"][recurso] = estado["versiones"].get(recurso, 0) + 1
+
+
+# --- Cliente HTTP ---
+
+@st.cache_resource
+def get_http_client() -> httpx.Client:
+    """
+    Cliente httpx compartido: mantiene abiertas las conexiones con la API (keep-alive)
+    en lugar de abrir una conexión TCP nueva en cada petición.
+    """
+    return httpx.Client(
+        base_url=FASTAPI_BASE_URL,
+        timeout=API_TIMEOUT,
+        limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+    )
+
+
+# --- GET condicional (ETag) ---
+# Última respuesta de cada GET junto con su ETag. Cuando la entrada de st.cache_data caduca o se
+# invalida, el GET se repite con If-None-Match y, si los datos no han cambiado, la API responde
+# 304 sin cuerpo y se reutiliza la copia guardada.
+
+@st.cache_resource
+def _etags() -> Dict[str, Any]:
+    return {"lock": threading.Lock(), "respuestas": OrderedDict()}
+
+
+def _clave_etag(endpoint: str, params) -> Tuple[str, Optional[Tuple[Tuple[str, Any], ...]]]:
+    return endpoint, tuple(sorted(params.items())) if params else None
+
+
+def _etag_guardado(clave) -> Optional[Tuple[str, Any]]:
+    estado = _etags()
+    with estado["lock"]:
+        return estado["respuestas"].get(clave)
+
+
+def _guardar_etag(clave, etag: str, data: Any) -> None:
+    estado = _etags()
+    with estado["lock"]:
+        estado["respuestas"][clave] = (etag, data)
+        estado["respuestas"].move_to_end(clave)
+        while len(estado["respuestas"]) > API_ETAG_MAX_ENTRIES:
+            estado["respuestas"].popitem(last=False)
+
+
+def request(method: str, endpoint: str, data=None, params=None) -> Tuple[Optional[Any], Optional[str]]:
+    """
+    Realiza una solicitud HTTP a la API y devuelve (respuesta, error).
+    Los GET se envían con If-None-Match cuando ya hay una respuesta guardada para ellos.
+    No usa st.*, así que se puede llamar desde otros hilos.
+    """
+    print(f"DEBUG (Consola): Realizando {method} request a: {FASTAPI_BASE_URL}/{endpoint}")
+    clave = _clave_etag(endpoint, params) if method == "GET" else None
+    guardado = _etag_guardado(clave) if clave else None
+    headers = {"If-None-Match": guardado[0]} if guardado else None
+    try:
+        response = get_http_client().request(method, f"/{endpoint}", json=data, params=params, headers=headers)
+        print(f"DEBUG (Consola): Respuesta de la API (Status: {response.status_code})")
+        if response.status_code == 304 and guardado:
+            return guardado[1], None
+        response.raise_for_status() # Lanza una excepción si la respuesta no es 2xx
+
+        if response.status_code == 204:
+            return {"message": "Operación exitosa sin contenido de respuesta."}, None
+        try:
+            result = response.json()
+        except ValueError:
+            return {"message": response.text}, None
+        if clave and response.headers.get("etag"):
+            _guardar_etag(clave, response.headers["etag"], result)
+        return result, None
+
+    except httpx.HTTPStatusError as e:
+        status_code = e.response.status_code
+        try:
+            detail = e.response.json().get("detail", "Error desconocido")
+        except ValueError:
+            detail = e.response.text
+        print(f"DEBUG (Consola): HTTPError: {status_code} - {detail}")
+        return None, f"Error {status_code}: {detail}"
+    except httpx.TransportError:
+        print(f"DEBUG (Consola): ConnectionError: No se pudo conectar con {FASTAPI_BASE_URL}")
+        return None, f"No se pudo conectar con el servidor FastAPI en {FASTAPI_BASE_URL}. Asegúrate de que esté corriendo."
+    except Exception as e:
+        print(f"DEBUG (Consola): Error inesperado: {e}")
+        return None, f"Ocurrió un error inesperado: {e}"
+
+
+class _APIError(Exception):
+    pass
+
+
+@st.cache_data(ttl=API_CACHE_TTL, max_entries=500, show_spinner=False)
+def _cached_get(endpoint: str, params: Optional[Tuple[Tuple[str, Any], ...]], version: int) -> Any:
+    # 'version' solo forma parte de la clave de la caché. Los errores se lanzan como excepción
+    # para que st.cache_data no los guarde.
+    data, error = request("GET", endpoint, params=dict(params) if params else None)
+    if error is not None:
+        raise _APIError(error)
+    return data
+
+
+def cached_get(endpoint: str, params=None) -> Tuple[Optional[Any], Optional[str]]:
+    """
+    GET con caché (TTL de API_CACHE_TTL segundos). Devuelve (respuesta, error).
+    """
+    params_key = tuple(sorted(params.items())) if params else None
+    try:
+        return _cached_get(endpoint, params_key, _version(_recurso(endpoint))), None
+    except _APIError as e:
+        return None, str(e)
+
+
+def make_api_request(method, endpoint, data=None, params=None, use_cache=True):
+    """
+    Realiza una solicitud HTTP a la API de FastAPI y muestra los errores en la UI.
+    Los GET se sirven desde la caché; las escrituras invalidan los recursos afectados.
+    """
+    if method not in ("GET", "POST", "PUT", "DELETE"):
+        st.error(f"Método HTTP no soportado: {method}")
+        return None
+
+    if method == "GET" and use_cache:
+        result, error = cached_get(endpoint, params)
+    else:
+        result, error = request(method, endpoint, data, params)
+        if method != "GET" and error is None:
+            recurso = _recurso(endpoint)
+            invalidate(*INVALIDA.get(recurso, (recurso,)))
+
+    if error is not None:
+        st.error(error)
+        return None
+    return result
+
+
+# --- Peticiones concurrentes ---
+
+@st.cache_resource
+def _executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=API_MAX_WORKERS, thread_name_prefix="fitflow-api")
+
+
+def _cached_get_en_hilo(ctx, endpoint: str, params) -> Tuple[Optional[Any], Optional[str]]:
+    # st.cache_data necesita el contexto de la sesión para funcionar fuera del hilo principal
+    add_script_run_ctx(threading.current_thread(), ctx)
+    return cached_get(endpoint, params)
+
+
+def fetch_concurrently(peticiones: Dict[str, Tuple[str, Optional[Dict[str, Any]]]]) -> Iterator[Tuple[str, Optional[Any], Optional[str]]]:
+    """
+    Lanza a la vez varios GET independientes ({clave: (endpoint, params)}) y devuelve
+    (clave, respuesta, error) según van terminando, para pintar cada sección en cuanto
+    llegan sus datos. La página tarda lo que la petición más lenta, no la suma de todas.
+    Los resultados se iteran en el hilo principal, así que ahí sí se puede usar st.*.
+    """
+    ctx = get_script_run_ctx()
+    futures = {
+        _executor().submit(_cached_get_en_hilo, ctx, endpoint, params): clave
+        for clave, (endpoint, params) in peticiones.items()
+    }
+    for future in as_completed(futures):
+        data, error = future.result()
+        yield futures[future], data, error
+
+
+# --- Chat en streaming (Server-Sent Events) ---
+
+def stream_events(endpoint: str, data: Dict[str, Any]) -> Iterator[Tuple[str, Any]]:
+    """
+    Envía un POST que responde con Server-Sent Events y devuelve (evento, datos) según llegan.
+    Los errores de conexión o HTTP se devuelven como un evento 'error'.
+    """
+    print(f"DEBUG (Consola): Realizando POST (stream) a: {FASTAPI_BASE_URL}/{endpoint}")
+    try:
+        with get_http_client().stream("POST", f"/{endpoint}", json=data, headers={"Accept": "text/event-stream"}) as response:
+            if response.status_code >= 400:
+                response.read()
+                try:
+                    detail = response.json().get("detail", "Error desconocido")
+                except ValueError:
+                    detail = response.text
+                yield "error", {"detail": f"Error {response.status_code}: {detail}"}
+                return
+
+            evento = "message"
+            for linea in response.iter_lines():
+                if linea.startswith("event:"):
+                    evento = linea[len("event:"):].strip()
+                elif linea.startswith("data:"):
+                    yield evento, json.loads(linea[len("data:"):].strip())
+                elif not linea:
+                    evento = "message"
+    except httpx.TransportError:
+        yield "error", {"detail": f"No se pudo conectar con el servidor FastAPI en {FASTAPI_BASE_URL}. Asegúrate de que esté corriendo."}
+    finally:
+        # El chat guarda mensajes nuevos en 'conversaciones'
+        recurso = _recurso(endpoint)
+        invalidate(*INVALIDA.get(recurso, (recurso,)))
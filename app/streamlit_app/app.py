@@ -1,71 +1,8 @@
 import streamlit as st
-import requests
-import json
 from datetime import datetime, date
+from api_client import make_api_request, fetch_concurrently, stream_events # Cliente HTTP con conexiones persistentes y caché de lecturas
 
-# --- Configuración de la API de FastAPI ---
-# ¡IMPORTANTE! Asegúrate de que esta URL coincida con la dirección donde tu backend FastAPI está corriendo.
-FASTAPI_BASE_URL = "http://localhost:8000"
-
-# --- Funciones de Utilidad y Cliente API ---
-
-def make_api_request(method, endpoint, data=None, params=None):
-    """
-    Realiza una solicitud HTTP a la API de FastAPI.
-    Maneja respuestas JSON y errores HTTP.
-    """
-    url = f"{FASTAPI_BASE_URL}/{endpoint}"
-    # Mensajes de depuración solo en la consola, no en la UI de Streamlit
-    print(f"DEBUG (Consola): Realizando {method} request a: {url}")
-    if data:
-        print(f"DEBUG (Consola): Datos enviados: {data}")
-
-    try:
-        if method == "GET":
-            response = requests.get(url, params=params)
-        elif method == "POST":
-            response = requests.post(url, json=data, params=params)
-        elif method == "PUT":
-            response = requests.put(url, json=data, params=params)
-        elif method == "DELETE":
-            response = requests.delete(url, params=params)
-        else:
-            st.error(f"Método HTTP no soportado: {method}")
-            return None
-
-        print(f"DEBUG (Consola): Respuesta de la API (Status: {response.status_code})")
-        
-        response.raise_for_status() # Lanza una excepción si la respuesta no es 2xx
-
-        try:
-            json_response = response.json()
-            print(f"DEBUG (Consola): Respuesta JSON recibida: {json_response}")
-            return json_response
-        except json.JSONDecodeError:
-            if response.status_code == 204:
-                return {"message": "Operación exitosa sin contenido de respuesta."}
-            st.warning(f"La respuesta no es JSON, texto recibido: {response.text}")
-            return {"message": response.text}
-
-    except requests.exceptions.HTTPError as e:
-        status_code = e.response.status_code
-        detail = "Error desconocido"
-        try:
-            error_json = e.response.json()
-            detail = error_json.get("detail", detail)
-        except json.JSONDecodeError:
-            detail = e.response.text
-        st.error(f"Error {status_code}: {detail}")
-        print(f"DEBUG (Consola): HTTPError: {status_code} - {detail}")
-        return None
-    except requests.exceptions.ConnectionError:
-        st.error(f"No se pudo conectar con el servidor FastAPI en {FASTAPI_BASE_URL}. Asegúrate de que esté corriendo.")
-        print(f"DEBUG (Consola): ConnectionError: No se pudo conectar con {FASTAPI_BASE_URL}")
-        return None
-    except Exception as e:
-        st.error(f"Ocurrió un error inesperado: {e}")
-        print(f"DEBUG (Consola): Error inesperado: {e}")
-        return None
+# --- Funciones de Utilidad ---
 
 def get_display_options(entities, entity_type):
     """
@@ -457,71 +394,69 @@ if page == "Dashboard":
     st.subheader("Estadísticas Rápidas")
     col1, col2, col3 = st.columns(3)
 
-    # Contar usuarios
-    usuarios = make_api_request("GET", "usuarios")
-    if usuarios is not None:
-        col1.metric("Total Usuarios", len(usuarios))
-    else:
-        col1.metric("Total Usuarios", "Error")
-
-    # Contar registros
-    registros = make_api_request("GET", "registros")
-    if registros is not None:
-        col2.metric("Total Registros", len(registros))
-    else:
-        col2.metric("Total Registros", "Error")
-
-    # Contar logros
-    logros = make_api_request("GET", "logros")
-    if logros is not None:
-        col3.metric("Total Logros", len(logros))
-    else:
-        col3.metric("Total Logros", "Error")
-
     st.markdown("---")
-    st.subheader("Últimos Registros")
-    if registros:
-        # Ordenar registros por fecha (asumiendo 'fecha_registro' existe)
-        for r in registros:
-            if 'fecha_registro' in r and isinstance(r['fecha_registro'], str):
-                try:
-                    r['fecha_registro_dt'] = datetime.fromisoformat(r['fecha_registro'])
-                except ValueError:
-                    r['fecha_registro_dt'] = datetime.min 
+    seccion_registros = st.container()
+    seccion_volumen = st.container()
+    with seccion_registros:
+        st.subheader("Últimos Registros")
+    with seccion_volumen:
+        st.subheader("Volumen Total de Entrenamiento por Usuario")
+
+    # Las tres peticiones son independientes: se lanzan a la vez y cada sección se pinta al llegar sus datos
+    for clave, data, error in fetch_concurrently({
+        "stats": ("stats", None), # Conteos calculados en el servidor (sin descargar las colecciones)
+        "registros": ("registros/ultimos/5", None),
+        "volumen": ("usuarios/progreso/volumen_total", None), # Una sola petición para el volumen de todos los usuarios
+    }):
+        if clave == "stats":
+            conteos = data.get("conteos") if data else None
+            if conteos is not None:
+                col1.metric("Total Usuarios", conteos.get("usuarios", 0))
+                col2.metric("Total Registros", conteos.get("registros", 0))
+                col3.metric("Total Logros", conteos.get("logros", 0))
             else:
-                r['fecha_registro_dt'] = datetime.min 
+                if error:
+                    st.error(error)
+                col1.metric("Total Usuarios", "Error")
+                col2.metric("Total Registros", "Error")
+                col3.metric("Total Logros", "Error")
+
+        elif clave == "registros":
+            with seccion_registros:
+                if error:
+                    st.error(error)
+                registros = data
+                if registros:
+                    # Ordenar registros por fecha (asumiendo 'fecha_registro' existe)
+                    for r in registros:
+                        if 'fecha_registro' in r and isinstance(r['fecha_registro'], str):
+                            try:
+                                r['fecha_registro_dt'] = datetime.fromisoformat(r['fecha_registro'])
+                            except ValueError:
+                                r['fecha_registro_dt'] = datetime.min 
+                        else:
+                            r['fecha_registro_dt'] = datetime.min 
 
-        registros_ordenados = sorted(registros, key=lambda x: x.get('fecha_registro_dt', datetime.min), reverse=True)
-        display_entity_list("últimos registros", registros_ordenados[:5], excluded_keys=['fecha_registro_dt'])
-    else:
-        st.info("No hay registros para mostrar en el dashboard.")
-
-    st.subheader("Volumen Total de Entrenamiento por Usuario")
-    if usuarios:
-        volumen_data = []
-        for user in usuarios:
-            user_id = user.get('_id')
-            if isinstance(user_id, dict) and '$oid' in user_id:
-                user_id = user_id['$oid']
-            elif user_id is not None:
-                user_id = str(user_id) 
-
-            if user_id:
-                volumen_total = make_api_request("GET", f"usuarios/{user_id}/progreso/volumen_total") # RUTA CORREGIDA
-                if volumen_total is not None:
-                    volumen_data.append({"Usuario": user.get("nombre", "Desconocido"), "Volumen": volumen_total})
-        
-        if volumen_data:
-            import pandas as pd
-            df_volumen = pd.DataFrame(volumen_data)
-            if not df_volumen.empty:
-                st.bar_chart(data=df_volumen, x="Usuario", y="Volumen")
-            else:
-                st.info("No hay datos de volumen para mostrar o hubo un error al recuperarlos.")
-        else:
-            st.info("No hay datos de volumen para mostrar o hubo un error al recuperarlos.")
-    else:
-        st.info("Necesitas tener usuarios para ver el volumen de entrenamiento.")
+                    registros_ordenados = sorted(registros, key=lambda x: x.get('fecha_registro_dt', datetime.min), reverse=True)
+                    display_entity_list("últimos registros", registros_ordenados[:5], excluded_keys=['fecha_registro_dt'])
+                else:
+                    st.info("No hay registros para mostrar en el dashboard.")
+
+        elif clave == "volumen":
+            with seccion_volumen:
+                if error:
+                    st.error(error)
+                volumen_data = [
+                    {"Usuario": v.get("nombre") or "Desconocido", "Volumen": v.get("volumen_total", 0)}
+                    for v in (data or [])
+                ]
+                # Sin usuarios (o sin registros) no hay progreso, y la lista llega vacía
+                if volumen_data:
+                    import pandas as pd
+                    df_volumen = pd.DataFrame(volumen_data)
+                    st.bar_chart(data=df_volumen, x="Usuario", y="Volumen")
+                else:
+                    st.info("No hay datos de volumen para mostrar. Necesitas tener usuarios con registros para ver el volumen de entrenamiento.")
 
 
 elif page == "Usuarios":
@@ -563,7 +498,7 @@ elif page == "Usuarios":
         
         # --- DEBUGGING CRÍTICO ---
         print("\n--- DEBUG (Consola): Sección 'Actualizar/Eliminar Usuario' ---")
-        users_from_api = make_api_request("GET", "usuarios")
+        users_from_api = make_api_request("GET", "usuarios", params={"fields": "nombre"})
         print(f"DEBUG (Consola): Resultado de make_api_request('GET', 'usuarios'): {users_from_api}")
 
         usuario_options_dict = get_display_options(users_from_api, "usuarios")
@@ -653,14 +588,47 @@ elif page == "Registros":
     tab1, tab2, tab3, tab4 = st.tabs(["Lista de Registros", "Crear Registro", "Actualizar/Eliminar Registro", "Análisis de Registros"])
 
     with tab1:
-        st.subheader("Lista de Todos los Registros")
-        registros = make_api_request("GET", "registros")
-        display_entity_list("registros", registros)
+        st.subheader("Lista de Registros")
+        # Los filtros y la paginación se resuelven en la API: solo se descarga la página que se muestra
+        users_from_api = make_api_request("GET", "usuarios", params={"fields": "nombre"})
+        usuario_options_dict = get_display_options(users_from_api, "usuarios")
+        col_usuario, col_ejercicio = st.columns(2)
+        filtro_usuario_id = col_usuario.selectbox("Usuario",
+                                                  options=[None] + list(usuario_options_dict.keys()),
+                                                  format_func=lambda x: _format_selectbox_option(x, usuario_options_dict, "--- Últimos registros de todos los usuarios ---"),
+                                                  key="list_registros_usuario_id")
+
+        tamano_pagina = 50
+        if filtro_usuario_id is None:
+            registros = make_api_request("GET", f"registros/ultimos/{tamano_pagina}")
+            display_entity_list("registros", registros)
+        else:
+            ejercicios_usuario = make_api_request("GET", f"registros/usuario/{filtro_usuario_id}/ejercicios") or []
+            filtro_ejercicio = col_ejercicio.selectbox("Ejercicio", options=[None] + ejercicios_usuario,
+                                                       format_func=lambda x: "Todos" if x is None else x,
+                                                       key="list_registros_ejercicio")
+            col_desde, col_hasta, col_pagina = st.columns(3)
+            filtro_desde = col_desde.date_input("Desde", value=None, key="list_registros_desde")
+            filtro_hasta = col_hasta.date_input("Hasta", value=None, key="list_registros_hasta")
+            pagina = col_pagina.number_input("Página", min_value=1, step=1, key="list_registros_pagina")
+
+            params = {"limit": tamano_pagina, "offset": (pagina - 1) * tamano_pagina}
+            if filtro_ejercicio:
+                params["ejercicio"] = filtro_ejercicio
+            if filtro_desde:
+                params["desde"] = f"{filtro_desde.isoformat()}T00:00:00"
+            if filtro_hasta:
+                params["hasta"] = f"{filtro_hasta.isoformat()}T23:59:59"
+
+            registros = make_api_request("GET", f"registros/usuario/{filtro_usuario_id}", params=params)
+            display_entity_list("registros", registros)
+            if registros is not None and len(registros) == tamano_pagina:
+                st.caption("Hay más registros: pasa a la página siguiente.")
 
     with tab2:
         st.subheader("Crear Nuevo Registro")
         with st.form("create_registro_form"):
-            users_from_api = make_api_request("GET", "usuarios")
+            users_from_api = make_api_request("GET", "usuarios", params={"fields": "nombre"})
             usuario_options_dict = get_display_options(users_from_api, "usuarios")
             
             if not usuario_options_dict:
@@ -721,7 +689,7 @@ elif page == "Registros":
 
     with tab3:
         st.subheader("Actualizar o Eliminar Registro")
-        records_from_api = make_api_request("GET", "registros")
+        records_from_api = make_api_request("GET", "registros", params={"fields": "ejercicio_nombre,fecha_registro"})
         registro_options_dict = get_display_options(records_from_api, "registros")
 
         if not registro_options_dict:
@@ -825,7 +793,7 @@ elif page == "Registros":
         with tab4:
             st.subheader("Análisis de Registros")
             
-            users_from_api_analysis = make_api_request("GET", "usuarios")
+            users_from_api_analysis = make_api_request("GET", "usuarios", params={"fields": "nombre"})
             usuario_options_analysis_dict = get_display_options(users_from_api_analysis, "usuarios")
             
             selected_usuario_id_analysis = st.selectbox("Selecciona un Usuario para Análisis", 
@@ -835,9 +803,12 @@ elif page == "Registros":
                                                         key="analysis_usuario_id")
 
             if selected_usuario_id_analysis is not None:
+                # Todo el análisis del usuario en una sola petición (una única agregación en el servidor)
+                analytics = make_api_request("GET", f"usuarios/{selected_usuario_id_analysis}/analytics") or {}
+
                 st.markdown("---")
                 st.write("### Último Peso Levantado por Ejercicio")
-                ultimo_peso_data = make_api_request("GET", f"usuarios/{selected_usuario_id_analysis}/progreso") # Ruta corregida
+                ultimo_peso_data = analytics.get("ultimo_peso")
                 if ultimo_peso_data:
                     display_entity_list("último peso por ejercicio", ultimo_peso_data)
                 else:
@@ -845,11 +816,8 @@ elif page == "Registros":
 
                 st.markdown("---")
                 st.write("### Mejor Marca por Ejercicio")
-                registros_del_usuario = make_api_request("GET", f"registros/usuario/{selected_usuario_id_analysis}")
-                
-                ejercicio_nombres = []
-                if registros_del_usuario:
-                    ejercicio_nombres = sorted(list(set([e.get('ejercicio_nombre') for e in registros_del_usuario if e.get('ejercicio_nombre')])))
+                ejercicio_nombres = analytics.get("ejercicios") or []
+                mejores_marcas = {m["ejercicio_nombre"]: m["mejor_marca"] for m in analytics.get("mejores_marcas") or []}
                 
                 selected_ejercicio_for_best_mark = st.selectbox("Selecciona un Ejercicio para ver la Mejor Marca", 
                                                                 options=[None] + ejercicio_nombres, 
@@ -858,7 +826,7 @@ elif page == "Registros":
                                                                 key="select_best_mark_exercise")
                 
                 if selected_ejercicio_for_best_mark is not None:
-                    mejor_marca_data = make_api_request("GET", f"usuarios/{selected_usuario_id_analysis}/progreso/{selected_ejercicio_for_best_mark}/mejor_marca") # Ruta corregida
+                    mejor_marca_data = mejores_marcas.get(selected_ejercicio_for_best_mark)
                     if mejor_marca_data:
                         st.json(mejor_marca_data)
                     else:
@@ -866,9 +834,20 @@ elif page == "Registros":
                 else:
                     st.info("Por favor, selecciona un ejercicio para analizar sus mejores marcas.")
                 
+                st.markdown("---")
+                st.write("### Récords Personales")
+                records_data = make_api_request("GET", f"usuarios/{selected_usuario_id_analysis}/records")
+                if records_data:
+                    import pandas as pd
+                    df_records = pd.DataFrame(records_data)[["ejercicio_nombre", "peso", "repeticiones", "volumen", "e1rm", "series"]]
+                    df_records.columns = ["Ejercicio", "Peso máx.", "Reps máx.", "Volumen máx.", "1RM estimado", "Series"]
+                    st.dataframe(df_records, hide_index=True)
+                else:
+                    st.info("Este usuario aún no tiene récords personales.")
+
                 st.markdown("---")
                 st.write("### Frecuencia Semanal de Entrenamiento")
-                frecuencia_semanal_data = make_api_request("GET", f"usuarios/{selected_usuario_id_analysis}/progreso/frecuencia_semanal") # Ruta corregida
+                frecuencia_semanal_data = analytics.get("frecuencia_semanal")
                 if frecuencia_semanal_data:
                     import pandas as pd
                     df_frecuencia = pd.DataFrame(frecuencia_semanal_data)
@@ -883,12 +862,36 @@ elif page == "Registros":
 
                 st.markdown("---")
                 st.write("### Volumen Total de Entrenamiento")
-                volumen_total_data = make_api_request("GET", f"usuarios/{selected_usuario_id_analysis}/progreso/volumen_total") # Ruta corregida
+                volumen_total_data = analytics.get("volumen_total")
                 if volumen_total_data is not None:
                     st.success(f"Volumen total para el usuario: **{volumen_total_data}**")
                 else:
                     st.info("No se encontró información de volumen total para este usuario.")
 
+                st.markdown("---")
+                st.write("### Evolución por Periodo")
+                col_granularidad, col_ejercicio = st.columns(2)
+                granularidad = col_granularidad.selectbox("Periodo", options=["dia", "semana", "mes"], index=1,
+                                                          format_func=lambda x: {"dia": "Diario", "semana": "Semanal", "mes": "Mensual"}[x],
+                                                          key="rollup_granularidad")
+                ejercicio_rollup = col_ejercicio.selectbox("Ejercicio", options=[None] + ejercicio_nombres,
+                                                           format_func=lambda x: x if x else "Todos los ejercicios",
+                                                           index=0, key="rollup_ejercicio")
+                rollup_params = {"granularidad": granularidad}
+                if ejercicio_rollup:
+                    rollup_params["ejercicio"] = ejercicio_rollup
+                # Buckets precalculados en el servidor: no se leen los registros
+                rollups = make_api_request("GET", f"usuarios/{selected_usuario_id_analysis}/rollups", params=rollup_params)
+                if rollups:
+                    import pandas as pd
+                    df_rollups = pd.DataFrame(rollups)
+                    df_rollups["inicio"] = pd.to_datetime(df_rollups["inicio"])
+                    df_rollups = df_rollups.set_index("inicio")
+                    st.line_chart(df_rollups[["volumen"]])
+                    st.bar_chart(df_rollups[["conteo", "dias_entrenados"]])
+                else:
+                    st.info("No hay datos para el periodo seleccionado.")
+
             else:
                 st.info("Por favor, selecciona un usuario para ver sus análisis de registros.")
 
@@ -913,7 +916,7 @@ elif page == "Logros":
             Por favor, asegúrate de que tu backend esté configurado para manejar esta estructura.
             """)
         with st.form("create_logro_form"):
-            users_from_api = make_api_request("GET", "usuarios")
+            users_from_api = make_api_request("GET", "usuarios", params={"fields": "nombre"})
             usuario_options_logro_dict = get_display_options(users_from_api, "usuarios")
 
             if not usuario_options_logro_dict:
@@ -976,7 +979,7 @@ elif page == "Logros":
 
     with tab3:
         st.subheader("Actualizar o Eliminar Logro")
-        logros_from_api = make_api_request("GET", "logros")
+        logros_from_api = make_api_request("GET", "logros", params={"fields": "descripcion"})
         logro_options_dict = get_display_options(logros_from_api, "logros") 
 
         if not logro_options_dict:
@@ -1077,8 +1080,15 @@ elif page == "Ejercicios":
 
     with tab1:
         st.subheader("Lista de Todos los Ejercicios")
-        ejercicios = make_api_request("GET", "ejercicios")
-        display_entity_list("ejercicios", ejercicios)
+        busqueda_ejercicio = st.text_input("Buscar por nombre o descripción", key="buscar_ejercicio")
+        if busqueda_ejercicio:
+            resultado_busqueda = make_api_request("GET", "ejercicios/buscar", params={"q": busqueda_ejercicio, "limit": 50})
+            if resultado_busqueda:
+                st.caption(f"{resultado_busqueda.get('total', 0)} ejercicios encontrados (ordenados por relevancia)")
+                display_entity_list("ejercicios", resultado_busqueda.get("resultados"), excluded_keys=["puntuacion"])
+        else:
+            ejercicios = make_api_request("GET", "ejercicios")
+            display_entity_list("ejercicios", ejercicios)
 
     with tab2:
         st.subheader("Crear Nuevo Ejercicio")
@@ -1189,9 +1199,9 @@ elif page == "Conversaciones":
 
     with tab1:
         st.subheader("Tu Asistente FitFlow")
-        st.info("Esta es una simulación del chatbot. Para una funcionalidad completa, necesitarías integrar un modelo de lenguaje grande (LLM) y adaptar las respuestas.")
+        st.info("Las respuestas las genera el modelo configurado en el servidor (LLM_BACKEND) a partir de tus últimos mensajes y tu progreso.")
 
-        users_from_api = make_api_request("GET", "usuarios")
+        users_from_api = make_api_request("GET", "usuarios", params={"fields": "nombre"})
         chat_user_options_dict = get_display_options(users_from_api, "usuarios")
         
         selected_chat_user_id = st.selectbox("Selecciona un Usuario para el Chat", 
@@ -1225,46 +1235,32 @@ elif page == "Conversaciones":
                 with st.chat_message("user"):
                     st.markdown(prompt)
 
-                create_user_msg_data = {
-                    "usuario_id": selected_chat_user_id,
-                    "mensaje": prompt,
-                    "fecha": datetime.now().isoformat(), 
-                    "rol": "user",
-                    "tema": "general" 
-                }
-                response_post_chat = make_api_request("POST", "conversaciones", create_user_msg_data)
-                if response_post_chat:
-                    print(f"DEBUG (Consola): Mensaje de usuario guardado con ID: {response_post_chat.get('id', 'N/A')}")
-                else:
-                    print("ERROR (Consola): No se pudo guardar el mensaje del usuario.")
+                # El servidor guarda los dos turnos y devuelve la respuesta token a token
+                errores = []
 
+                def tokens_asistente():
+                    for evento, datos in stream_events("conversaciones/chat", {"usuario_id": selected_chat_user_id, "mensaje": prompt, "tema": "general"}):
+                        if evento == "token":
+                            yield datos["texto"]
+                        elif evento == "error":
+                            errores.append(datos.get("detail", "Error desconocido"))
+                        elif evento == "fin":
+                            print(f"DEBUG (Consola): Chat guardado (usuario: {datos.get('usuario_mensaje_id')}, asistente: {datos.get('asistente_mensaje_id')}, primer token: {datos.get('ttft_ms')} ms)")
 
                 with st.chat_message("assistant"):
-                    with st.spinner("Pensando..."):
-                        response_from_llm = f"He recibido tu mensaje: '{prompt}'. ¿Cómo puedo ayudarte con tu entrenamiento?"
-                        st.markdown(response_from_llm)
-                        
-                        create_bot_msg_data = {
-                            "usuario_id": selected_chat_user_id,
-                            "mensaje": response_from_llm,
-                            "fecha": datetime.now().isoformat(), 
-                            "rol": "assistant",
-                            "tema": "general" 
-                        }
-                        response_post_bot = make_api_request("POST", "conversaciones", create_bot_msg_data)
-                        if response_post_bot:
-                            print(f"DEBUG (Consola): Mensaje de bot guardado con ID: {response_post_bot.get('id', 'N/A')}")
-                        else:
-                            print("ERROR (Consola): No se pudo guardar el mensaje del bot.")
+                    response_from_llm = st.write_stream(tokens_asistente())
+                    for error in errores:
+                        st.error(error)
 
-                st.session_state[f'chat_history_{selected_chat_user_id}'].append({"role": "assistant", "content": response_from_llm})
+                if isinstance(response_from_llm, str) and response_from_llm:
+                    st.session_state[f'chat_history_{selected_chat_user_id}'].append({"role": "assistant", "content": response_from_llm})
         else:
             st.info("Por favor, crea o selecciona un usuario para empezar a chatear.")
 
 
     with tab2:
         st.subheader("Lista de Todas las Conversaciones")
-        conversations_from_api = make_api_request("GET", "conversaciones")
+        conversations_from_api = make_api_request("GET", "conversaciones", params={"fields": "usuario_id,fecha,rol,tema"})
         display_entity_list("conversaciones", conversations_from_api, excluded_keys=["mensaje"]) 
 
         st.markdown("---")
@@ -1299,7 +1295,7 @@ elif page == "Conversaciones":
         # --- Lógica de Confirmación de Eliminación (FUERA DEL FORMULARIO) ---
         if st.session_state.show_delete_conversacion_confirm and st.session_state.conversacion_to_delete_id:
             conv_id_to_confirm = st.session_state.conversacion_to_delete_id
-            conversations_from_api = make_api_request("GET", "conversaciones") # Recargar para asegurar que esté actualizado
+            conversations_from_api = make_api_request("GET", "conversaciones", params={"fields": "usuario_id,fecha"}) # Recargar para asegurar que esté actualizado
             conv_options_dict = get_display_options(conversations_from_api, "conversaciones") # Recargar dict
             conv_display_name = _format_selectbox_option(conv_id_to_confirm, conv_options_dict, '')
 
@@ -1325,7 +1321,7 @@ elif page == "Conversaciones":
     with tab3:
         st.subheader("Análisis de Conversaciones por Usuario")
         
-        users_from_api_analysis = make_api_request("GET", "usuarios")
+        users_from_api_analysis = make_api_request("GET", "usuarios", params={"fields": "nombre"})
         usuario_options_analysis_dict = get_display_options(users_from_api_analysis, "usuarios")
         
         selected_conv_analysis_user_id = st.selectbox("Selecciona un Usuario para Análisis de Conversaciones", 
@@ -1336,38 +1332,83 @@ elif page == "Conversaciones":
 
         if selected_conv_analysis_user_id is not None:
             st.markdown("---")
-            st.write("### Últimos 5 Mensajes")
-            ultimos_mensajes = make_api_request("GET", f"conversaciones/ultimos_mensajes/{selected_conv_analysis_user_id}/5")
-            if ultimos_mensajes:
-                for msg in ultimos_mensajes:
-                    st.write(f"- **Mensaje:** {msg.get('mensaje', 'N/A')}")
-                    st.write(f"  **Fecha:** {msg.get('fecha', 'N/A')}")
-                    st.write(f"  **Rol:** {msg.get('rol', 'N/A')}")
-                    st.write(f"  **Tema:** {msg.get('tema', 'N/A')}")
-                    st.markdown("---")
-            else:
-                st.info("No se encontraron mensajes recientes para este usuario.")
-
-            st.write("### Mensajes por Tema")
-            tema_input = st.text_input("Introduce un tema para buscar mensajes:", key="tema_conversacion")
+            seccion_ultimos = st.container()
+            seccion_tema = st.container()
+            seccion_busqueda = st.container()
+            with seccion_ultimos:
+                st.write("### Últimos 5 Mensajes")
+            with seccion_tema:
+                st.write("### Mensajes por Tema")
+                tema_input = st.text_input("Introduce un tema para buscar mensajes:", key="tema_conversacion")
+                if not tema_input:
+                    st.info("Introduce un tema para buscar.")
+            with seccion_busqueda:
+                st.write("### Buscar en los Mensajes")
+                texto_busqueda = st.text_input("Palabras a buscar en el texto de los mensajes:", key="buscar_conversacion")
+
+            # Los últimos mensajes, la búsqueda por tema y la búsqueda de texto se piden a la vez
+            peticiones = {"ultimos": (f"conversaciones/ultimos_mensajes/{selected_conv_analysis_user_id}/5", None)}
             if tema_input:
-                mensajes_por_tema = make_api_request("GET", f"conversaciones/por_tema/{selected_conv_analysis_user_id}/{tema_input}")
-                if mensajes_por_tema:
-                    for msg in mensajes_por_tema:
-                        st.write(f"- **Mensaje:** {msg.get('mensaje', 'N/A')}")
-                        st.write(f"  **Fecha:** {msg.get('fecha', 'N/A')}")
-                        st.write(f"  **Rol:** {msg.get('rol', 'N/A')}")
-                    st.markdown("---")
-                else:
-                    st.info(f"No se encontraron mensajes sobre '{tema_input}' para este usuario.")
-            else:
-                st.info("Introduce un tema para buscar.")
+                peticiones["tema"] = (f"conversaciones/por_tema/{selected_conv_analysis_user_id}/{tema_input}", None)
+            if texto_busqueda:
+                peticiones["busqueda"] = ("conversaciones/buscar", {"q": texto_busqueda, "usuario_id": selected_conv_analysis_user_id, "limit": 20})
+
+            for clave, data, error in fetch_concurrently(peticiones):
+                if clave == "ultimos":
+                    with seccion_ultimos:
+                        if error:
+                            st.error(error)
+                        if data:
+                            for msg in data:
+                                st.write(f"- **Mensaje:** {msg.get('mensaje', 'N/A')}")
+                                st.write(f"  **Fecha:** {msg.get('fecha', 'N/A')}")
+                                st.write(f"  **Rol:** {msg.get('rol', 'N/A')}")
+                                st.write(f"  **Tema:** {msg.get('tema', 'N/A')}")
+                                st.markdown("---")
+                        else:
+                            st.info("No se encontraron mensajes recientes para este usuario.")
+
+                elif clave == "tema":
+                    with seccion_tema:
+                        if error:
+                            st.error(error)
+                        if data:
+                            for msg in data:
+                                st.write(f"- **Mensaje:** {msg.get('mensaje', 'N/A')}")
+                                st.write(f"  **Fecha:** {msg.get('fecha', 'N/A')}")
+                                st.write(f"  **Rol:** {msg.get('rol', 'N/A')}")
+                            st.markdown("---")
+                        else:
+                            st.info(f"No se encontraron mensajes sobre '{tema_input}' para este usuario.")
+
+                elif clave == "busqueda":
+                    with seccion_busqueda:
+                        if error:
+                            st.error(error)
+                        if data and data.get("resultados"):
+                            st.caption(f"{data.get('total', 0)} mensajes encontrados (se muestran los más relevantes)")
+                            for msg in data["resultados"]:
+                                st.write(f"- **Mensaje:** {msg.get('mensaje', 'N/A')}")
+                                st.write(f"  **Fecha:** {msg.get('fecha', 'N/A')}")
+                                st.write(f"  **Tema:** {msg.get('tema', 'N/A')}")
+                            st.markdown("---")
+                        else:
+                            st.info(f"No se encontraron mensajes con '{texto_busqueda}'.")
 
             st.write("### Análisis de Estado de Ánimo")
+            ventanas_animo = {"Todo el historial": None, "Últimos 7 días": 7, "Últimos 30 días": 30, "Últimos 90 días": 90}
+            ventana_animo = st.selectbox("Periodo", options=list(ventanas_animo.keys()), key="estado_animo_ventana")
             if st.button("Analizar Estado de Ánimo"):
-                estado_animo_result = make_api_request("GET", f"conversaciones/analizar_estado_animo/{selected_conv_analysis_user_id}")
+                params_animo = {"dias": ventanas_animo[ventana_animo]} if ventanas_animo[ventana_animo] else None
+                estado_animo_result = make_api_request("GET", f"conversaciones/analizar_estado_animo/{selected_conv_analysis_user_id}", params=params_animo)
                 if estado_animo_result:
                     st.success(f"El estado de ánimo detectado es: **{estado_animo_result.get('estado_animo', 'No disponible')}**")
+                    if estado_animo_result.get("mensajes"):
+                        col_media, col_pos, col_neg, col_neu = st.columns(4)
+                        col_media.metric("Puntuación media", f"{estado_animo_result.get('puntuacion_media', 0):+.2f}")
+                        col_pos.metric("Positivos", estado_animo_result.get("positivos", 0))
+                        col_neg.metric("Negativos", estado_animo_result.get("negativos", 0))
+                        col_neu.metric("Neutros", estado_animo_result.get("neutros", 0))
                 else:
                     st.error("No se pudo realizar el análisis de estado de ánimo.")
         else:
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Los módulos de la API se importan desde app/ ("from controllers import ...")
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
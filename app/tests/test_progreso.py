@@ -0,0 +1,29 @@
+from datetime import datetime, timedelta, timezone
+
+from controllers.progreso_controller import _acumular, _nuevo_resumen, _semana
+
+
+def test_semana_empieza_en_domingo_como_week():
+    # 2024-01-01 es lunes: los días anteriores al primer domingo son la semana 0 ($week)
+    assert _semana(datetime(2024, 1, 1)) == ("2024-00", 2024, 0, "2")
+    assert _semana(datetime(2024, 1, 6)) == ("2024-00", 2024, 0, "7")
+    assert _semana(datetime(2024, 1, 7)) == ("2024-01", 2024, 1, "1")
+    # 2023-01-01 es domingo: ya es la semana 1
+    assert _semana(datetime(2023, 1, 1)) == ("2023-01", 2023, 1, "1")
+
+
+def test_semana_usa_la_fecha_en_utc():
+    # Domingo 00:30 en UTC+2 es sábado 22:30 en UTC
+    fecha = datetime(2024, 1, 7, 0, 30, tzinfo=timezone(timedelta(hours=2)))
+    assert _semana(fecha) == ("2024-00", 2024, 0, "7")
+
+
+def test_acumular_conteos_por_semana_y_dia():
+    resumen = _nuevo_resumen("u1", "e1")
+    for fecha in (datetime(2024, 1, 6), datetime(2024, 1, 6, 18), datetime(2024, 1, 7)):
+        _acumular(resumen, {"_id": fecha, "peso_levantado": 50, "repeticiones": 10, "fecha_registro": fecha})
+    assert resumen["conteo_registros"] == 3
+    assert resumen["volumen_total"] == 1500
+    assert resumen["semanas"]["2024-00"]["dias"] == {"7": 2}
+    assert resumen["semanas"]["2024-01"]["dias"] == {"1": 1}
+    assert resumen["ultimo"]["fecha_registro"] == datetime(2024, 1, 7)
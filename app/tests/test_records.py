@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from bson import ObjectId
+
+from controllers import records_controller
+from controllers.records_controller import _cambia_serie, _metricas, _nuevos_logros, _tiene_maximo, e1rm_epley
+
+EJERCICIO_ID = ObjectId()
+
+
+def _registro(peso, repeticiones, fecha=datetime(2024, 1, 8), **extra):
+    return {"_id": ObjectId(), "usuario_id": "u1", "ejercicio_id": EJERCICIO_ID, "ejercicio_nombre": "Sentadilla",
+            "peso_levantado": peso, "repeticiones": repeticiones, "fecha_registro": fecha, **extra}
+
+
+def test_e1rm_epley():
+    assert e1rm_epley(100, 1) == 100
+    assert e1rm_epley(100, 0) == 100
+    assert e1rm_epley(100, 10) == 133.33
+    assert e1rm_epley(80, 30) == 160
+
+
+def test_primera_serie_solo_fija_la_referencia(monkeypatch):
+    async def sin_documento_previo(db, registro, actuales, nueva_serie=True):
+        return None
+
+    monkeypatch.setattr(records_controller, "_aplicar_maximos", sin_documento_previo)
+    assert asyncio.run(records_controller.registrar_serie(None, _registro(100, 5))) == []
+
+
+def test_empate_no_es_record():
+    registro = _registro(100, 5)
+    anterior = _metricas(registro)
+    assert _nuevos_logros(registro, anterior, _metricas(registro)) == []
+
+
+def test_record_de_peso():
+    anterior = _metricas(_registro(100, 5))
+    registro = _registro(105, 5)
+    logros = _nuevos_logros(registro, anterior, _metricas(registro))
+    assert [l["tipo"] for l in logros] == ["Peso", "Volumen", "1RM estimado"]
+    assert all(l["registro_id"] == registro["_id"] and l["automatico"] for l in logros)
+    assert logros[0]["valor"] == "105 kg"
+    assert "anterior: 100 kg" in logros[0]["descripcion"]
+
+
+def test_record_solo_en_las_metricas_que_mejoran():
+    anterior = {"peso": 120, "repeticiones": 5, "volumen": 600, "e1rm": 140}
+    registro = _registro(60, 12)
+    logros = _nuevos_logros(registro, anterior, _metricas(registro))
+    assert [l["tipo"] for l in logros] == ["Repeticiones", "Volumen"]
+
+
+def test_registrar_series_en_orden_cronologico(monkeypatch):
+    procesados = []
+
+    async def registrar(db, registro):
+        procesados.append(registro["fecha_registro"])
+        return []
+
+    monkeypatch.setattr(records_controller, "registrar_serie", registrar)
+    fechas = [datetime(2024, 3, 1), datetime(2024, 1, 1), datetime(2024, 2, 1)]
+    asyncio.run(records_controller.registrar_series(None, [_registro(100, 5, f) for f in fechas]))
+    assert procesados == sorted(fechas)
+
+
+def test_registrar_series_con_fechas_con_y_sin_zona_horaria(monkeypatch):
+    procesados = []
+
+    async def registrar(db, registro):
+        procesados.append(registro["fecha_registro"])
+        return []
+
+    monkeypatch.setattr(records_controller, "registrar_serie", registrar)
+    # 10:00 en UTC+2 son las 08:00 UTC: va antes que la fecha sin zona de las 09:00
+    con_zona = datetime(2024, 1, 1, 10, tzinfo=timezone(timedelta(hours=2)))
+    fechas = [datetime(2024, 1, 1, 9), con_zona, datetime(2024, 1, 1, 7)]
+    asyncio.run(records_controller.registrar_series(None, [_registro(100, 5, f) for f in fechas]))
+    assert procesados == [datetime(2024, 1, 1, 7), con_zona, datetime(2024, 1, 1, 9)]
+
+
+def test_tiene_maximo():
+    record = {"peso": 100, "repeticiones": 12, "volumen": 1000, "e1rm": 133.33}
+    assert _tiene_maximo(_metricas(_registro(100, 3)), record)
+    assert not _tiene_maximo(_metricas(_registro(90, 10)), record)
+
+
+def test_editar_solo_notas_no_toca_los_records():
+    anterior = _registro(100, 5, notas="")
+    actualizado = {**anterior, "notas": "Buenas sensaciones"}
+    assert not _cambia_serie(anterior, actualizado)
+    # Sin cambios en la serie no se consulta la base de datos (db=None)
+    assert asyncio.run(records_controller.aplicar_registro_actualizado(None, anterior, actualizado)) == []
+    assert _cambia_serie(anterior, {**anterior, "peso_levantado": 90})
@@ -0,0 +1,78 @@
+import asyncio
+from datetime import datetime
+
+from bson import ObjectId
+
+from controllers import registro_controller
+
+
+class _CursorFalso:
+    def __init__(self, documentos):
+        self.documentos = documentos
+
+    def __aiter__(self):
+        return self._iterar()
+
+    async def _iterar(self):
+        for documento in self.documentos:
+            yield documento
+
+
+class _ColeccionCortada:
+    """
+    insert_many escribe los 'escribe' primeros documentos y después falla con un error genérico.
+    """
+    def __init__(self, escribe, falla_consulta=False):
+        self.escribe = escribe
+        self.falla_consulta = falla_consulta
+        self.guardados = []
+
+    async def insert_many(self, documentos, ordered=False):
+        for documento in documentos:
+            documento["_id"] = ObjectId()
+        self.guardados = [{"_id": d["_id"]} for d in documentos[:self.escribe]]
+        raise ConnectionError("conexión cerrada")
+
+    def find(self, filtro, projection=None):
+        if self.falla_consulta:
+            raise ConnectionError("sin conexión")
+        ids = set(filtro["_id"]["$in"])
+        return _CursorFalso([d for d in self.guardados if d["_id"] in ids])
+
+
+def _preparar(monkeypatch, coleccion):
+    aplicados = []
+
+    async def resolver(db, registros):
+        return None
+
+    async def aplicar(db, registros):
+        aplicados.append(list(registros))
+        return []
+
+    monkeypatch.setattr(registro_controller, "get_registros_collection", lambda db: coleccion)
+    monkeypatch.setattr(registro_controller.ejercicio_controller, "resolver_registros", resolver)
+    monkeypatch.setattr(registro_controller.progreso_controller, "aplicar_registros_creados", aplicar)
+    monkeypatch.setattr(registro_controller.rollup_controller, "aplicar_registros_creados", aplicar)
+    monkeypatch.setattr(registro_controller.records_controller, "registrar_series", aplicar)
+    return aplicados
+
+
+def _registros(n):
+    return [{"usuario_id": "u1", "ejercicio_nombre": "Sentadilla", "peso_levantado": 100, "repeticiones": 5,
+             "fecha_registro": datetime(2024, 1, i + 1)} for i in range(n)]
+
+
+def test_error_generico_solo_marca_los_no_escritos(monkeypatch):
+    aplicados = _preparar(monkeypatch, _ColeccionCortada(escribe=2))
+    resultados = asyncio.run(registro_controller.create_registros_bulk(None, _registros(3)))
+    assert [r["ok"] for r in resultados] == [True, True, False]
+    assert resultados[2]["error"] == "conexión cerrada"
+    # Los hooks de resúmenes se ejecutan con los dos registros escritos
+    assert [len(lote) for lote in aplicados] == [2, 2, 2]
+
+
+def test_sin_poder_comprobar_lo_escrito_devuelve_none(monkeypatch):
+    aplicados = _preparar(monkeypatch, _ColeccionCortada(escribe=1, falla_consulta=True))
+    assert asyncio.run(registro_controller.create_registros_bulk(None, _registros(2))) is None
+    assert aplicados == []
@@ -0,0 +1,65 @@
+import asyncio
+from datetime import datetime
+
+from bson import ObjectId
+
+from controllers import registro_controller
+from controllers.registro_controller import _filtro_version
+
+REGISTRO_ID = ObjectId()
+
+
+class _Resultado:
+    def __init__(self, n):
+        self.matched_count = n
+        self.deleted_count = n
+
+
+class _ColeccionFalsa:
+    """
+    find_one devuelve las versiones indicadas en orden; update_one/delete_one solo
+    coinciden si el filtro exige la versión actual (la última devuelta en 'actuales').
+    """
+    def __init__(self, versiones, actuales):
+        self.versiones = list(versiones)
+        self.actuales = list(actuales)
+        self.filtros = []
+
+    async def find_one(self, filtro):
+        return dict(self.versiones.pop(0))
+
+    async def update_one(self, filtro, cambios):
+        self.filtros.append(filtro)
+        return _Resultado(int(filtro["peso_levantado"] == self.actuales.pop(0)["peso_levantado"]))
+
+    async def delete_one(self, filtro):
+        self.filtros.append(filtro)
+        return _Resultado(int(filtro["peso_levantado"] == self.actuales.pop(0)["peso_levantado"]))
+
+
+def _version(peso):
+    return {"_id": REGISTRO_ID, "usuario_id": "u1", "peso_levantado": peso, "fecha_registro": datetime(2024, 1, 1)}
+
+
+def test_filtro_version():
+    filtro = _filtro_version(_version(100), {"peso_levantado": 110, "notas": "x"})
+    assert filtro["peso_levantado"] == 100
+    assert filtro["notas"] == {"$exists": False}
+
+
+def test_actualizacion_concurrente_reintenta_con_la_version_nueva(monkeypatch):
+    # Otra petición cambia el peso a 105 entre la lectura y el update: se relee y se reintenta
+    coleccion = _ColeccionFalsa([_version(100), _version(105)], [_version(105), _version(105)])
+    monkeypatch.setattr(registro_controller, "es_timeseries", lambda: True)
+    monkeypatch.setattr(registro_controller, "get_registros_collection", lambda db: coleccion)
+    anterior = asyncio.run(registro_controller._actualizar_devolviendo_anterior(None, REGISTRO_ID, {"peso_levantado": 110}))
+    assert anterior["peso_levantado"] == 105
+    assert len(coleccion.filtros) == 2
+
+
+def test_eliminacion_concurrente_reintenta(monkeypatch):
+    coleccion = _ColeccionFalsa([_version(100), _version(105)], [_version(105), _version(105)])
+    monkeypatch.setattr(registro_controller, "es_timeseries", lambda: True)
+    monkeypatch.setattr(registro_controller, "get_registros_collection", lambda db: coleccion)
+    eliminado = asyncio.run(registro_controller._eliminar_devolviendo_documento(None, REGISTRO_ID))
+    assert eliminado["peso_levantado"] == 105
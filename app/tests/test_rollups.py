@@ -0,0 +1,89 @@
+import asyncio
+from datetime import datetime
+
+from pymongo import UpdateOne
+
+from controllers import rollup_controller
+from controllers.rollup_controller import _agrupar, _dias_entrenados, _fin_periodo, _inicio_periodo
+
+
+def _registro(fecha, peso=100, repeticiones=5):
+    return {"_id": fecha, "usuario_id": "u1", "ejercicio_id": "e1", "peso_levantado": peso,
+            "repeticiones": repeticiones, "fecha_registro": fecha}
+
+
+class _ColeccionFalsa:
+    """
+    Guarda las operaciones recibidas; find_one_and_update devuelve el bucket indicado.
+    """
+    def __init__(self, bucket=None):
+        self.bucket = bucket
+        self.operaciones = []
+
+    async def bulk_write(self, operaciones, ordered=True):
+        self.operaciones.extend(operaciones)
+
+    async def find_one_and_update(self, filtro, cambios, return_document=None):
+        self.operaciones.append(("find_one_and_update", filtro, cambios))
+        return self.bucket
+
+    async def delete_one(self, filtro):
+        self.operaciones.append(("delete_one", filtro))
+
+    async def update_one(self, filtro, cambios):
+        self.operaciones.append(("update_one", filtro, cambios))
+
+
+class _DbFalsa:
+    def __init__(self, coleccion):
+        self.registros_rollup = coleccion
+
+
+def test_inicio_y_fin_de_periodo():
+    domingo = datetime(2024, 1, 7, 18, 30)
+    assert _inicio_periodo(domingo, "dia") == datetime(2024, 1, 7)
+    assert _inicio_periodo(domingo, "semana") == datetime(2024, 1, 1)
+    assert _inicio_periodo(domingo, "mes") == datetime(2024, 1, 1)
+    assert _fin_periodo(datetime(2024, 12, 1), "mes") == datetime(2025, 1, 1)
+    assert _fin_periodo(datetime(2024, 1, 1), "semana") == datetime(2024, 1, 8)
+
+
+def test_agrupar_por_bucket():
+    buckets = _agrupar([_registro(datetime(2024, 1, 1)), _registro(datetime(2024, 1, 3), peso=120)])
+    semana = buckets[("u1", "e1", "semana", datetime(2024, 1, 1))]
+    assert semana["conteo"] == 2
+    assert semana["repeticiones_total"] == 10
+    assert semana["volumen"] == 1100
+    assert semana["peso_max"] == 120
+    assert _dias_entrenados(semana["dias"]) == {"2024-01-01", "2024-01-03"}
+    assert len(buckets) == 2 + 1 + 1  # dos días, una semana, un mes
+
+
+def test_incrementos_al_crear():
+    coleccion = _ColeccionFalsa()
+    asyncio.run(rollup_controller.aplicar_registros_creados(_DbFalsa(coleccion), [
+        _registro(datetime(2024, 1, 1)), _registro(datetime(2024, 1, 1, 19), peso=80, repeticiones=10),
+    ]))
+    assert len(coleccion.operaciones) == 3
+    assert UpdateOne(
+        {"usuario_id": "u1", "ejercicio_id": "e1", "granularidad": "dia", "inicio": datetime(2024, 1, 1)},
+        {"$inc": {"conteo": 2, "repeticiones_total": 15, "volumen": 1300, "dias.2024-01-01": 2},
+         "$max": {"peso_max": 100}},
+        upsert=True
+    ) in coleccion.operaciones
+
+
+def test_decrementos_al_eliminar():
+    # Quedan más series en el bucket y la eliminada no era el peso máximo
+    coleccion = _ColeccionFalsa({"conteo": 1, "peso_max": 120, "dias": {"2024-01-01": 1}})
+    asyncio.run(rollup_controller.aplicar_registro_eliminado(_DbFalsa(coleccion), _registro(datetime(2024, 1, 1))))
+    decrementos = [op[2]["$inc"] for op in coleccion.operaciones if op[0] == "find_one_and_update"]
+    assert len(decrementos) == 3
+    assert decrementos[0] == {"conteo": -1, "repeticiones_total": -5, "volumen": -500, "dias.2024-01-01": -1}
+    assert not [op for op in coleccion.operaciones if op[0] in ("delete_one", "update_one")]
+
+
+def test_bucket_vacio_se_elimina():
+    coleccion = _ColeccionFalsa({"conteo": 0, "peso_max": 100, "dias": {"2024-01-01": 0}})
+    asyncio.run(rollup_controller.aplicar_registro_eliminado(_DbFalsa(coleccion), _registro(datetime(2024, 1, 1))))
+    assert len([op for op in coleccion.operaciones if op[0] == "delete_one"]) == 3
@@ -0,0 +1,25 @@
+import json
+from datetime import datetime
+
+from bson import ObjectId
+
+from schemas.conversacion_schema import ConversacionResponse
+from schemas.registro_schema import RegistroResponse
+from utils.serialization import BSONJSONResponse
+
+
+def test_solo_se_envian_los_campos_del_modelo():
+    registro = {"_id": ObjectId(), "usuario_id": "u1", "ejercicio_id": ObjectId(), "ejercicio_nombre": "Sentadilla",
+                "peso_levantado": 100.0, "repeticiones": 5, "fecha_registro": datetime(2024, 1, 1),
+                "interno": "no se envía"}
+    cuerpo = json.loads(BSONJSONResponse([registro], model=RegistroResponse).body)
+    assert set(cuerpo[0]) == {"_id", "usuario_id", "ejercicio_id", "ejercicio_nombre", "peso_levantado",
+                              "repeticiones", "fecha_registro"}
+    assert cuerpo[0]["ejercicio_id"] == str(registro["ejercicio_id"])
+
+
+def test_sin_modelo_el_contenido_no_cambia():
+    conversacion = {"_id": ObjectId(), "usuario_id": "u1", "fecha": datetime(2024, 1, 1), "rol": "user",
+                    "mensaje": "hola", "extra": 1}
+    assert "extra" in json.loads(BSONJSONResponse(conversacion).body)
+    assert "extra" not in json.loads(BSONJSONResponse(conversacion, model=ConversacionResponse).body)
@@ -0,0 +1,41 @@
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Type
+from pydantic import BaseModel
+
+# --- Proyecciones (parámetro fields= de los listados) ---
+
+def build_projection(fields: Optional[str], model: Type[BaseModel]) -> Optional[Dict[str, int]]:
+    """
+    Convierte 'fields' (nombres separados por comas) en una proyección de MongoDB.
+    Solo se aceptan campos del modelo de respuesta; '_id' se incluye siempre.
+    Lanza ValueError si algún campo no existe. Devuelve None si no se piden campos.
+    """
+    if not fields:
+        return None
+
+    permitidos = {info.alias or nombre for nombre, info in model.model_fields.items()}
+    pedidos = [f.strip() for f in fields.split(",") if f.strip()]
+    desconocidos = [f for f in pedidos if f not in permitidos and f != "id"]
+    if desconocidos:
+        raise ValueError(f"Campos desconocidos: {', '.join(desconocidos)}")
+
+    projection = {f: 1 for f in pedidos if f not in ("id", "_id")}
+    projection["_id"] = 1
+    return projection
+
+# --- Registros (compartidas por los resúmenes de progreso y los rollups) ---
+
+def fecha_utc(fecha: datetime) -> datetime:
+    """
+    Normaliza una fecha a UTC sin tzinfo (igual que la devuelve MongoDB).
+    """
+    if fecha.tzinfo is not None:
+        return fecha.astimezone(timezone.utc).replace(tzinfo=None)
+    return fecha
+
+
+def volumen_registro(registro: Dict[str, Any]) -> float:
+    """
+    Volumen de una serie: peso levantado por repeticiones.
+    """
+    return float(registro.get("peso_levantado", 0) or 0) * (registro.get("repeticiones", 0) or 0)
@@ -0,0 +1,115 @@
+import hashlib
+from typing import Any, List, Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# --- ETag y GET condicional ---
+
+def calcular_etag(body: bytes) -> str:
+    """
+    ETag débil a partir del hash del contenido. Es débil porque la misma respuesta
+    puede viajar comprimida o sin comprimir según el cliente.
+    """
+    return f'W/"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+
+
+def _coincide(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Comparación débil de If-None-Match (admite varias etiquetas separadas por comas y '*').
+    """
+    if not if_none_match:
+        return False
+    etiquetas = [e.strip() for e in if_none_match.split(",")]
+    if "*" in etiquetas:
+        return True
+    valor = etag[2:] if etag.startswith("W/") else etag
+    return any((e[2:] if e.startswith("W/") else e) == valor for e in etiquetas)
+
+
+class ETagMiddleware:
+    """
+    Añade un ETag a las respuestas 200 de GET y responde 304 Not Modified, sin cuerpo,
+    cuando el cliente envía ese mismo ETag en If-None-Match.
+    Las respuestas en streaming (varios fragmentos de cuerpo, como el NDJSON de /registros)
+    se dejan pasar sin tocar, para no tener que guardarlas en memoria.
+    Debe registrarse antes que la compresión (queda por dentro) para que el hash se calcule
+    sobre el contenido sin comprimir.
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        if_none_match = Headers(scope=scope).get("if-none-match")
+        inicio: Optional[Message] = None
+        pasar_directo = False
+
+        async def enviar(message: Message) -> None:
+            nonlocal inicio, pasar_directo
+            if pasar_directo:
+                await send(message)
+                return
+
+            if message["type"] == "http.response.start":
+                if message["status"] != 200:
+                    pasar_directo = True
+                    await send(message)
+                else:
+                    inicio = message # Se retiene hasta ver el cuerpo
+                return
+
+            if message["type"] != "http.response.body" or inicio is None:
+                await send(message)
+                return
+
+            if message.get("more_body", False):
+                # Respuesta en streaming: se envía tal cual
+                pasar_directo = True
+                await send(inicio)
+                await send(message)
+                return
+
+            headers = MutableHeaders(scope=inicio)
+            etag = headers.get("etag") or calcular_etag(message.get("body", b""))
+            headers["etag"] = etag
+            if "cache-control" not in headers:
+                # El cliente puede guardar la respuesta, pero debe revalidarla en cada uso
+                headers["cache-control"] = "private, no-cache"
+
+            if _coincide(if_none_match, etag):
+                no_modificado: List[Any] = [
+                    (k, v) for k, v in inicio["headers"]
+                    if k.lower() not in (b"content-length", b"content-type")
+                ]
+                await send({"type": "http.response.start", "status": 304, "headers": no_modificado})
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+            await send(inicio)
+            await send(message)
+
+        await self.app(scope, receive, enviar)
+
+
+# --- Server-Sent Events sin compresión ---
+
+class SSESinCompresionMiddleware:
+    """
+    Quita Accept-Encoding de las peticiones que esperan Server-Sent Events (Accept: text/event-stream)
+    para que el middleware de compresión no acumule los eventos en su búfer y retrase el primer token.
+    Debe ser el más externo de los dos (registrarse después de la compresión).
+    """
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and "text/event-stream" in Headers(scope=scope).get("accept", ""):
+            scope = dict(scope)
+            scope["headers"] = [(k, v) for k, v in scope["headers"] if k.lower() != b"accept-encoding"]
+        await self.app(scope, receive, send)
@@ -0,0 +1,72 @@
+import os
+from typing import Awaitable, Callable, Dict, List
+
+from utils.logger import get_logger
+
+logger = get_logger("utils.invalidacion")
+
+# Invalidación de cachés en memoria entre procesos. Cada caché se suscribe a un canal (p. ej.
+# 'ejercicios') y los controladores llaman a invalidar() tras escribir. La caché local se limpia
+# siempre; para los demás workers hay dos mecanismos:
+# - Publicadores registrados con registrar_publicador() (p. ej., un PUBLISH de Redis), cuyo
+#   suscriptor en cada worker llama a recibir(canal).
+# - vigilar_coleccion(): un change stream de MongoDB (requiere replica set) que también detecta
+#   escrituras hechas fuera de la API. Se activa con CACHE_INVALIDATION=changestream.
+
+CACHE_INVALIDATION = os.getenv("CACHE_INVALIDATION", "local") # 'local' o 'changestream'
+
+_suscriptores: Dict[str, List[Callable[[], None]]] = {}
+_publicadores: List[Callable[[str], Awaitable[None]]] = []
+
+
+def suscribir(canal: str, callback: Callable[[], None]) -> None:
+    """
+    Registra una función (sin argumentos) que vacía una caché al invalidarse el canal.
+    """
+    _suscriptores.setdefault(canal, []).append(callback)
+
+
+def registrar_publicador(publicador: Callable[[str], Awaitable[None]]) -> None:
+    """
+    Registra una corrutina que difunde las invalidaciones locales al resto de workers.
+    """
+    _publicadores.append(publicador)
+
+
+def recibir(canal: str) -> None:
+    """
+    Aplica una invalidación en este proceso (sin volver a difundirla).
+    """
+    for callback in _suscriptores.get(canal, []):
+        try:
+            callback()
+        except Exception as e:
+            logger.error("Error al invalidar la caché del canal '%s': %s", canal, e)
+
+
+async def invalidar(canal: str) -> None:
+    """
+    Invalida el canal en este proceso y lo publica a los demás.
+    """
+    recibir(canal)
+    for publicador in _publicadores:
+        try:
+            await publicador(canal)
+        except Exception as e:
+            logger.error("Error al publicar la invalidación del canal '%s': %s", canal, e)
+
+
+async def vigilar_coleccion(db, coleccion: str, canal: str) -> None:
+    """
+    Invalida el canal con cada cambio de la colección (change stream). Pensada para ejecutarse
+    como tarea de fondo durante toda la vida del proceso.
+    """
+    try:
+        async with db[coleccion].watch() as stream:
+            logger.info("Vigilando cambios en '%s' para invalidar la caché '%s'", coleccion, canal)
+            async for cambio in stream:
+                logger.debug("Cambio en '%s' (%s): se invalida '%s'", coleccion, cambio.get("operationType"), canal)
+                recibir(canal)
+    except Exception as e:
+        # Sin replica set no hay change streams: se mantiene solo la invalidación local
+        logger.error("No se pudo vigilar '%s' con un change stream: %s", coleccion, e)
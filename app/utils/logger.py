@@ -0,0 +1,82 @@
+import logging
+import os
+import random
+import reprlib
+from typing import Any
+
+# --- Configuración por variables de entorno ---
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Fracción de mensajes DEBUG/INFO que se emiten (WARNING y superiores siempre se emiten)
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+# Longitud máxima de un payload (listas, documentos) dentro de un mensaje
+LOG_MAX_PAYLOAD = int(os.getenv("LOG_MAX_PAYLOAD", "500"))
+
+_ROOT_LOGGER_NAME = "fitflow"
+
+# reprlib limita cuántos elementos se recorren, así que formatear una lista de un millón
+# de documentos no cuesta más que formatear sus primeros elementos.
+_repr = reprlib.Repr()
+_repr.maxlevel = 3
+_repr.maxlist = 5
+_repr.maxdict = 10
+_repr.maxstring = 120
+_repr.maxother = 120
+
+
+class Payload:
+    """
+    Envuelve un valor para usarlo como argumento de un mensaje de log.
+    Solo se formatea (con límites de tamaño) si el mensaje llega a emitirse; con el nivel
+    INFO, un logger.debug("...: %s", payload(docs)) no serializa nada.
+    """
+    __slots__ = ("value",)
+
+    def __init__(self, value: Any):
+        self.value = value
+
+    def __str__(self) -> str:
+        texto = _repr.repr(self.value)
+        if isinstance(self.value, (list, tuple)):
+            texto = f"[{len(self.value)} elementos] {texto}"
+        if len(texto) > LOG_MAX_PAYLOAD:
+            texto = texto[:LOG_MAX_PAYLOAD] + "...(truncado)"
+        return texto
+
+
+def payload(value: Any) -> Payload:
+    return Payload(value)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Deja pasar una fracción 'rate' de los mensajes de nivel INFO o inferior.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.INFO or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+def _configure_root() -> logging.Logger:
+    root = logging.getLogger(_ROOT_LOGGER_NAME)
+    if not root.handlers:
+        handler = logging.StreamHandler()
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+        handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE))
+        root.addHandler(handler)
+        root.setLevel(LOG_LEVEL)
+        root.propagate = False
+    return root
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Devuelve el logger 'fitflow.<name>' (p. ej. get_logger("controllers.registro")).
+    """
+    _configure_root()
+    return logging.getLogger(f"{_ROOT_LOGGER_NAME}.{name}")
@@ -0,0 +1,137 @@
+import asyncio
+import os
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from dotenv import load_dotenv
+from utils.logger import get_logger
+
+try: # Dependencia opcional: solo hace falta para el backend 'openai'
+    from openai import AsyncOpenAI
+except ImportError:
+    AsyncOpenAI = None
+
+load_dotenv()
+
+logger = get_logger("utils.openai_client")
+
+# --- Configuración (variables de entorno) ---
+OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+OPENAI_TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE", "0.7"))
+OPENAI_MAX_TOKENS = int(os.getenv("OPENAI_MAX_TOKENS", "512"))
+# 'openai' o 'fake'. Por defecto se usa OpenAI si hay API key y el modelo local en otro caso
+LLM_BACKEND = os.getenv("LLM_BACKEND", "openai" if OPENAI_API_KEY else "fake")
+# Latencias simuladas del modelo local (milisegundos)
+FAKE_LLM_TTFT_MS = float(os.getenv("FAKE_LLM_TTFT_MS", "300"))
+FAKE_LLM_TOKEN_MS = float(os.getenv("FAKE_LLM_TOKEN_MS", "30"))
+
+Mensajes = List[Dict[str, str]]
+
+# --- Backends ---
+
+class LLMBackend:
+    """
+    Interfaz de un modelo de lenguaje: recibe los mensajes en formato chat
+    ([{"role": ..., "content": ...}]) y devuelve el texto de la respuesta fragmento a fragmento.
+    """
+
+    nombre = "base"
+
+    def parametros(self) -> Dict[str, Any]:
+        """
+        Parámetros que influyen en la respuesta (modelo, temperatura...).
+        """
+        return {"backend": self.nombre}
+
+    def stream(self, mensajes: Mensajes) -> AsyncIterator[str]:
+        raise NotImplementedError
+
+
+class OpenAIBackend(LLMBackend):
+    """
+    Chat Completions de OpenAI en modo streaming con el cliente asíncrono.
+    """
+
+    nombre = "openai"
+
+    def __init__(self, api_key: Optional[str] = OPENAI_API_KEY, model: str = OPENAI_MODEL,
+                 temperature: float = OPENAI_TEMPERATURE, max_tokens: int = OPENAI_MAX_TOKENS):
+        if AsyncOpenAI is None:
+            raise RuntimeError("El paquete 'openai' no está instalado")
+        self.client = AsyncOpenAI(api_key=api_key)
+        self.model = model
+        self.temperature = temperature
+        self.max_tokens = max_tokens
+
+    def parametros(self) -> Dict[str, Any]:
+        return {"backend": self.nombre, "model": self.model, "temperature": self.temperature, "max_tokens": self.max_tokens}
+
+    async def stream(self, mensajes: Mensajes) -> AsyncIterator[str]:
+        respuesta = await self.client.chat.completions.create(
+            model=self.model,
+            messages=mensajes,
+            temperature=self.temperature,
+            max_tokens=self.max_tokens,
+            stream=True,
+        )
+        async for chunk in respuesta:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+
+class FakeBackend(LLMBackend):
+    """
+    Modelo local sin red: responde con un texto fijo a partir del último mensaje del usuario,
+    palabra a palabra y con latencias configurables. Sirve para desarrollo y para medir el
+    tiempo hasta el primer token sin depender de OpenAI.
+    """
+
+    nombre = "fake"
+
+    def __init__(self, ttft_ms: float = FAKE_LLM_TTFT_MS, token_ms: float = FAKE_LLM_TOKEN_MS):
+        self.ttft_ms = ttft_ms
+        self.token_ms = token_ms
+
+    def parametros(self) -> Dict[str, Any]:
+        return {"backend": self.nombre}
+
+    async def stream(self, mensajes: Mensajes) -> AsyncIterator[str]:
+        pregunta = next((m["content"] for m in reversed(mensajes) if m.get("role") == "user"), "")
+        respuesta = (f"He recibido tu mensaje: '{pregunta}'. Según tu progreso, te recomiendo mantener "
+                     "la constancia y aumentar la carga de forma gradual. ¿Cómo puedo ayudarte con tu entrenamiento?")
+        await asyncio.sleep(self.ttft_ms / 1000)
+        for i, palabra in enumerate(respuesta.split(" ")):
+            if i:
+                await asyncio.sleep(self.token_ms / 1000)
+            yield palabra if i == 0 else " " + palabra
+
+
+_BACKENDS = {"openai": OpenAIBackend, "fake": FakeBackend}
+_backend: Optional[LLMBackend] = None
+
+
+def get_llm_backend() -> LLMBackend:
+    """
+    Backend configurado en LLM_BACKEND (se crea una sola vez por proceso).
+    Si no se puede crear el de OpenAI (sin paquete o sin API key), se usa el modelo local.
+    """
+    global _backend
+    if _backend is None:
+        clase = _BACKENDS.get(LLM_BACKEND)
+        if clase is None:
+            raise ValueError(f"LLM_BACKEND desconocido: {LLM_BACKEND}")
+        try:
+            _backend = clase()
+        except Exception as e:
+            logger.error("No se pudo crear el backend '%s' (%s); se usa el modelo local", LLM_BACKEND, e)
+            _backend = FakeBackend()
+        logger.info("Backend del chatbot: %s", _backend.nombre)
+    return _backend
+
+
+def set_llm_backend(backend: LLMBackend) -> None:
+    """
+    Sustituye el backend en uso (p. ej., desde un benchmark).
+    """
+    global _backend
+    _backend = backend
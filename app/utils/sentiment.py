@@ -0,0 +1,96 @@
+import os
+import re
+import unicodedata
+from typing import Dict, Optional
+
+from utils.logger import get_logger
+
+logger = get_logger("utils.sentiment")
+
+# 'lexicon' (léxico local en español, sin dependencias) es el único backend incluido
+SENTIMENT_BACKEND = os.getenv("SENTIMENT_BACKEND", "lexicon")
+
+# --- Backends ---
+
+class SentimentBackend:
+    """
+    Interfaz de un analizador de sentimiento: puntúa un texto entre -1 (negativo) y 1 (positivo).
+    """
+
+    nombre = "base"
+
+    def puntuar(self, texto: str) -> float:
+        raise NotImplementedError
+
+
+def _normalizar(texto: str) -> str:
+    sin_tildes = "".join(c for c in unicodedata.normalize("NFKD", texto.lower()) if not unicodedata.combining(c))
+    return re.sub(r"[^\w\s]", " ", sin_tildes)
+
+
+class LexiconBackend(SentimentBackend):
+    """
+    Suma los pesos de las palabras del léxico presentes en el texto (sin tildes y en minúsculas).
+    Una negación ('no', 'nunca', 'nada', 'ni') invierte el peso de la siguiente palabra con carga.
+    La puntuación es la media de los pesos encontrados (0 si no hay ninguno).
+    """
+
+    nombre = "lexicon"
+
+    LEXICO: Dict[str, float] = {
+        # Positivas
+        "feliz": 1.0, "contento": 0.8, "contenta": 0.8, "genial": 0.9, "bien": 0.5,
+        "motivado": 0.8, "motivada": 0.8, "animado": 0.7, "animada": 0.7, "fuerte": 0.5, "energia": 0.5,
+        "satisfecho": 0.7, "satisfecha": 0.7, "orgulloso": 0.8, "orgullosa": 0.8, "encanta": 0.9,
+        "gusta": 0.5, "increible": 0.9, "perfecto": 0.8, "logrado": 0.7, "progreso": 0.5, "gracias": 0.4,
+        "excelente": 0.9, "descansado": 0.5, "descansada": 0.5, "facil": 0.3,
+        # Negativas
+        "triste": -1.0, "cansado": -0.6, "cansada": -0.6, "agotado": -0.8, "agotada": -0.8, "mal": -0.6,
+        "peor": -0.6, "dolor": -0.7, "duele": -0.7, "lesion": -0.8, "lesionado": -0.8, "lesionada": -0.8,
+        "frustrado": -0.8, "frustrada": -0.8, "desmotivado": -0.8, "desmotivada": -0.8, "estresado": -0.7,
+        "estresada": -0.7, "aburrido": -0.5, "aburrida": -0.5, "odio": -0.9, "dificil": -0.3,
+        "estancado": -0.6, "estancada": -0.6, "fatal": -0.9, "horrible": -0.9, "deprimido": -1.0, "deprimida": -1.0,
+    }
+    NEGACIONES = {"no", "nunca", "nada", "ni", "tampoco", "sin"}
+
+    def puntuar(self, texto: str) -> float:
+        pesos = []
+        negar = False
+        for palabra in _normalizar(texto or "").split():
+            if palabra in self.NEGACIONES:
+                negar = True
+                continue
+            peso = self.LEXICO.get(palabra)
+            if peso is not None:
+                pesos.append(-peso if negar else peso)
+                negar = False
+        return sum(pesos) / len(pesos) if pesos else 0.0
+
+
+_BACKENDS = {"lexicon": LexiconBackend}
+_backend: Optional[SentimentBackend] = None
+
+
+def get_sentiment_backend() -> SentimentBackend:
+    """
+    Backend configurado en SENTIMENT_BACKEND (se crea una sola vez por proceso).
+    """
+    global _backend
+    if _backend is None:
+        clase = _BACKENDS.get(SENTIMENT_BACKEND)
+        if clase is None:
+            logger.error("SENTIMENT_BACKEND desconocido: %s; se usa 'lexicon'", SENTIMENT_BACKEND)
+            clase = LexiconBackend
+        _backend = clase()
+    return _backend
+
+
+def registrar_backend(nombre: str, clase: type) -> None:
+    """
+    Añade un backend (p. ej., un modelo de PNL) seleccionable con SENTIMENT_BACKEND.
+    """
+    _BACKENDS[nombre] = clase
+
+
+def puntuar(texto: str) -> float:
+    return get_sentiment_backend().puntuar(texto)
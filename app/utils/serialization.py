@@ -0,0 +1,100 @@
+import json
+from datetime import datetime, date
+from typing import Any, Dict, FrozenSet, Optional, Type
+from bson import ObjectId
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try: # Dependencia opcional: si está instalada, orjson serializa varias veces más rápido
+    import orjson
+except ImportError:
+    orjson = None
+
+# --- Conversión de documentos de MongoDB ---
+
+def convert_id_to_str(document: Any) -> Any:
+    """
+    Convierte ObjectId en str dentro de un diccionario o lista de diccionarios.
+    Útil para la serialización de respuestas de la API.
+    """
+    if isinstance(document, dict):
+        return {
+            k: str(v) if isinstance(v, ObjectId) else convert_id_to_str(v)
+            for k, v in document.items()
+        }
+    elif isinstance(document, list):
+        return [convert_id_to_str(elem) for elem in document]
+    elif isinstance(document, ObjectId):
+        return str(document)
+    return document
+
+# --- Serialización JSON directa (sin pasar por los modelos Pydantic) ---
+
+def json_default(value: Any) -> Any:
+    """
+    Función 'default' para json.dumps/orjson: convierte ObjectId a str y fechas a ISO 8601.
+    """
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Tipo no serializable a JSON: {type(value).__name__}")
+
+
+def dumps_bson(content: Any) -> bytes:
+    """
+    Serializa documentos BSON (con ObjectId y datetime) directamente a bytes JSON.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=json_default)
+    return json.dumps(content, default=json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def to_ndjson_line(document: Dict[str, Any]) -> str:
+    """
+    Serializa un documento como una línea NDJSON (JSON + salto de línea).
+    """
+    return dumps_bson(document).decode("utf-8") + "\n"
+
+
+def to_sse(evento: str, datos: Any) -> str:
+    """
+    Serializa un evento Server-Sent Events ('event' + 'data' en JSON + línea en blanco).
+    """
+    return f"event: {evento}\ndata: {dumps_bson(datos).decode('utf-8')}\n\n"
+
+
+def campos_modelo(model: Type[BaseModel]) -> FrozenSet[str]:
+    """
+    Claves que produce un modelo de respuesta al serializarse (alias si lo tiene, como '_id').
+    """
+    return frozenset(info.alias or nombre for nombre, info in model.model_fields.items())
+
+
+def solo_campos(content: Any, model: Type[BaseModel]) -> Any:
+    """
+    Deja en cada documento (o lista de documentos) solo los campos declarados en el modelo,
+    igual que haría FastAPI al validar contra el response_model. Pensado para modelos planos.
+    """
+    campos = campos_modelo(model)
+    if isinstance(content, list):
+        return [{k: v for k, v in doc.items() if k in campos} for doc in content]
+    if isinstance(content, dict):
+        return {k: v for k, v in content.items() if k in campos}
+    return content
+
+
+class BSONJSONResponse(JSONResponse):
+    """
+    Respuesta JSON que acepta documentos tal como los devuelve Motor.
+    Al devolverla desde una ruta, FastAPI no valida el contenido contra el response_model
+    (que sigue sirviendo para la documentación OpenAPI), evitando la doble conversión
+    _id -> str -> PyObjectId -> str en los listados grandes. Por eso la ruta debe pasar su
+    modelo en 'model': los campos no declarados (internos o desnormalizados) no se envían.
+    """
+
+    def __init__(self, content: Any, model: Optional[Type[BaseModel]] = None, **kwargs: Any) -> None:
+        super().__init__(solo_campos(content, model) if model is not None else content, **kwargs)
+
+    def render(self, content: Any) -> bytes:
+        return dumps_bson(content)